@@ -8,6 +8,7 @@ from pprint import pformat, pprint
 from django.contrib.gis.gdal import DataSource
 from django.contrib.gis.utils import LayerMapping, mapping, ogrinspect
 from django.db.models import Count, Q
+from world.infra.tile_refresh import TileChangeTracker, track_tile_changes
 
 import elt.models as elt_models
 from elt.lib.elt_utils import (
@@ -89,6 +90,8 @@ def extract_from_shapefile_generic(geo: Juri, resolved_datatype: str, zipfname:
         shapefilepaths = [Path(tempdir, shapefile) for shapefile in shapefiles]
         zf.extractall(path=tempdir)
 
+        tile_changes = TileChangeTracker([RawGeomData])
+        tile_changes.snapshot()
         user_intent = check_existing_db_data(geo, resolved_datatype, shapefilepaths)
         if user_intent == "s":
             print("Skipping stage")
@@ -131,6 +134,7 @@ def extract_from_shapefile_generic(geo: Juri, resolved_datatype: str, zipfname:
             lm.stats()
             lm.save(strict=False, verbose=False, progress=True, step=500)  # fid_range=(0, 20))  # TODO: HACK!
             print("DONE")
+        tile_changes.refresh()
 
 
 def extract_from_shapefile_bespoke(geo: Juri, datatype: GisData, file_assets=None):
@@ -180,11 +184,12 @@ def extract_from_shapefile_bespoke(geo: Juri, datatype: GisData, file_assets=Non
         ds = DataSource(Path(tempdir, shapefiles[0]))  # noqa:F841
 
         lm = LayerMapping(db_model, Path(tempdir, shapefiles[0]), mapper, transform=True, using="default")
-        print(f"Deleting old data from DB {db_model}...")
-        db_model.objects.all().delete()
-        print(f"Saving data from {latest_file} to DB {db_model}...")
-        # save new layer, with commit every 'step' entries.
-        lm.save(strict=False, verbose=False, progress=True, step=500)
+        with track_tile_changes([db_model]):
+            print(f"Deleting old data from DB {db_model}...")
+            db_model.objects.all().delete()
+            print(f"Saving data from {latest_file} to DB {db_model}...")
+            # save new layer, with commit every 'step' entries.
+            lm.save(strict=False, verbose=False, progress=True, step=500)
         print("Done saving.")
 
 
@@ -1,14 +1,65 @@
+import datetime
+import hashlib
+import json
+import logging
 import re
+import time
 from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import ClassVar
 
 from django.contrib.gis.db.models.functions import Distance
+from django.core.cache import caches
+from django.db import connections
+from django.db.models import QuerySet
 from pydantic import BaseModel
-from world.models import Parcel, Roads, ZoningBase
+from world.models import AnalyzedParcel, DataVersion, Parcel, Roads, ZoningBase
 from world.models.models import AnalyzedRoad
 
-from lib.parcel_analysis_2022.crs_lib import meters_to_latlong
+from lib.parcel_analysis_2022.crs_lib import meters_to_latlong, meters_to_latlong_many
 from lib.parcel_analysis_2022.types import CheckResultEnum
 
+log = logging.getLogger(__name__)
+
+# parcel id -> (result, notes)
+SetResults = dict[int, tuple[CheckResultEnum, list[str]]]
+# AnalyzedRoad fields CommercialCorridorCheck looks at
+ROAD_WIDTH_FIELDS = ("status", "low_width", "high_width")
+# Results that stop an AndCheck
+FAILING_RESULTS = [CheckResultEnum.error, CheckResultEnum.failed]
+# Cache alias for memoized check results, see EligibilityCheck.run_cached()
+MEMO_CACHE_ALIAS = "eligibility"
+# Runs of every child before AndCheck reorders them
+MIN_RUNS_FOR_ORDERING = 20
+
+
+@dataclass
+class CheckStats:
+    """Runtime and failure rate of a check in this process, from its uncached runs"""
+
+    runs: int = 0
+    failures: int = 0
+    seconds: float = 0.0
+
+    def record(self, result: CheckResultEnum, seconds: float):
+        self.runs += 1
+        self.failures += result in FAILING_RESULTS
+        self.seconds += seconds
+
+    @property
+    def failure_rate(self) -> float:
+        return self.failures / self.runs if self.runs else 0.0
+
+    @property
+    def cost_per_failure(self) -> float:
+        """Expected seconds spent per parcel the check rules out. AndCheck runs the lowest first."""
+        return (self.seconds / self.runs) / self.failure_rate if self.failures else float("inf")
+
+
+# check name -> stats
+CHECK_STATS: defaultdict[str, CheckStats] = defaultdict(CheckStats)
+
 
 class EligibilityCheck(BaseModel):
     name: str
@@ -16,6 +67,10 @@ class EligibilityCheck(BaseModel):
     result: CheckResultEnum = CheckResultEnum.not_run
     notes: list[str] = []
     children: list["EligibilityCheck"] = []
+    # Tables run() reads. A memoized result is reused until one of them changes (see DataVersion).
+    depends_on: ClassVar[tuple] = (Parcel,)
+    # Bump when run()'s logic or thresholds change, so memoized results from the old logic aren't reused
+    version: ClassVar[int] = 1
 
     def __init__(self, name: str, description: str, **data: any) -> None:
         super().__init__(name=name, description=description, **data)
@@ -26,6 +81,48 @@ class EligibilityCheck(BaseModel):
     def run(self, *args, **kwargs) -> CheckResultEnum:
         raise AssertionError("run() needs to be implemented in child class")
 
+    def run_cached(self, parcel: Parcel, versions: dict[str, datetime.datetime] | None = None) -> CheckResultEnum:
+        """run(), memoized per (check logic, parcel, version of the data it reads). Uncached runs are timed into
+        CHECK_STATS. versions is DataVersion.versions(), if the caller already has it."""
+        if versions is None:
+            versions = DataVersion.versions()
+        data_version = max((versions.get(m._meta.label) for m in self.depends_on), default=None, key=_version_key)
+        key = f"check:{self.logic_hash()}:{parcel.apn}:{data_version.isoformat() if data_version else 'none'}"
+        cache = caches[MEMO_CACHE_ALIAS]
+        memo = cache.get(key)
+        if memo is not None:
+            self.result, self.notes = CheckResultEnum(memo[0]), list(memo[1])
+            return self.result
+        start = time.perf_counter()
+        result = self.run(parcel)
+        CHECK_STATS[self.name].record(result, time.perf_counter() - start)
+        cache.set(key, (result.value, self.notes))
+        return result
+
+    def logic_hash(self) -> str:
+        """Identifies what run() computes: the check's class and version, and its parameters (fields other than the
+        result)"""
+        params = self.json(exclude={"result", "notes", "children"}, sort_keys=True)
+        logic = f"{type(self).__module__}.{type(self).__qualname__}:{self.version}:{params}"
+        return hashlib.md5(logic.encode(), usedforsecurity=False).hexdigest()
+
+    def run_set(self, parcels: QuerySet) -> dict[int, "EligibilityCheck"]:
+        """Run the check on every parcel in the queryset. Returns parcel id -> a copy of the check with that parcel's
+        result and notes."""
+        return {
+            parcel_id: self.copy(update={"result": result, "notes": notes})
+            for parcel_id, (result, notes) in self.run_set_results(parcels).items()
+        }
+
+    def run_set_results(self, parcels: QuerySet) -> SetResults:
+        """Checks with a set-based form (a query over all the parcels at once) override this. The rest run parcel
+        by parcel."""
+        results = {}
+        for parcel in parcels:
+            check = self.copy(deep=True)
+            results[parcel.id] = (check.run(parcel), check.notes)
+        return results
+
     def __str__(self):
         return self.name
 
@@ -33,25 +130,63 @@ class EligibilityCheck(BaseModel):
         return self.name
 
 
+def _version_key(version: datetime.datetime | None) -> datetime.datetime:
+    return version or datetime.datetime.min.replace(tzinfo=datetime.UTC)
+
+
 class LogicCheck(EligibilityCheck, ABC):
     def __init__(self, name: str, description: str, checks: list[EligibilityCheck]) -> None:
         super().__init__(name, description)
         self.children = checks
 
+    def run_cached(self, parcel: Parcel, versions: dict[str, datetime.datetime] | None = None) -> CheckResultEnum:
+        # Only the leaf checks are memoized
+        return self.run(parcel, versions)
+
 
 class AndCheck(LogicCheck):
     def __init__(self, checks: list[EligibilityCheck]) -> None:
         super().__init__("And", "All checks must pass", checks)
 
-    def run(self, parcel: Parcel) -> CheckResultEnum:
+    def run(self, parcel: Parcel, versions: dict[str, datetime.datetime] | None = None) -> CheckResultEnum:
+        # Children run in evaluation_order(), so when a parcel has several failing checks, which one stops the
+        # run (and whether the result is failed or error) can change as the stats come in.
+        if versions is None:
+            versions = DataVersion.versions()
         # noinspection PyTypeChecker
         self.result: CheckResultEnum = CheckResultEnum.passed
-        for check in self.children:
-            self.result = self.result.and_check(check.run(parcel))
-            if self.result in [CheckResultEnum.error, CheckResultEnum.failed]:
+        for check in self.evaluation_order():
+            self.result = self.result.and_check(check.run_cached(parcel, versions))
+            if self.result in FAILING_RESULTS:
                 return self.result
         return self.result
 
+    def evaluation_order(self) -> list[EligibilityCheck]:
+        """Children with the lowest cost per failure first, once each has run MIN_RUNS_FOR_ORDERING times.
+        Until then, in declaration order."""
+        stats = [CHECK_STATS.get(check.name) for check in self.children]
+        if any(s is None or s.runs < MIN_RUNS_FOR_ORDERING for s in stats):
+            return list(self.children)
+        order = sorted(range(len(self.children)), key=lambda i: (stats[i].cost_per_failure, i))
+        return [self.children[i] for i in order]
+
+    def run_set(self, parcels: QuerySet) -> dict[int, EligibilityCheck]:
+        # Every child runs on every parcel, but each parcel's tree shows the children after a failure as not run,
+        # like run() does.
+        child_runs = [check.run_set(parcels) for check in self.children]
+        checks = {}
+        for parcel_id in child_runs[0] if child_runs else []:
+            result: CheckResultEnum = CheckResultEnum.passed
+            children = []
+            for check, runs in zip(self.children, child_runs, strict=True):
+                if result in FAILING_RESULTS:
+                    children.append(check)
+                    continue
+                children.append(runs[parcel_id])
+                result = result.and_check(runs[parcel_id].result)
+            checks[parcel_id] = self.copy(update={"result": result, "children": children})
+        return checks
+
 
 class OrCheck(LogicCheck):
     def __init__(self, checks: list[EligibilityCheck]) -> None:
@@ -66,6 +201,8 @@ class OrCheck(LogicCheck):
 # Office, retail or parking is a Principally Permitted use (no Conditional User Permit or Discretionary Review required)
 # Anything w/ CC, CN, CO, CR, CP, or CV is eligible
 class PrincipallyPermittedUseCheck(EligibilityCheck):
+    depends_on: ClassVar[tuple] = (Parcel, ZoningBase)
+
     def __init__(self) -> None:
         description = (
             "Office, retail or parking is a Principally Permitted use (no Conditional User Permit or"
@@ -75,26 +212,35 @@ class PrincipallyPermittedUseCheck(EligibilityCheck):
 
     def run(self, parcel: Parcel) -> CheckResultEnum:
         zones = ZoningBase.objects.using("basedata").filter(geom__intersects=parcel.geom)
-        if len(zones) == 0:
-            self.notes.append("No zoning found for this parcel")
-            # noinspection PyTypeChecker
-            self.result = CheckResultEnum.error
-            return self.result
-        zone_names: list[str] = [zone.zone_name for zone in zones]
+        self.result, notes = self.evaluate([zone.zone_name for zone in zones])
+        self.notes.extend(notes)
+        return self.result
+
+    def run_set_results(self, parcels: QuerySet) -> SetResults:
+        # Spatial join of the parcels with the zones intersecting them
+        ids_sql, ids_params = parcels.values("id").query.sql_with_params()
+        sql = f"""
+            SELECT p.id, array_remove(array_agg(z.zone_name), NULL)
+            FROM {Parcel._meta.db_table} p
+            LEFT JOIN {ZoningBase._meta.db_table} z ON ST_Intersects(z.geom, p.geom)
+            WHERE p.id IN ({ids_sql})
+            GROUP BY p.id
+        """
+        with connections[parcels.db].cursor() as cursor:
+            cursor.execute(sql, ids_params)
+            return {parcel_id: self.evaluate(zone_names) for parcel_id, zone_names in cursor.fetchall()}
+
+    @staticmethod
+    def evaluate(zone_names: list[str]) -> tuple[CheckResultEnum, list[str]]:
+        if len(zone_names) == 0:
+            return CheckResultEnum.error, ["No zoning found for this parcel"]
         matches = [bool(re.match(r"^(CC|CN|CO|CR|CP|CV)", zone_name)) for zone_name in zone_names]
-        self.notes.append("Zone(s): " + ", ".join(zone_names))
+        notes = ["Zone(s): " + ", ".join(zone_names)]
         if all(matches):
-            # noinspection PyTypeChecker
-            self.result = CheckResultEnum.passed
+            return CheckResultEnum.passed, notes
         elif not any(matches):
-            # noinspection PyTypeChecker
-            self.result = CheckResultEnum.failed
-        else:
-            # noinspection PyTypeChecker
-            self.result = CheckResultEnum.uncertain
-            self.notes.append("Overlapping zones, some of which are eligible")
-        # noinspection PyTypeChecker
-        return self.result
+            return CheckResultEnum.failed, notes
+        return CheckResultEnum.uncertain, notes + ["Overlapping zones, some of which are eligible"]
 
 
 class UrbanizedAreaCheck(EligibilityCheck):
@@ -118,6 +264,8 @@ class DevelopedNeighborsCheck(EligibilityCheck):
 
 
 class CommercialCorridorCheck(EligibilityCheck):
+    depends_on: ClassVar[tuple] = (Parcel, Roads, AnalyzedRoad)
+
     def __init__(self) -> None:
         description = "Abuts a commercial corridor (a local road 70 to 150 feet wide)"
         super().__init__("Commercial Corridor", description)
@@ -130,46 +278,57 @@ class CommercialCorridorCheck(EligibilityCheck):
             road__abloaddr__lte=parcel.situs_addr,
             road__abhiaddr__gte=parcel.situs_addr,
         )
-        parcel_addr = f"{parcel.situs_addr} {parcel.situs_stre}"
-        if len(x) == 0:
-            # noinspection PyTypeChecker
-            self.result = CheckResultEnum.error
-            self.notes.append(f"Didn't find road for addr = {parcel_addr} for this parcel")
-        elif len(x) > 1:
-            # noinspection PyTypeChecker
-            self.result = CheckResultEnum.error
-            self.notes.append(f"Found multiple roads for addr = {parcel_addr} for this parcel")
-        else:
-            road = x[0]
-            if road.status != road.Status.OK:
-                # noinspection PyTypeChecker
-                self.result = CheckResultEnum.error
-                self.notes.append(f"Found road for {parcel_addr}, but road analysis failed with error: {road.status}")
-                return self.result
-            min_width_meters = 70 / 3.28084
-            max_width_meters = 150 / 3.28084
-            low_width = round(road.low_width * 3.28084, 1)
-            high_width = round(road.high_width * 3.28084, 1)
-            width_range = f"{low_width} ft" if (low_width == high_width) else f"{low_width} to {high_width} ft"
-
-            if road.low_width >= min_width_meters and road.high_width <= max_width_meters:
-                # noinspection PyTypeChecker
-                self.result = CheckResultEnum.passed
-                self.notes.append(f"Road at {parcel_addr} is {width_range} wide")
-            elif road.high_width < min_width_meters:
-                # noinspection PyTypeChecker
-                self.result = CheckResultEnum.failed
-                self.notes.append(f"Road at {parcel_addr} is too narrow ({width_range})")
-            elif road.low_width > max_width_meters:
-                # noinspection PyTypeChecker
-                self.result = CheckResultEnum.failed
-                self.notes.append(f"Road at {parcel_addr} is too wide ({width_range})")
-            else:
-                # noinspection PyTypeChecker
-                self.result = CheckResultEnum.uncertain
-                self.notes.append(f"Part of road at {parcel_addr} is in range ({width_range})")
+        roads = [tuple(getattr(road, f) for f in ROAD_WIDTH_FIELDS) for road in x]
+        self.result, notes = self.evaluate(f"{parcel.situs_addr} {parcel.situs_stre}", roads)
+        self.notes.extend(notes)
         return self.result
 
+    def run_set_results(self, parcels: QuerySet) -> SetResults:
+        # Join in memory: the analyzed roads on the parcels' streets, by street name, then by address range
+        roads_by_street = defaultdict(list)
+        roads = AnalyzedRoad.objects.using(parcels.db).filter(road__rd30name__in=parcels.values("situs_stre"))
+        for pred, name, sfx, lo, hi, *road in roads.values_list(
+            "road__rd30pred",
+            "road__rd30name",
+            "road__rd30sfx",
+            "road__abloaddr",
+            "road__abhiaddr",
+            *ROAD_WIDTH_FIELDS,
+        ).order_by():
+            roads_by_street[(pred, name, sfx)].append((lo, hi, tuple(road)))
+        results = {}
+        rows = parcels.values_list("id", "situs_pre_field", "situs_stre", "situs_suff", "situs_addr").order_by()
+        for parcel_id, pred, name, sfx, addr in rows.iterator(chunk_size=10_000):
+            matches = [road for lo, hi, road in roads_by_street[(pred, name, sfx)] if lo <= addr <= hi]
+            results[parcel_id] = self.evaluate(f"{addr} {name}", matches)
+        return results
+
+    @staticmethod
+    def evaluate(parcel_addr: str, roads: list[tuple]) -> tuple[CheckResultEnum, list[str]]:  # noqa: PLR0911
+        """roads: (status, low_width, high_width) of the analyzed roads at the parcel's address"""
+        if len(roads) == 0:
+            return CheckResultEnum.error, [f"Didn't find road for addr = {parcel_addr} for this parcel"]
+        elif len(roads) > 1:
+            return CheckResultEnum.error, [f"Found multiple roads for addr = {parcel_addr} for this parcel"]
+        status, road_low_width, road_high_width = roads[0]
+        if status != AnalyzedRoad.Status.OK:
+            return CheckResultEnum.error, [
+                f"Found road for {parcel_addr}, but road analysis failed with error: {status}"
+            ]
+        min_width_meters = 70 / 3.28084
+        max_width_meters = 150 / 3.28084
+        low_width = round(road_low_width * 3.28084, 1)
+        high_width = round(road_high_width * 3.28084, 1)
+        width_range = f"{low_width} ft" if (low_width == high_width) else f"{low_width} to {high_width} ft"
+
+        if road_low_width >= min_width_meters and road_high_width <= max_width_meters:
+            return CheckResultEnum.passed, [f"Road at {parcel_addr} is {width_range} wide"]
+        elif road_high_width < min_width_meters:
+            return CheckResultEnum.failed, [f"Road at {parcel_addr} is too narrow ({width_range})"]
+        elif road_low_width > max_width_meters:
+            return CheckResultEnum.failed, [f"Road at {parcel_addr} is too wide ({width_range})"]
+        return CheckResultEnum.uncertain, [f"Part of road at {parcel_addr} is in range ({width_range})"]
+
 
 class CommercialFrontageCheck(EligibilityCheck):
     def __init__(self) -> None:
@@ -253,6 +412,8 @@ class NotHighFireHazardCheck(EligibilityCheck):
 
 
 class NotNearFreeway(EligibilityCheck):
+    depends_on: ClassVar[tuple] = (Parcel, Roads)
+
     def __init__(self) -> None:
         description = "Not located within 500 feet of a freeway, including limited access roads(?)"
         super().__init__("Not Near Freeway", description)
@@ -280,6 +441,46 @@ class NotNearFreeway(EligibilityCheck):
             self.result = CheckResultEnum.failed
             return self.result
 
+    def run_set_results(self, parcels: QuerySet) -> SetResults:
+        # Each parcel's search radius depends on its latitude, so find the nearest freeway to each parcel within the
+        # largest radius, then compare it to the parcel's own radius.
+        with connections[parcels.db].cursor() as cursor:
+            ids_sql, ids_params = parcels.values("id").query.sql_with_params()
+            cursor.execute(
+                f"SELECT id, ST_X(ST_Centroid(geom)), ST_Y(ST_Centroid(geom)) FROM {Parcel._meta.db_table} "
+                f"WHERE id IN ({ids_sql})",
+                ids_params,
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                return {}
+            ids, xs, ys = zip(*rows, strict=True)
+            (lat_deltas, long_deltas) = meters_to_latlong_many(500 / 3.28, baselats=ys, baselongs=xs)
+            radii = (lat_deltas + long_deltas) / 2 * 1.5
+            cursor.execute(
+                f"""
+                SELECT p.id, f.rd30full, f.degrees, f.meters
+                FROM (SELECT id, ST_Centroid(geom) AS c FROM {Parcel._meta.db_table} WHERE id IN ({ids_sql})) p
+                JOIN LATERAL (
+                    SELECT r.rd30full, ST_Distance(r.geom, p.c) AS degrees, ST_DistanceSphere(r.geom, p.c) AS meters
+                    FROM {Roads._meta.db_table} r
+                    WHERE r.funclass = 'F' AND ST_DWithin(r.geom, p.c, %s)
+                    ORDER BY r.geom <-> p.c
+                    LIMIT 1
+                ) f ON true
+                """,
+                [*ids_params, float(radii.max())],
+            )
+            nearest = {parcel_id: (name, degrees, meters) for parcel_id, name, degrees, meters in cursor.fetchall()}
+        results = {}
+        for parcel_id, radius in zip(ids, radii, strict=True):
+            name, degrees, meters = nearest.get(parcel_id, (None, None, None))
+            if degrees is None or degrees > radius:
+                results[parcel_id] = (CheckResultEnum.passed, ["No freeways within 500 feet"])
+            else:
+                results[parcel_id] = (CheckResultEnum.failed, [f"Near freeway: {name}, {round(meters)} feet away"])
+        return results
+
 
 class NotNearOilGas(EligibilityCheck):
     def __init__(self) -> None:
@@ -314,6 +515,10 @@ class EligibilityCheckSuite:
         self.result = self.check.run(parcel)
         return self.result
 
+    def run_set(self, parcels: QuerySet) -> dict[int, EligibilityCheck]:
+        """The suite's check tree for each parcel in the queryset, using the checks' set-based forms"""
+        return self.check.run_set(parcels)
+
 
 class AB2011Eligible(EligibilityCheckSuite):
     def __init__(self) -> None:
@@ -338,3 +543,66 @@ class AB2011Eligible(EligibilityCheckSuite):
             ]
         )
         super().__init__(check, name, description)
+
+
+# Tables the AB2011Eligible checks read. A stored result older than any of them is recomputed.
+AB2011_BASE_DATA = (Parcel, ZoningBase, Roads, AnalyzedRoad)
+
+
+def run_ab2011(parcel: Parcel, save: bool = True) -> dict:
+    """Run AB2011Eligible on the parcel and, if save is set, store the result in AnalyzedParcel. Returns the check
+    tree as a dict."""
+    suite = AB2011Eligible()
+    result = suite.run(parcel)
+    check = json.loads(suite.check.json())
+    if not save:
+        return check
+    AnalyzedParcel.objects.update_or_create(
+        apn=parcel,
+        defaults={
+            "ab2011_eligible": result,
+            "ab2011_result": check,
+            "ab2011_computed": datetime.datetime.now(datetime.UTC),
+        },
+    )
+    return check
+
+
+def run_ab2011_set(parcels: QuerySet, batch_size: int = 5000) -> Counter:
+    """Run AB2011Eligible on every parcel in the queryset, a batch at a time with the checks' set-based forms, and
+    store the results in AnalyzedParcel. Returns the number of parcels with each result."""
+    suite = AB2011Eligible()
+    stats = Counter()
+    ids = list(parcels.order_by("id").values_list("id", flat=True))
+    for start in range(0, len(ids), batch_size):
+        computed = datetime.datetime.now(datetime.UTC)
+        checks = suite.run_set(Parcel.objects.using(parcels.db).filter(id__in=ids[start : start + batch_size]))
+        AnalyzedParcel.objects.bulk_create(
+            [
+                AnalyzedParcel(
+                    apn_id=parcel_id,
+                    ab2011_eligible=check.result,
+                    ab2011_result=json.loads(check.json()),
+                    ab2011_computed=computed,
+                )
+                for parcel_id, check in checks.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["apn"],
+            update_fields=["ab2011_eligible", "ab2011_result", "ab2011_computed"],
+        )
+        stats.update(check.result for check in checks.values())
+        log.info(f"AB2011: {min(start + batch_size, len(ids))}/{len(ids)} parcels, {dict(stats)}")
+    return stats
+
+
+def ab2011_result(parcel: Parcel) -> dict:
+    """The AB2011Eligible check tree for the parcel, from AnalyzedParcel unless the base data changed since it was
+    computed. A recomputed result isn't stored: this is called from GET requests, and storing it would change the
+    parcel's tiles without invalidating them. `manage.py dataprep ab2011` stores results in bulk."""
+    stored = AnalyzedParcel.objects.filter(apn=parcel).only("ab2011_result", "ab2011_computed").first()
+    if stored and stored.ab2011_result is not None:
+        base_version = DataVersion.latest(*AB2011_BASE_DATA)
+        if base_version is None or stored.ab2011_computed >= base_version:
+            return stored.ab2011_result
+    return run_ab2011(parcel, save=False)
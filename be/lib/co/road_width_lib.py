@@ -0,0 +1,489 @@
+"""
+Road width analysis for AB2011's commercial corridor check: measure how wide each road segment is between the parcels
+on either side of it, and store the result in AnalyzedRoad.
+
+A segment's width is measured at a few points along it (more for longer segments) by casting a line normal to the
+road and clipping it against the surrounding parcels. Segments inside or crossing a parcel, or whose measurements
+disagree, get a status instead of widths.
+
+Roads are partitioned into a grid of spatial tiles by centroid (see lib.tile_lib), and each worker process measures
+one tile at a time and writes its AnalyzedRoads in bulk. Completed tiles are recorded in a checkpoint file, so an
+interrupted run picks up where it left off:
+
+    ./manage.py co eligible --n-jobs 8           # resumes from the checkpoint, if there is one
+    ./manage.py co eligible --restart            # measures every road again
+
+NOTE: Workers run in fresh processes, so tile work items are plain roadsegid lists.
+"""
+from __future__ import annotations
+
+import datetime
+import json
+import logging
+import statistics
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+
+import geopandas
+import numpy as np
+import pyproj
+from django.contrib.gis.db.models.functions import Centroid
+from django.contrib.gis.geos import GEOSGeometry, Polygon
+from geopandas import GeoDataFrame, GeoSeries
+from joblib import Parallel, delayed
+from shapely.geometry import LineString, box
+from shapely.geometry.base import BaseGeometry
+from shapely.prepared import prep
+from world.models import DataVersion, Parcel, Roads
+from world.models.models import AnalyzedRoad
+
+from lib.parcel_analysis_2022.crs_lib import meters_to_latlong
+from lib.parcel_analysis_2022.parcel_lib import models_to_utm_gdf, normalize_geometries
+from lib.tile_lib import Tile, partition_points
+
+log = logging.getLogger(__name__)
+
+# ~1km in San Diego, a few hundred road segments in dense areas
+DEFAULT_TILE_SIZE = 0.01
+# Fixed grid origin, so tiles (and the checkpoint) are the same from run to run
+GRID_ORIGIN = (0.0, 0.0)
+# Road functional classes we don't measure: freeways, highways, ramps, etc.
+EXCLUDED_FUNCLASSES = ["1", "A", "B", "F", "W"]
+# Normals are cast this far across the road (in meters), and widths over MAX_WIDTH are thrown out
+NORMAL_LENGTH = 200
+MAX_WIDTH = 150
+# Widths recorded for failed measurements
+NORMAL_CROSSES_ROADS = -1
+NORMAL_EMPTY = -2
+NORMAL_TOO_LONG = -3
+# A road's neighbourhood: the roads this close to it (in meters), and the parcels twice as close to its centroid
+NEIGHBOURHOOD_DISTANCE = 100
+ANALYZED_ROAD_FIELDS = ["status", "low_width", "avg_width", "high_width", "stdev_width", "all_widths"]
+
+
+def roads_to_measure():
+    # TODO: We don't clean up ANalyzedRoad entries that should be excluded. Maybe we should list *all* roads in
+    #  AnalyzedRoads, even ones we aren't analyzing. If we do that we need to index on exclusion criteria.
+    return Roads.objects.filter(lpsjur="SD").exclude(funclass__in=EXCLUDED_FUNCLASSES)
+
+
+def partition_roads(tile_size: float = DEFAULT_TILE_SIZE) -> dict[Tile, list[int]]:
+    """Group the roadsegids of the roads to measure into tiles by road centroid"""
+    roads = roads_to_measure().annotate(centroid=Centroid("geom")).order_by("roadsegid")
+    points = (
+        (segid, c.x, c.y) for segid, c in roads.values_list("roadsegid", "centroid").iterator(chunk_size=10_000)
+    )
+    return partition_points(points, GRID_ORIGIN, tile_size)
+
+
+def _within(df: GeoDataFrame, geom: BaseGeometry, distance: float) -> GeoDataFrame:
+    """Rows of the frame within a distance of the geometry, nearest first. Candidates come from the frame's spatial
+    index."""
+    if len(df) == 0:
+        return df
+    minx, miny, maxx, maxy = geom.bounds
+    candidates = df.iloc[df.sindex.query(box(minx - distance, miny - distance, maxx + distance, maxy + distance))]
+    distances = candidates.distance(geom).values
+    order = np.argsort(distances, kind="stable")
+    return candidates.iloc[order[distances[order] <= distance]]
+
+
+@dataclass
+class TileContext:
+    """Parcels and roads around a tile's roads, loaded once and projected to UTM, so measuring each road doesn't need
+    its own spatial queries. Each road's neighbourhood is sliced out of the tile's frames with their spatial indexes
+    (STRtrees), so overlapping neighbourhoods share the same geometries."""
+
+    parcels: GeoDataFrame
+    roads: GeoDataFrame
+
+    def __post_init__(self):
+        self._road_positions = {m.pk: i for i, m in enumerate(self.roads.get("model", []))}
+
+    @classmethod
+    def load(cls, area: GEOSGeometry, crs: pyproj.CRS) -> TileContext:
+        """Load the parcels and roads that intersect the area"""
+        starttime = time.perf_counter()
+        parcels = Parcel.objects.using("basedata").filter(geom__intersects=area).order_by("apn")
+        roads = Roads.objects.using("basedata").filter(geom__intersects=area).order_by("roadsegid")
+        context = cls(
+            parcels=models_to_utm_gdf(list(parcels), crs, fields=["apn", "address", "geom"]),
+            roads=models_to_utm_gdf(list(roads), crs, fields=["rd30full", "length", "rightway", "geom"]),
+        )
+        log.debug(
+            f"Loaded {len(context.parcels)} parcels and {len(context.roads)} roads in "
+            f"{time.perf_counter() - starttime} seconds"
+        )
+        return context
+
+    @classmethod
+    def around(
+        cls, geoms: list[GEOSGeometry], crs: pyproj.CRS, distance: float = NEIGHBOURHOOD_DISTANCE
+    ) -> TileContext:
+        """Load everything in the neighbourhoods (see neighbourhood()) of the lat/long geometries"""
+        extent = geoms[0].extent
+        for geom in geoms[1:]:
+            e = geom.extent
+            extent = (min(extent[0], e[0]), min(extent[1], e[1]), max(extent[2], e[2]), max(extent[3], e[3]))
+        lat_delta, long_delta = meters_to_latlong(
+            2 * distance, baselat=(extent[1] + extent[3]) / 2, baselong=(extent[0] + extent[2]) / 2
+        )
+        margin = max(abs(lat_delta), abs(long_delta))
+        return cls.load(
+            Polygon.from_bbox((extent[0] - margin, extent[1] - margin, extent[2] + margin, extent[3] + margin)), crs
+        )
+
+    def road_df(self, roadsegid: int) -> GeoDataFrame:
+        """A loaded road, as a one-row frame"""
+        return self.roads.iloc[[self._road_positions[roadsegid]]]
+
+    def neighbourhood(
+        self, geom: BaseGeometry, distance: float = NEIGHBOURHOOD_DISTANCE
+    ) -> tuple[GeoDataFrame, GeoDataFrame]:
+        """The roads within a distance (in meters) of a UTM geometry, and the parcels within twice the distance of its
+        centroid, nearest first"""
+        return _within(self.roads, geom, distance), _within(self.parcels, geom.centroid, 2 * distance)
+
+
+def get_nearby_utm_dfs(model_obj, distance, crs) -> tuple[GeoDataFrame, GeoDataFrame, GeoDataFrame]:
+    """Return dataframes of a Django model object w/ a geom field, and of the roads and parcels within a distance (in
+    meters) of it, in UTM coordinates. To do this for many objects, load a TileContext for all of them."""
+    model_obj_df = models_to_utm_gdf([model_obj], crs)
+    roads_df, near_parcels_df = TileContext.around([model_obj.geom], crs, distance).neighbourhood(
+        model_obj_df.geometry.values[0], distance
+    )
+    return model_obj_df, roads_df, near_parcels_df
+
+
+def get_nearby_parcels_and_roads_df(model_obj, distance, crs):
+    """Same as get_nearby_utm_dfs(), with everything moved so the model object is at 0,0, for plotting"""
+    model_obj_df, roads_df, near_parcels_df = get_nearby_utm_dfs(model_obj, distance, crs)
+    model_obj_xlat, [roads_xlat, near_parcels_xlat] = normalize_geometries(model_obj_df, [roads_df, near_parcels_df])
+
+    return model_obj_xlat, roads_xlat, near_parcels_xlat
+
+
+def _subsegments(length_ft: float) -> list[float]:
+    """Where along the road (as a fraction of its length) to measure its width"""
+    subsegs = [0.45]
+    if length_ft > 100:
+        subsegs.extend([0.35, 0.55])
+    if length_ft > 200:
+        subsegs.extend([0.65, 0.25])
+    if length_ft > 400:
+        subsegs.extend([0.75, 0.15])
+    return subsegs
+
+
+def check_road(analyzed_road: AnalyzedRoad, road_df: GeoDataFrame, parcels_df: GeoDataFrame, stats: Counter) -> bool:
+    """Whether a road segment can be measured. If not, sets the AnalyzedRoad's status."""
+    road = analyzed_road.road
+    log.info(
+        f"Calculating road roadsegid={road.roadsegid} : {road.abloaddr}-{road.abhiaddr} {road.rd30full}"
+        f". Length={round(road_df.length.values[0], 1)} meters"
+    )
+    # CHeck if segment is in any parcel. if any result of the join is not NAN, then it's in a parcel
+    if road_df.sjoin(parcels_df, how="left").model_right.notna().any():
+        log.info("Road segment is inside a parcel. Skipping")
+        stats["skip:inside_parcel"] += 1
+        analyzed_road.status = AnalyzedRoad.Status.INSIDE_PARCEL
+        return False
+    if len(parcels_df) and road_df.intersects(parcels_df.unary_union).values[0]:
+        log.info("  Road segment crosses a parcel boundary - skipping")
+        stats["skip:crosses_parcel"] += 1
+        analyzed_road.status = AnalyzedRoad.Status.CROSSES_PARCEL
+        return False
+    return True
+
+
+def road_normals(road_geoms: GeoSeries, fractions: np.ndarray) -> tuple[GeoSeries, GeoSeries]:
+    """Lines normal to each road at a fraction of its length, NORMAL_LENGTH long and centered on the road, and the
+    short piece of road each crosses. road_geoms and fractions are parallel: one entry per normal."""
+    starts = road_geoms.interpolate(fractions, normalized=True)
+    ends = road_geoms.interpolate(fractions + 0.1, normalized=True)
+    x0, y0, x1, y1 = starts.x.values, starts.y.values, ends.x.values, ends.y.values
+    dx, dy = x1 - x0, y1 - y0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scale = NORMAL_LENGTH / 2 / np.hypot(dx, dy)
+    mid_x, mid_y = (x0 + x1) / 2, (y0 + y1) / 2
+    nx0, ny0 = mid_x - dy * scale, mid_y + dx * scale
+    nx1, ny1 = mid_x + dy * scale, mid_y - dx * scale
+    # No direction to be normal to where the road doubles back on itself
+    ok = np.isfinite(scale)
+    normals = [
+        LineString([(nx0[i], ny0[i]), (nx1[i], ny1[i])]) if ok[i] else LineString() for i in range(len(fractions))
+    ]
+    mid_lines = [LineString([(x0[i], y0[i]), (x1[i], y1[i])]) for i in range(len(fractions))]
+    return GeoSeries(normals, crs=road_geoms.crs), GeoSeries(mid_lines, crs=road_geoms.crs)
+
+
+def measure_widths(
+    road_geoms: GeoSeries,
+    lengths_ft: list[float],
+    parcels: GeoSeries,
+    roads: GeoSeries,
+    stats: Counter,
+    road_neighbourhoods: list[list] | None = None,
+) -> list[list[float]]:
+    """Measure the widths of many road segments at once, against the parcels and roads around all of them. Returns
+    each road's widths at its subsegments; failed measurements are negative (see the NORMAL_* codes).
+
+    Every normal of every road is clipped against the union of the parcels in one vectorized difference. The piece
+    that crosses the road is its width, unless it crosses other roads too or is too long. If road_neighbourhoods is
+    given, it has the index labels in roads of each road's own neighbourhood, and only those roads count as crossed
+    for that road's normals. Otherwise every road in roads does.
+
+    Unlike the crossed roads, the parcels aren't limited to each road's own neighbourhood: near the ends of a long
+    road, a normal can be clipped by a parcel that's more than 2 * NEIGHBOURHOOD_DISTANCE from the road's centroid
+    but in another road's neighbourhood. Measuring roads one at a time would leave that normal unclipped there."""
+    subsegments = [_subsegments(length) for length in lengths_ft]
+    counts = np.array([len(s) for s in subsegments])
+    if not counts.sum():
+        return []
+    road_idx = np.repeat(np.arange(len(subsegments)), counts)
+    fractions = np.concatenate([np.array(s) for s in subsegments])
+    normals, mid_lines = road_normals(road_geoms.iloc[road_idx].reset_index(drop=True), fractions)
+
+    # Only normals that reach a parcel need clipping
+    clipped = normals.copy()
+    if len(parcels):
+        parcel_union = parcels.unary_union
+        prepared_union = prep(parcel_union)
+        hits = np.array([not normal.is_empty and prepared_union.intersects(normal) for normal in normals])
+        if hits.any():
+            clipped[hits] = normals[hits].difference(parcel_union)
+    # There can be more than one clipped piece, so keep the ones that cross the segment being measured
+    pieces = clipped.explode(index_parts=False)
+    pieces = pieces[~pieces.is_empty & pieces.intersects(mid_lines.loc[pieces.index], align=False)]
+    normal_idx = pieces.index.values
+    n_pieces = np.bincount(normal_idx, minlength=len(normals))
+    # Check that the normal didn't extend out past other roads: every road a piece crosses, including the one being
+    # measured, is a row of the join (and a piece crossing no road is one row)
+    rows = np.zeros(len(normals), dtype=int)
+    if len(pieces):
+        joined = geopandas.sjoin(
+            GeoDataFrame(geometry=pieces.reset_index(drop=True)), GeoDataFrame(geometry=roads), how="left"
+        )
+        crossed = joined.index.values
+        if road_neighbourhoods is not None:
+            allowed = {(i, label) for i, labels in enumerate(road_neighbourhoods) for label in labels}
+            measured = road_idx[normal_idx[crossed]]
+            no_road = joined["index_right"].isna().values
+            keep = [no_road[j] or (measured[j], label) in allowed for j, label in enumerate(joined["index_right"])]
+            crossed = crossed[np.array(keep, dtype=bool)]
+        rows = np.bincount(normal_idx[crossed], minlength=len(normals))
+    lengths = np.round(np.bincount(normal_idx, weights=pieces.length.values, minlength=len(normals)), 2)
+
+    widths = np.select(
+        [rows > 1, n_pieces == 0, lengths > MAX_WIDTH],
+        [NORMAL_CROSSES_ROADS, NORMAL_EMPTY, NORMAL_TOO_LONG],
+        default=lengths,
+    )
+    stats["skip_subseg:crosses_more_than_one_road"] += int((widths == NORMAL_CROSSES_ROADS).sum())
+    stats["skip_subseg:empty"] += int((widths == NORMAL_EMPTY).sum())
+    stats["skip_subseg:width_too_large"] += int((widths == NORMAL_TOO_LONG).sum())
+    stats["ok_subseg"] += int((widths >= 0).sum())
+    return [w.tolist() for w in np.split(widths, np.cumsum(counts)[:-1])]
+
+
+def measure_widths_separately(
+    context: TileContext,
+    road_geoms: GeoSeries,
+    lengths_ft: list[float],
+    road_parcels: list[list],
+    road_neighbourhoods: list[list],
+    stats: Counter,
+) -> list[list[float] | None]:
+    """measure_widths() for each road on its own, against the parcels and roads of its neighbourhood (index labels in
+    the context's frames). Widths are None for roads whose measurement raised."""
+    all_widths = []
+    for i, (parcels, roads) in enumerate(zip(road_parcels, road_neighbourhoods, strict=True)):
+        try:
+            [widths] = measure_widths(
+                road_geoms.iloc[[i]],
+                [lengths_ft[i]],
+                context.parcels.geometry.loc[parcels],
+                context.roads.geometry.loc[roads],
+                stats,
+            )
+        except Exception:
+            log.exception(f"Error measuring road {i} of {len(road_geoms)} on its own")
+            widths = None
+        all_widths.append(widths)
+    return all_widths
+
+
+def _summarize_widths(analyzed_road: AnalyzedRoad, road_widths: list[float], stats: Counter) -> AnalyzedRoad:
+    analyzed_road.all_widths = road_widths
+    good_widths = sorted(x for x in road_widths if x >= 0)
+    if len(good_widths) == 0:
+        log.info("  No good road widths found - skipping road")
+        stats["skip:no_good_widths"] += 1
+        analyzed_road.status = AnalyzedRoad.Status.NO_WIDTHS
+        return analyzed_road
+    if len(good_widths) > 4:
+        # with at least 5 entries, throw away largest and smallest
+        good_widths = good_widths[1:-1]
+    analyzed_road.avg_width = round(statistics.mean(good_widths), 2)
+    analyzed_road.stdev_width = round(statistics.pstdev(good_widths, analyzed_road.avg_width), 2)
+    if analyzed_road.stdev_width / analyzed_road.avg_width > 0.1:
+        stats["skip:width_too_unstable"] += 1
+        log.info("  Road width stdev is too large - skipping road")
+        analyzed_road.status = AnalyzedRoad.Status.UNSTABLE_WIDTHS
+        return analyzed_road
+    analyzed_road.low_width = good_widths[0]
+    analyzed_road.high_width = good_widths[-1]
+    stats["ok"] += 1
+    return analyzed_road
+
+
+def measure_tile(roadsegids: list[int], crs: pyproj.CRS) -> Counter:
+    """Measure the roads of one tile and upsert their AnalyzedRoads in one query. Returns stats for the tile."""
+    stats = Counter()
+    tile_roads = list(Roads.objects.filter(roadsegid__in=roadsegids).order_by("roadsegid"))
+    if not tile_roads:
+        return stats
+    context = TileContext.around([road.geom for road in tile_roads], crs)
+    analyzed, to_measure = [], []
+    road_geoms, parcel_idx, road_idx, road_parcels, road_neighbourhoods = [], set(), set(), [], []
+    for road in tile_roads:
+        analyzed_road = AnalyzedRoad(road=road)
+        analyzed.append(analyzed_road)
+        if road.length < 20:  # django object length is in feet
+            analyzed_road.status = AnalyzedRoad.Status.TOO_SHORT
+            stats["skip:too_short"] += 1
+            continue
+        try:
+            road_df = context.road_df(road.roadsegid)
+            roads_df, parcels_df = context.neighbourhood(road_df.geometry.values[0])
+            if not check_road(analyzed_road, road_df, parcels_df, stats):
+                continue
+        except Exception:
+            log.exception(f"Error processing road {road}")
+            analyzed_road.status = AnalyzedRoad.Status.EXCEPTION
+            stats["exception"] += 1
+            continue
+        to_measure.append(analyzed_road)
+        road_geoms.append(road_df.geometry.values[0])
+        parcel_idx.update(parcels_df.index)
+        road_idx.update(roads_df.index)
+        road_parcels.append(list(parcels_df.index))
+        road_neighbourhoods.append(list(roads_df.index))
+
+    lengths_ft = [r.road.length for r in to_measure]
+    try:
+        all_widths = measure_widths(
+            GeoSeries(road_geoms, crs=crs),
+            lengths_ft,
+            context.parcels.geometry.loc[sorted(parcel_idx)] if parcel_idx else GeoSeries([], crs=crs),
+            context.roads.geometry.loc[sorted(road_idx)] if road_idx else GeoSeries([], crs=crs),
+            stats,
+            road_neighbourhoods=road_neighbourhoods,
+        )
+    except Exception:
+        # eg. a bad geometry. Find the road(s) it's around so the rest of the tile is still measured.
+        log.exception(f"Error measuring {len(to_measure)} roads at once, measuring them one at a time")
+        all_widths = measure_widths_separately(
+            context, GeoSeries(road_geoms, crs=crs), lengths_ft, road_parcels, road_neighbourhoods, stats
+        )
+    for analyzed_road, road_widths in zip(to_measure, all_widths, strict=True):
+        if road_widths is None:
+            analyzed_road.status = AnalyzedRoad.Status.EXCEPTION
+            stats["exception"] += 1
+            continue
+        log.info(f"  Road {analyzed_road.road.roadsegid} widths: {road_widths}")
+        _summarize_widths(analyzed_road, road_widths, stats)
+
+    AnalyzedRoad.objects.bulk_create(
+        analyzed, update_conflicts=True, unique_fields=["road"], update_fields=ANALYZED_ROAD_FIELDS
+    )
+    stats["roads"] += len(analyzed)
+    return stats
+
+
+class Checkpoint:
+    """Tiles already measured, in a JSON file, for a given tile size and version of the Roads and Parcel data (see
+    road_data_version()). A checkpoint for other data is ignored, since its tiles would need measuring again."""
+
+    def __init__(self, path: Path, tile_size: float, data_version: str | None = None):
+        self.path = Path(path)
+        self.tile_size = tile_size
+        self.data_version = data_version
+        self.done: set[tuple[int, int]] = set()
+        if self.path.exists():
+            saved = json.loads(self.path.read_text())
+            if saved["tile_size"] != tile_size:
+                log.warning(f"Ignoring checkpoint {self.path}, it's for tile size {saved['tile_size']}")
+            elif saved.get("data_version") != data_version:
+                log.warning(f"Ignoring checkpoint {self.path}, roads or parcels were reloaded since")
+            else:
+                self.done = {tuple(ixy) for ixy in saved["done"]}
+
+    def is_done(self, tile: Tile) -> bool:
+        return (tile.ix, tile.iy) in self.done
+
+    def mark_done(self, tiles: list[Tile]):
+        self.done.update((tile.ix, tile.iy) for tile in tiles)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps({"tile_size": self.tile_size, "data_version": self.data_version, "done": sorted(self.done)})
+        )
+        tmp.replace(self.path)
+
+    def clear(self):
+        self.done = set()
+        self.path.unlink(missing_ok=True)
+
+
+def road_data_version() -> str | None:
+    """Identifies the loaded Roads and Parcel data that road widths are measured from"""
+    version = DataVersion.latest(Roads, Parcel)
+    return version.isoformat() if version else None
+
+
+def measure_roads(tiles: dict[Tile, list[int]], crs: pyproj.CRS, checkpoint: Checkpoint, n_jobs: int = 8) -> Counter:
+    """Measure the tiled roads, skipping tiles done in the checkpoint, a tile per worker task. Logs throughput and
+    an ETA as tiles complete. The checkpoint is deleted once every tile has been measured, so the next run measures
+    everything again. Returns overall stats."""
+    from lib.parcel_analysis_2022.parallel_worker import measure_road_tile_worker
+
+    work = [(tile, segids) for tile, segids in tiles.items() if not checkpoint.is_done(tile)]
+    total = sum(len(segids) for _, segids in work)
+    log.info(f"Measuring {total} roads in {len(work)} tiles ({len(tiles) - len(work)} tiles already done)")
+    stats = Counter()
+    start = time.monotonic()
+    done = 0
+    # A few tasks per worker at a time, so progress is checkpointed as we go
+    step = max(1, n_jobs * 4)
+    try:
+        with Parallel(n_jobs=n_jobs) as parallel:
+            for i in range(0, len(work), step):
+                batch = work[i : i + step]
+                if n_jobs == 1:
+                    results = [measure_road_tile_worker(tile, segids, crs) for tile, segids in batch]
+                else:
+                    results = parallel(delayed(measure_road_tile_worker)(tile, segids, crs) for tile, segids in batch)
+                for tile_stats in results:
+                    stats.update(tile_stats)
+                # Failed tiles are retried on the next run
+                checkpoint.mark_done(
+                    [
+                        tile
+                        for (tile, _), tile_stats in zip(batch, results, strict=True)
+                        if not tile_stats["tile_error"]
+                    ]
+                )
+                done += sum(len(segids) for _, segids in batch)
+                elapsed = time.monotonic() - start
+                rate = done / elapsed if elapsed else 0
+                eta = datetime.timedelta(seconds=round((total - done) / rate)) if rate else "?"
+                log.info(f"{done}/{total} roads, {rate:.1f} roads/s, ETA {eta}. Stats: {dict(stats)}")
+        if all(checkpoint.is_done(tile) for tile in tiles):
+            checkpoint.clear()
+    finally:
+        # AB2011 results computed from the old widths are stale, even if we didn't finish
+        if done:
+            DataVersion.bump(AnalyzedRoad)
+    return stats
@@ -1,8 +1,17 @@
+import datetime
+from types import SimpleNamespace
+from typing import ClassVar
+
 import pytest
 from world.models import Parcel
 
+from lib.co import co_eligibility_lib
 from lib.co.co_eligibility_lib import (
+    MIN_RUNS_FOR_ORDERING,
+    AndCheck,
+    CheckStats,
     CommercialCorridorCheck,
+    EligibilityCheck,
     PrincipallyPermittedUseCheck,
 )
 from lib.parcel_analysis_2022.types import CheckResultEnum
@@ -54,3 +63,115 @@ class TestPrincipallyPermittedUse:
         retval = use_check.run(parcel)
         assert retval == CheckResultEnum.error == use_check.result
         assert use_check.notes == ["No zoning found for this parcel"]
+
+
+class CannedCheck(EligibilityCheck):
+    """A check whose set-based results are given up front"""
+
+    canned: dict = {}
+
+    def run(self, parcel):
+        raise AssertionError("only run_set")
+
+    def run_set_results(self, parcels):
+        return self.canned
+
+
+class TestRunSet:
+    def test_and_check_stops_at_failure_per_parcel(self):
+        first = CannedCheck(
+            "first", "", canned={1: (CheckResultEnum.passed, ["ok"]), 2: (CheckResultEnum.failed, [])}
+        )
+        second = CannedCheck(
+            "second", "", canned={1: (CheckResultEnum.uncertain, ["hmm"]), 2: (CheckResultEnum.passed, [])}
+        )
+        checks = AndCheck([first, second]).run_set(parcels=None)
+        assert checks[1].result == CheckResultEnum.uncertain
+        assert [(c.result, c.notes) for c in checks[1].children] == [
+            (CheckResultEnum.passed, ["ok"]),
+            (CheckResultEnum.uncertain, ["hmm"]),
+        ]
+        assert checks[2].result == CheckResultEnum.failed
+        # like run(), checks after a failure show as not run
+        assert checks[2].children[1].result == CheckResultEnum.not_run
+
+    def test_evaluate(self):
+        assert PrincipallyPermittedUseCheck.evaluate(["CC-4-2"]) == (CheckResultEnum.passed, ["Zone(s): CC-4-2"])
+        assert PrincipallyPermittedUseCheck.evaluate([]) == (
+            CheckResultEnum.error,
+            ["No zoning found for this parcel"],
+        )
+        assert CommercialCorridorCheck.evaluate("1 MAIN", [(0, 30.0, 30.0)]) == (
+            CheckResultEnum.passed,
+            ["Road at 1 MAIN is 98.4 ft wide"],
+        )
+        assert CommercialCorridorCheck.evaluate("1 MAIN", [(0, 5.0, 6.0), (0, 5.0, 6.0)])[0] == CheckResultEnum.error
+
+
+class CountingCheck(EligibilityCheck):
+    """A check that returns a fixed result and counts its runs"""
+
+    fixed: CheckResultEnum = CheckResultEnum.passed
+    runs: ClassVar[dict] = {}
+
+    def run(self, parcel):
+        self.runs[self.name] = self.runs.get(self.name, 0) + 1
+        self.notes.append(f"ran on {parcel.apn}")
+        self.result = self.fixed
+        return self.result
+
+
+class TestAdaptiveAndCheck:
+    @pytest.fixture(autouse=True)
+    def _isolate(self, settings, monkeypatch):
+        settings.CACHES = {
+            **settings.CACHES,
+            "eligibility": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        }
+        monkeypatch.setattr(co_eligibility_lib, "CHECK_STATS", co_eligibility_lib.defaultdict(CheckStats))
+        CountingCheck.runs.clear()
+
+    def test_cost_per_failure(self):
+        stats = CheckStats()
+        assert stats.cost_per_failure == float("inf")
+        stats.record(CheckResultEnum.failed, 0.2)
+        stats.record(CheckResultEnum.passed, 0.2)
+        assert stats.failure_rate == 0.5
+        assert stats.cost_per_failure == pytest.approx(0.4)
+
+    def test_orders_cheap_selective_checks_first(self):
+        slow = CountingCheck("slow", "")
+        selective = CountingCheck("selective", "")
+        check = AndCheck([slow, selective])
+        assert check.evaluation_order() == [slow, selective]
+        for _ in range(MIN_RUNS_FOR_ORDERING):
+            co_eligibility_lib.CHECK_STATS["slow"].record(CheckResultEnum.failed, 1.0)
+            co_eligibility_lib.CHECK_STATS["selective"].record(CheckResultEnum.failed, 0.01)
+        assert check.evaluation_order() == [selective, slow]
+
+    def test_memoizes_per_parcel_and_data_version(self):
+        check = AndCheck([CountingCheck("a", ""), CountingCheck("b", "", fixed=CheckResultEnum.failed)])
+        parcel = SimpleNamespace(apn="123")
+        assert check.run(parcel, versions={}) == CheckResultEnum.failed
+        assert check.run(parcel, versions={}) == CheckResultEnum.failed
+        assert CountingCheck.runs == {"a": 1, "b": 1}
+        assert check.children[1].notes[-1] == "ran on 123"
+        assert co_eligibility_lib.CHECK_STATS["b"].failures == 1
+        # New data for a table the checks read
+        check.run(parcel, versions={"world.Parcel": datetime.datetime.now(datetime.UTC)})
+        assert CountingCheck.runs == {"a": 2, "b": 2}
+
+    def test_memo_is_per_check_logic(self, monkeypatch):
+        parcel = SimpleNamespace(apn="123")
+        CountingCheck("a", "").run_cached(parcel, versions={})
+        CountingCheck("a", "").run_cached(parcel, versions={})
+        assert CountingCheck.runs == {"a": 1}
+        # Different parameters
+        assert CountingCheck("a", "", fixed=CheckResultEnum.failed).run_cached(parcel, versions={}) == (
+            CheckResultEnum.failed
+        )
+        assert CountingCheck.runs == {"a": 2}
+        # New logic
+        monkeypatch.setattr(CountingCheck, "version", 2)
+        CountingCheck("a", "").run_cached(parcel, versions={})
+        assert CountingCheck.runs == {"a": 3}
@@ -0,0 +1,167 @@
+from collections import Counter
+
+import pytest
+from geopandas import GeoDataFrame, GeoSeries
+from shapely.geometry import LineString, Point, box
+from world.models.models import AnalyzedRoad
+
+from lib.co.road_width_lib import (
+    NORMAL_CROSSES_ROADS,
+    NORMAL_TOO_LONG,
+    Checkpoint,
+    TileContext,
+    _subsegments,
+    _summarize_widths,
+    measure_roads,
+    measure_widths,
+)
+from lib.tile_lib import tile_at
+
+
+class TestCheckpoint:
+    def test_round_trip(self, tmp_path):
+        path = tmp_path / "checkpoint.json"
+        checkpoint = Checkpoint(path, 0.01)
+        checkpoint.mark_done([tile_at(1, 2, (0.0, 0.0), 0.01), tile_at(-3, 4, (0.0, 0.0), 0.01)])
+        resumed = Checkpoint(path, 0.01)
+        assert resumed.is_done(tile_at(1, 2, (0.0, 0.0), 0.01))
+        assert resumed.is_done(tile_at(-3, 4, (0.0, 0.0), 0.01))
+        assert not resumed.is_done(tile_at(2, 1, (0.0, 0.0), 0.01))
+
+    def test_other_tile_size_is_ignored(self, tmp_path):
+        path = tmp_path / "checkpoint.json"
+        Checkpoint(path, 0.01).mark_done([tile_at(1, 2, (0.0, 0.0), 0.01)])
+        assert not Checkpoint(path, 0.02).is_done(tile_at(1, 2, (0.0, 0.0), 0.02))
+
+    def test_other_data_version_is_ignored(self, tmp_path):
+        path = tmp_path / "checkpoint.json"
+        Checkpoint(path, 0.01, "2026-01-01T00:00:00+00:00").mark_done([tile_at(1, 2, (0.0, 0.0), 0.01)])
+        assert Checkpoint(path, 0.01, "2026-01-01T00:00:00+00:00").is_done(tile_at(1, 2, (0.0, 0.0), 0.01))
+        assert not Checkpoint(path, 0.01, "2026-02-01T00:00:00+00:00").is_done(tile_at(1, 2, (0.0, 0.0), 0.01))
+
+    @pytest.mark.django_db
+    def test_deleted_once_every_tile_is_done(self, tmp_path, monkeypatch):
+        from lib.parcel_analysis_2022 import parallel_worker
+
+        def measure_road_tile_worker(tile, segids, crs):
+            return Counter(roads=len(segids), tile_error=int(tile.ix == 2 and fail))
+
+        monkeypatch.setattr(parallel_worker, "measure_road_tile_worker", measure_road_tile_worker)
+        path = tmp_path / "checkpoint.json"
+        tiles = {tile_at(1, 2, (0.0, 0.0), 0.01): [1, 2], tile_at(2, 2, (0.0, 0.0), 0.01): [3]}
+        fail = True
+        measure_roads(tiles, None, Checkpoint(path, 0.01), n_jobs=1)
+        # Resumed from the failed tile
+        checkpoint = Checkpoint(path, 0.01)
+        assert checkpoint.done == {(1, 2)}
+        fail = False
+        assert measure_roads(tiles, None, checkpoint, n_jobs=1)["roads"] == 1
+        assert not path.exists()
+
+    def test_clear(self, tmp_path):
+        path = tmp_path / "checkpoint.json"
+        checkpoint = Checkpoint(path, 0.01)
+        checkpoint.mark_done([tile_at(1, 2, (0.0, 0.0), 0.01)])
+        checkpoint.clear()
+        assert not path.exists()
+        assert not Checkpoint(path, 0.01).is_done(tile_at(1, 2, (0.0, 0.0), 0.01))
+
+
+class TestSummarizeWidths:
+    def test_subsegments_grow_with_length(self):
+        assert len(_subsegments(50)) == 1
+        assert len(_subsegments(150)) == 3
+        assert len(_subsegments(500)) == 7
+
+    def test_stable_widths(self):
+        stats = Counter()
+        road = _summarize_widths(AnalyzedRoad(), [30.0, 31.0, -1, 30.5], stats)
+        assert road.status == AnalyzedRoad.Status.OK
+        assert (road.low_width, road.high_width) == (30.0, 31.0)
+        assert stats["ok"] == 1
+
+    def test_no_good_widths(self):
+        road = _summarize_widths(AnalyzedRoad(), [-1, -2], Counter())
+        assert road.status == AnalyzedRoad.Status.NO_WIDTHS
+
+    def test_unstable_widths(self):
+        road = _summarize_widths(AnalyzedRoad(), [10.0, 40.0], Counter())
+        assert road.status == AnalyzedRoad.Status.UNSTABLE_WIDTHS
+
+
+class TestMeasureWidths:
+    # A 100m road along the x axis, between parcels 20m apart
+    road = LineString([(0, 0), (100, 0)])
+    parcels = GeoSeries([box(-50, 10, 150, 60), box(-50, -60, 150, -10)])
+
+    def test_width_between_parcels(self):
+        stats = Counter()
+        [widths] = measure_widths(GeoSeries([self.road]), [328], self.parcels, GeoSeries([self.road]), stats)
+        assert widths == [20.0] * 5
+        assert stats["ok_subseg"] == 5
+
+    def test_normal_crossing_another_road(self):
+        other_road = LineString([(0, 5), (100, 5)])
+        widths = measure_widths(
+            GeoSeries([self.road]), [50], self.parcels, GeoSeries([self.road, other_road]), Counter()
+        )
+        assert widths == [[NORMAL_CROSSES_ROADS]]
+
+    def test_only_roads_in_the_neighbourhood_count(self):
+        # Another road crossing the normal, but it's only in the neighbourhood of some other road in the tile
+        other_road = LineString([(0, 5), (100, 5)])
+        roads = GeoSeries([self.road, other_road])
+        widths = measure_widths(
+            GeoSeries([self.road]), [50], self.parcels, roads, Counter(), road_neighbourhoods=[[0]]
+        )
+        assert widths == [[20.0]]
+        widths = measure_widths(
+            GeoSeries([self.road]), [50], self.parcels, roads, Counter(), road_neighbourhoods=[[0, 1]]
+        )
+        assert widths == [[NORMAL_CROSSES_ROADS]]
+
+    def test_many_roads_at_once(self):
+        far_road = LineString([(1000, 0), (1100, 0)])
+        widths = measure_widths(
+            GeoSeries([self.road, far_road]), [50, 50], self.parcels, GeoSeries([self.road, far_road]), Counter()
+        )
+        # The far road has no parcels around it, so its normal isn't clipped
+        assert widths == [[20.0], [NORMAL_TOO_LONG]]
+
+    def test_measure_separately(self, monkeypatch):
+        from lib.co import road_width_lib
+
+        bad_road = LineString([(1000, 0), (1100, 0)])
+        context = TileContext(parcels=GeoDataFrame(geometry=self.parcels), roads=GeoDataFrame(geometry=[self.road]))
+
+        def measure_widths(road_geoms, *args, **kwargs):
+            if road_geoms.iloc[0].equals(bad_road):
+                raise ValueError("bad geometry")
+            return original(road_geoms, *args, **kwargs)
+
+        original = road_width_lib.measure_widths
+        monkeypatch.setattr(road_width_lib, "measure_widths", measure_widths)
+        stats = Counter()
+        widths = road_width_lib.measure_widths_separately(
+            context, GeoSeries([self.road, bad_road]), [50, 50], [[0, 1], []], [[0], []], stats
+        )
+        assert widths == [[20.0], None]
+        assert stats["ok_subseg"] == 1
+
+
+class TestTileContext:
+    def test_neighbourhood(self):
+        road = LineString([(0, 0), (100, 0)])
+        context = TileContext(
+            parcels=GeoDataFrame(geometry=[box(40, 250, 60, 260), box(40, 150, 60, 160), box(40, 20, 60, 30)]),
+            roads=GeoDataFrame(geometry=[LineString([(0, 150), (100, 150)]), LineString([(0, 50), (100, 50)]), road]),
+        )
+        roads_df, parcels_df = context.neighbourhood(road, distance=100)
+        # Nearest first, and only within 100m of the road (200m of its centroid for parcels)
+        assert list(roads_df.index) == [2, 1]
+        assert list(parcels_df.index) == [2, 1]
+
+    def test_empty(self):
+        context = TileContext(parcels=GeoDataFrame(geometry=[]), roads=GeoDataFrame(geometry=[]))
+        roads_df, parcels_df = context.neighbourhood(Point(0, 0))
+        assert len(roads_df) == len(parcels_df) == 0
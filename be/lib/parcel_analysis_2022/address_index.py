@@ -0,0 +1,96 @@
+"""
+Match many street addresses to parcels in memory, eg. every scraped listing, instead of two Parcel queries per address.
+
+ParcelAddressIndex holds the address fields of every Parcel, grouped by street number. It's built with one query
+(about a minute for the county) and kept in the Django cache until the Parcel table changes (see
+parcel_table_fingerprint()). Addresses are parsed and disambiguated with the same rules as address_to_parcel(), so
+both give the same answers.
+"""
+from __future__ import annotations
+
+import logging
+from collections import Counter, defaultdict
+from collections.abc import Iterable
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from world.models import DataVersion, Parcel
+from world.models.models import PARCEL_ADDRESS_VERSION
+
+from .listings_lib import parse_address, pick_parcel
+
+log = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = "parcel-address-index-v1"
+CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+
+class ParcelAddress(NamedTuple):
+    """The Parcel fields address matching looks at"""
+
+    apn: str
+    situs_stre: str  # lowercased
+    situs_pre_field: str | None
+    situs_suff: str | None
+    situs_juri: str | None
+
+
+def parcel_table_fingerprint() -> str:
+    """Changes when Parcel rows are added or deleted, or their addresses are edited in place (which bumps
+    PARCEL_ADDRESS_VERSION, see Parcel.save())"""
+    agg = Parcel.objects.aggregate(count=Count("id"), max_id=Max("id"))
+    version = DataVersion.latest(PARCEL_ADDRESS_VERSION)
+    return f"{agg['count']}-{agg['max_id']}-{version.timestamp() if version else 0}"
+
+
+class ParcelAddressIndex:
+    def __init__(self, by_number: dict[int, list[ParcelAddress]]):
+        self.by_number = by_number
+
+    @classmethod
+    def build(cls) -> ParcelAddressIndex:
+        by_number = defaultdict(list)
+        rows = Parcel.objects.values_list(
+            "situs_addr", "apn", "situs_stre", "situs_pre_field", "situs_suff", "situs_juri"
+        ).order_by()
+        for situs_addr, apn, stre, pre, suff, juri in rows.iterator(chunk_size=20_000):
+            by_number[situs_addr].append(ParcelAddress(apn, (stre or "").lower(), pre, suff, juri))
+        return cls(dict(by_number))
+
+    @classmethod
+    def load(cls) -> ParcelAddressIndex:
+        """The index for the current Parcel table, from the Django cache or built and cached"""
+        key = f"{CACHE_KEY_PREFIX}-{parcel_table_fingerprint()}"
+        by_number = cache.get(key)
+        if by_number is None:
+            log.info("Building parcel address index")
+            by_number = cls.build().by_number
+            cache.set(key, by_number, timeout=CACHE_TIMEOUT)
+        log.info(f"Parcel address index has {sum(len(v) for v in by_number.values())} addresses")
+        return cls(by_number)
+
+    def resolve(self, addr: str, jurisdiction: str) -> tuple[ParcelAddress | None, str | None]:
+        """Same as address_to_parcel(), but returns a ParcelAddress"""
+        parsed, error = parse_address(addr)
+        if error:
+            return None, error
+        try:
+            candidates = self.by_number.get(int(parsed.addr_num), [])
+        except ValueError:
+            # address_to_parcel's query fails the same way
+            return None, "dberror-valueerror"
+        exact = [p for p in candidates if p.situs_stre == parsed.street_name]
+        inexact = [p for p in candidates if p.situs_stre.startswith(parsed.street_name)]
+        return pick_parcel(parsed, exact, inexact, jurisdiction)
+
+    def resolve_many(self, addrs: Iterable[str], jurisdiction: str) -> tuple[list[str | None], Counter]:
+        """APN matched for each address (None where there's no match), and how many addresses matched or failed
+        for each reason"""
+        apns, stats = [], Counter()
+        for addr in addrs:
+            match, error = self.resolve(addr, jurisdiction)
+            apns.append(match.apn if match else None)
+            stats[error or "success"] += 1
+        log.info(f"Resolved {len(apns)} addresses: {dict(stats)}")
+        return apns, stats
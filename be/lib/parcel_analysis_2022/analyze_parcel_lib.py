@@ -8,20 +8,21 @@ from __future__ import annotations
 import logging
 import pprint
 import secrets
-from collections import Counter, OrderedDict
+from collections import Counter, OrderedDict, defaultdict
+from collections.abc import Callable
 
-import boto3
 import django
 import pyproj
-from botocore.exceptions import ClientError
 from geopandas import GeoDataFrame
 from pydantic import BaseModel
 from shapely.ops import unary_union
 from world.models.base_models import Parcel
 from world.models.models import AnalyzedListing, PropertyListing
+from world.models.rental_data import RentalData
 
 from .neighborhoods import HIGH_PRIORITY_NEIGHBORHOODS
 from .parcel_lib import (
+    TileLayers,
     find_largest_rectangles_on_avail_geom,
     get_avail_floor_area,
     get_buffered_building_geom,
@@ -50,31 +51,18 @@ from datetime import date
 import matplotlib.colors as mcolors
 import matplotlib.pyplot as plt
 from joblib import Parallel, delayed
-from parsnip.settings import CLOUDFLARE_R2_ENABLED, env
-from parsnip.util import eprint
 
+from .figures_lib import FigurePublisher, ParcelFigures, get_image_store
 from .finance_lib import Financials
-from .plot_lib import plot_cant_build, plot_new_buildings, plot_split_lot
 from .re_params import BuildableUnit, ReParams, get_build_specs
+from .rent_index import get_rent_index
 from .rent_lib import RentService
+from .rent_planner import RentRequest, fetch_rent_requests, plan_rent_requests
 from .topo_lib import calculate_slopes_for_parcel, get_topo_lines
 from .zoning_rules import ZONING_FRONT_SETBACKS_IN_FEET, get_far
 
 log = logging.getLogger(__name__)
 
-# Connector to Cloudflare R2 for storing images. Ironically the instructions say to use the S3 API client!
-cloudflare_r2 = None
-if CLOUDFLARE_R2_ENABLED:
-    cloudflare_r2 = boto3.resource(
-        "s3",
-        endpoint_url=env("R2_ENDPOINT_URL"),
-        aws_access_key_id=env("R2_EDIT_ACCESS_KEY"),
-        aws_secret_access_key=env("R2_EDIT_SECRET_KEY"),
-    )
-else:
-    print("Cloudflare R2 is disabled")
-R2_BUCKET_NAME = "parsnip-images"
-
 MIN_BUILDING_AREA = 11  # ~150sqft
 MAX_BUILDING_AREA = 111  # ~1200sqft
 BUFFER_SIZES = {
@@ -88,35 +76,6 @@ MAX_ASPECT_RATIO = 2.5
 colorkeys = list(mcolors.XKCD_COLORS.keys())
 
 
-def save_and_upload_figures(
-    new_buildings_fig,
-    cant_build_fig,
-    split_lot_fig,
-    salt: str,
-    save_dir: str,
-    apn: str,
-    addr: str,
-    messages: dict[str, list[str]],
-    save_to_cloud: bool,
-) -> None:
-    # Save figures
-    new_buildings_fname = os.path.join(save_dir, "buildings-" + apn + ".jpg")
-    new_buildings_fig.savefig(new_buildings_fname)
-    cant_build_fname = os.path.join(save_dir, "cant-build-" + apn + ".jpg")
-    cant_build_fig.savefig(cant_build_fname)
-
-    if split_lot_fig:
-        split_lot_fig.savefig(os.path.join(save_dir, "lot-splits-" + apn + ".jpg"))
-    if save_to_cloud:
-        print(f"**** SAVING images for address {addr} to Cloudflare R2 ****")
-        try:
-            cloudflare_r2.meta.client.upload_file(new_buildings_fname, R2_BUCKET_NAME, f"buildings-{apn}-{salt}")
-            cloudflare_r2.meta.client.upload_file(cant_build_fname, R2_BUCKET_NAME, f"cant_build-{apn}-{salt}")
-        except ClientError as e:
-            eprint(f"ERROR uploading images for {addr} to R2. Error = {e}")
-            messages["warning"].append(f"ERROR uploading images for {addr} to R2")
-
-
 def _get_existing_floor_area_stats(parcel: ParcelDC, buildings: GeoDataFrame):
     # Helper function to get existing stats
     # There's some overlap with parcel_lib, but keeping it here
@@ -153,9 +112,250 @@ def get_folder_name(neighborhood: str):
 rent_data = RentService()
 
 
+def get_interpolate_distance(property_listing: PropertyListing, is_mf: bool) -> int:
+    """Distance in meters we're willing to interpolate rents from before resorting to an API call"""
+    if property_listing.neighborhood in HIGH_PRIORITY_NEIGHBORHOODS:
+        return 500 if is_mf else 1000
+    return 3000
+
+
+def prefetch_rent_estimates(
+    parcels: list[Parcel], property_listings: list[PropertyListing], re_params: ReParams
+) -> dict[str, dict[tuple, tuple[float, float]]]:
+    """Interpolate, in bulk, every rent analyze_one_parcel() may need to interpolate for these parcels: their
+    existing units and each buildable ADU type, at each interpolation distance the parcel could use. Returns
+    apn -> estimates, to pass to rent_data.prime() before analyzing the parcel."""
+    requests = defaultdict(list)  # (br, ba, percentile, distance) -> [parcel]
+    for parcel, listing in zip(parcels, property_listings, strict=True):
+        unit_types = {
+            (min(u.br, 4), min(u.ba, 2), re_params.existing_unit_rent_percentile)
+            for u in parcel.rental_units
+            if u.br > 0 and u.ba > 0
+        }
+        unit_types |= {
+            (u.br, u.ba, re_params.new_unit_rent_percentile) for u in get_build_specs(re_params.constr_costs)
+        }
+        distances = {get_interpolate_distance(listing, is_mf) for is_mf in (False, True)}
+        for br, ba, percentile in unit_types:
+            for distance in distances:
+                requests[(br, ba, percentile, distance)].append(parcel)
+
+    estimates = defaultdict(dict)
+    for (br, ba, percentile, distance), req_parcels in requests.items():
+        centroids = [p.geom.centroid for p in req_parcels]
+        results = rent_data.interpolate_rents([(c.x, c.y) for c in centroids], br, ba, percentile, distance)
+        for parcel, result in zip(req_parcels, results, strict=True):
+            estimates[parcel.apn][(parcel.apn, br, ba, percentile, distance)] = result
+    return estimates
+
+
+def collect_missing_rents(
+    parcels: list[Parcel],
+    property_listings: list[PropertyListing],
+    re_params: ReParams,
+    rent_estimates: dict[str, dict[tuple, tuple[float, float]]],
+) -> list[RentRequest]:
+    """Rents these parcels will need that we can't get from the DB or interpolate (given rent_estimates from
+    prefetch_rent_estimates()), as Rentometer requests in priority order: existing units first, then ADUs for
+    multi-unit parcels, then ADUs for other parcels (which only need them if they're zoned multi-family)."""
+    have_data = set(
+        RentalData.objects.filter(parcel__in=[p.apn for p in parcels]).values_list("parcel_id", "br", "ba")
+    )
+    existing, mf_adus, other_adus = [], [], []
+    for parcel, listing in zip(parcels, property_listings, strict=True):
+        # We don't know yet if the zoning makes it multi-family, so be conservative
+        radius = min(get_interpolate_distance(listing, is_mf) for is_mf in (False, True))
+        centroid = parcel.geom.centroid
+        estimates = rent_estimates.get(parcel.apn, {})
+        needed = []  # (br, ba, percentile, is_adu)
+        if parcel.br >= 1 and parcel.ba >= 1:
+            needed += [
+                (min(u.br, 4), min(u.ba, 2), re_params.existing_unit_rent_percentile, False)
+                for u in parcel.rental_units
+            ]
+        needed += [
+            (u.br, u.ba, re_params.new_unit_rent_percentile, True) for u in get_build_specs(re_params.constr_costs)
+        ]
+        for br, ba, percentile, is_adu in needed:
+            if (parcel.apn, br, ba) in have_data:
+                continue
+            rent, _ = estimates.get((parcel.apn, br, ba, percentile, radius), (-1, 0))
+            if rent >= 0:
+                continue
+            request = RentRequest(parcel.apn, centroid.x, centroid.y, br, ba, radius, is_adu)
+            if not is_adu:
+                existing.append(request)
+            else:
+                (mf_adus if parcel.unitqty > 1 else other_adus).append(request)
+    return existing + mf_adus + other_adus
+
+
+def dev_scenarios_for_far_area(
+    price: int | None,
+    unitqty: int,
+    existing_units_rent: int,
+    far_area: int,
+    geom_area: int,
+    re_params: ReParams,
+    adu_rent_fn: Callable[[BuildableUnit], int | None],
+) -> list[DevScenario]:
+    """Find ADU development scenarios that fit in the available FAR area and lot area, and model their finances.
+
+    This is the pure finance part of the FAR-centric analysis: it doesn't touch the DB or geometry, so it can be
+    re-run cheaply with different ReParams (see sweep_reparams command).
+
+    Args:
+        price: listing price, or None if it or the existing rents are unknown (scenarios are recorded without
+            finances)
+        unitqty: number of existing units on the parcel
+        existing_units_rent: total monthly rent of the existing units
+        far_area: floor area available under FAR, in square meters
+        geom_area: open lot area available to build on, in square meters
+        re_params: real-estate parameters to use for the financial model
+        adu_rent_fn: returns the monthly rent for one unit of the given ADU spec, or None if unknown (the scenario
+            is recorded without finances)
+    """
+    valid_scenarios = []
+    # can typically do as many ADUs as there are current units
+    max_units_to_build = 3 if unitqty == 1 else unitqty
+    avail_far_sq_ft = far_area * 3.28 * 3.28
+    avail_area_sq_ft = geom_area * 3.28 * 3.28
+    # try scenarios:
+    #   * existing_unit_qty large ADUs (1-story)
+    #   * existing_unit_qty large ADUs (2-story)
+    #   * existing_unit_qty small ADUs (1-story)
+    #   * existing_unit_qty small ADUs (2-story)
+    #   If those fail, reduce quantity and try again
+
+    for adu_qty in range(max_units_to_build, 0, -1):
+        assert adu_qty >= 1
+        if valid_scenarios:
+            # no need to calculate fewer # of units if we have a working strategy with more units.
+            break
+        for adu_unit_spec in get_build_specs(re_params.constr_costs):
+            adu_sq_ft = adu_unit_spec.sqft * adu_qty
+            adu_lot_space = adu_unit_spec.lotspace_required * adu_qty
+
+            if adu_sq_ft <= avail_far_sq_ft and adu_lot_space <= avail_area_sq_ft:
+                # have a valid scenario. let's cost it out
+                if not price:
+                    # no price => can't model finances but can still record unit config
+                    valid_scenarios.append(DevScenario(adu_qty=adu_qty, unit_type=adu_unit_spec, finances=None))
+                    continue
+                # rent we can get:
+                adu_rent = adu_rent_fn(adu_unit_spec)
+                if adu_rent is None:
+                    # no rent => modeling finances would count the new units as earning nothing
+                    valid_scenarios.append(DevScenario(adu_qty=adu_qty, unit_type=adu_unit_spec, finances=None))
+                    continue
+                new_units_rent = adu_qty * adu_rent
+                # acquisition and construction costs:
+                finances = Financials()
+                constr_soft_cost = adu_sq_ft * re_params.constr_costs.soft_cost_rate
+                constr_hard_cost = adu_unit_spec.hard_build_cost * adu_qty
+                constr_adu_fees = 14000 + 10000 * adu_qty
+
+                try:
+                    finances.capital_flow["acquisition"] = [
+                        ("purchase", 0 - price, ""),
+                        ("renovation", -50000, ""),
+                    ]
+                except Exception as e:
+                    log.error(e, exc_info=True)
+                    raise
+                finances.capital_flow["construction"] = [
+                    (
+                        "hard costs",
+                        0 - constr_hard_cost,
+                        f"${adu_unit_spec.hard_cost_per_sqft} / sqft for {adu_unit_spec.stories} stories",
+                    ),
+                    (
+                        "soft costs",
+                        0 - constr_soft_cost,
+                        f"${re_params.constr_costs.soft_cost_rate} / sqft",
+                    ),
+                    (
+                        "adu fees",
+                        0 - constr_adu_fees,
+                        "$14K base plus $10K per unit (total guess)",
+                    ),
+                ]
+                total_constr_cost = constr_hard_cost + constr_soft_cost + constr_adu_fees
+                vacancy_cost = 0 - round(re_params.vacancy_rate * (new_units_rent + existing_units_rent))
+                insurance_cost = round((0 - price + total_constr_cost) * re_params.insurance_cost_rate / 12)
+                repair_cost = 0 - round(re_params.repair_cost_rate * (new_units_rent + existing_units_rent))
+                prop_taxes = round(0 - (price + total_constr_cost) * re_params.prop_tax_rate / 12)
+                mgmt_cost = 0 - round(re_params.mgmt_cost_rate * (new_units_rent + existing_units_rent))
+                finances.operating_flow = [
+                    [
+                        "rent: existing units",
+                        existing_units_rent,
+                        f"{re_params.existing_unit_rent_percentile}th percentile",
+                    ],
+                    [
+                        "rent: new units",
+                        new_units_rent,
+                        f"{re_params.new_unit_rent_percentile}th percentile",
+                    ],
+                    ["vacancy", vacancy_cost, f"{re_params.vacancy_rate * 100}% vacancy"],
+                    [
+                        "insurance",
+                        insurance_cost,
+                        f"{re_params.insurance_cost_rate * 100}% of prop value",
+                    ],
+                    [
+                        "repairs/maint",
+                        repair_cost,
+                        f"{re_params.repair_cost_rate * 100}% of rent",
+                    ],
+                    ["prop mgmt", mgmt_cost, f"{re_params.mgmt_cost_rate * 100}% of rent"],
+                    [
+                        "prop taxes",
+                        prop_taxes,
+                        f"{re_params.prop_tax_rate * 100}% of prop value",
+                    ],
+                ]
+
+                valid_scenarios.append(DevScenario(adu_qty=adu_qty, unit_type=adu_unit_spec, finances=finances))
+            # else:
+            #     print (f"Skipping putting {adu_qty} x {adu_scenario} units on lot, not enough room."
+            #            f"FAR avail={avail_far_sq_ft}, geom avail={avail_area_sq_ft}"
+            #            )
+    return valid_scenarios
+
+
+def existing_unit_rents(
+    property_listing: PropertyListing,
+    messages: dict,
+    interp_dist: int,
+    re_params: ReParams,
+    dry_run: bool,
+    rent_cache_only: bool = False,
+) -> tuple[list[int] | None, list[tuple[dict, int | None]]]:
+    """Rents for the listing's existing units, and each unit paired with its rent. When there's no rent data (a
+    cache-only miss, a request over the Rentometer budget, or a failed call) the rents are None, every unit's rent is
+    None, and the analysis is flagged with a "rent_missing" stat."""
+    existing_units = property_listing.parcel.rental_units
+    rents = rent_data.rent_for_location(
+        property_listing,
+        existing_units,
+        messages,
+        dry_run,
+        percentile=re_params.existing_unit_rent_percentile,
+        interpolate_distance=interp_dist,
+        cache_only=rent_cache_only,
+    )
+    if len(rents) != len(existing_units):
+        if not any(w.startswith("Missing rent") for w in messages["warning"]):
+            messages["warning"].append("Missing rent: no rent data for the existing units")
+        messages["stats"]["rent_missing"] += 1
+        return None, [(unit.dict(), None) for unit in existing_units]
+    return rents, list(zip([unit.dict() for unit in existing_units], rents, strict=True))
+
+
 def _dev_potential_by_far(
     property_listing: PropertyListing,
-    existing_units_rents: [int],
+    existing_units_rents: list[int] | None,
     messages: any,
     interp_dist: int,
     is_mf: bool,
@@ -163,134 +363,42 @@ def _dev_potential_by_far(
     geom_area: int,
     re_params: ReParams,
     dry_run: bool,
+    rent_cache_only: bool = False,
 ) -> list[DevScenario]:
-    valid_scenarios = []
-    existing_units_rent = sum(existing_units_rents)
-    if is_mf:
-        # can typically do as many ADUs as there are current units
-        existing_unit_qty = property_listing.parcel.unitqty
-        max_units_to_build = 3 if property_listing.parcel.unitqty == 1 else existing_unit_qty
-        avail_far_sq_ft = far_area * 3.28 * 3.28
-        avail_area_sq_ft = geom_area * 3.28 * 3.28
-        # try scenarios:
-        #   * existing_unit_qty large ADUs (1-story)
-        #   * existing_unit_qty large ADUs (2-story)
-        #   * existing_unit_qty small ADUs (1-story)
-        #   * existing_unit_qty small ADUs (2-story)
-        #   If those fail, reduce quantity and try again
-
-        for adu_qty in range(max_units_to_build, 0, -1):
-            assert adu_qty >= 1
-            if valid_scenarios:
-                # no need to calculate fewer # of units if we have a working strategy with more units.
-                break
-            for adu_unit_spec in get_build_specs(re_params.constr_costs):
-                adu_sq_ft = adu_unit_spec.sqft * adu_qty
-                adu_lot_space = adu_unit_spec.lotspace_required * adu_qty
-
-                if adu_sq_ft <= avail_far_sq_ft and adu_lot_space <= avail_area_sq_ft:
-                    # have a valid scenario. let's cost it out
-                    # rent we can get:
-                    new_units_rents = adu_qty * rent_data.rent_for_location(
-                        property_listing,
-                        [adu_unit_spec],
-                        messages,
-                        dry_run,
-                        percentile=re_params.new_unit_rent_percentile,
-                        is_adu=True,
-                        interpolate_distance=interp_dist,
-                    )
-                    if len(new_units_rents) >= 1:
-                        new_units_rent = sum(new_units_rents)
-                    else:
-                        print(f"Couldn't find rents at {property_listing.addr}")
-                        new_units_rent = 0
-                    # acquisition and construction costs:
-                    finances = Financials()
-                    constr_soft_cost = adu_sq_ft * re_params.constr_costs.soft_cost_rate
-                    constr_hard_cost = adu_unit_spec.hard_build_cost * adu_qty
-                    constr_adu_fees = 14000 + 10000 * adu_qty
-                    if not property_listing.price:
-                        # no price => can't model finances but can still record unit config
-                        valid_scenarios.append(DevScenario(adu_qty=adu_qty, unit_type=adu_unit_spec, finances=None))
-                        continue
-
-                    try:
-                        finances.capital_flow["acquisition"] = [
-                            ("purchase", 0 - property_listing.price, ""),
-                            ("renovation", -50000, ""),
-                        ]
-                    except Exception as e:
-                        log.error(e, exc_info=True)
-                        raise
-                    finances.capital_flow["construction"] = [
-                        (
-                            "hard costs",
-                            0 - constr_hard_cost,
-                            f"${adu_unit_spec.hard_cost_per_sqft} / sqft for {adu_unit_spec.stories} stories",
-                        ),
-                        (
-                            "soft costs",
-                            0 - constr_soft_cost,
-                            f"${re_params.constr_costs.soft_cost_rate} / sqft",
-                        ),
-                        (
-                            "adu fees",
-                            0 - constr_adu_fees,
-                            "$14K base plus $10K per unit (total guess)",
-                        ),
-                    ]
-                    total_constr_cost = constr_hard_cost + constr_soft_cost + constr_adu_fees
-                    vacancy_cost = 0 - round(re_params.vacancy_rate * (new_units_rent + existing_units_rent))
-                    insurance_cost = round(
-                        (0 - property_listing.price + total_constr_cost) * re_params.insurance_cost_rate / 12
-                    )
-                    repair_cost = 0 - round(re_params.repair_cost_rate * (new_units_rent + existing_units_rent))
-                    prop_taxes = round(
-                        0 - (property_listing.price + total_constr_cost) * re_params.prop_tax_rate / 12
-                    )
-                    mgmt_cost = 0 - round(re_params.mgmt_cost_rate * (new_units_rent + existing_units_rent))
-                    finances.operating_flow = [
-                        [
-                            "rent: existing units",
-                            existing_units_rent,
-                            f"{re_params.existing_unit_rent_percentile}th percentile",
-                        ],
-                        [
-                            "rent: new units",
-                            new_units_rent,
-                            f"{re_params.new_unit_rent_percentile}th percentile",
-                        ],
-                        ["vacancy", vacancy_cost, f"{re_params.vacancy_rate * 100}% vacancy"],
-                        [
-                            "insurance",
-                            insurance_cost,
-                            f"{re_params.insurance_cost_rate * 100}% of prop value",
-                        ],
-                        [
-                            "repairs/maint",
-                            repair_cost,
-                            f"{re_params.repair_cost_rate * 100}% of rent",
-                        ],
-                        ["prop mgmt", mgmt_cost, f"{re_params.mgmt_cost_rate * 100}% of rent"],
-                        [
-                            "prop taxes",
-                            prop_taxes,
-                            f"{re_params.prop_tax_rate * 100}% of prop value",
-                        ],
-                    ]
+    if not is_mf:
+        return []
 
-                    valid_scenarios.append(DevScenario(adu_qty=adu_qty, unit_type=adu_unit_spec, finances=finances))
-                # else:
-                #     print (f"Skipping putting {adu_qty} x {adu_scenario} units on lot, not enough room."
-                #            f"FAR avail={avail_far_sq_ft}, geom avail={avail_area_sq_ft}"
-                #            )
-        log.info(
-            f"For {property_listing.parcel.address} - APN {property_listing.parcel.apn} - FAR area,geom area "
-            f"avail={round(avail_far_sq_ft), round(avail_area_sq_ft)} - we found these scenarios:"
+    def adu_rent_fn(adu_unit_spec: BuildableUnit) -> int | None:
+        adu_rents = rent_data.rent_for_location(
+            property_listing,
+            [adu_unit_spec],
+            messages,
+            dry_run,
+            percentile=re_params.new_unit_rent_percentile,
+            is_adu=True,
+            interpolate_distance=interp_dist,
+            cache_only=rent_cache_only,
         )
-        log.info(f"{pprint.pformat(valid_scenarios)}")
-
+        if not adu_rents:
+            print(f"Couldn't find rents at {property_listing.addr}")
+            return None
+        return adu_rents[0]
+
+    # Without the existing units' rents, finances would be modeled with no income from them
+    valid_scenarios = dev_scenarios_for_far_area(
+        property_listing.price if existing_units_rents is not None else None,
+        property_listing.parcel.unitqty,
+        sum(existing_units_rents or []),
+        far_area,
+        geom_area,
+        re_params,
+        adu_rent_fn,
+    )
+    log.info(
+        f"For {property_listing.parcel.address} - APN {property_listing.parcel.apn} - FAR area,geom area "
+        f"avail={round(far_area * 3.28 * 3.28), round(geom_area * 3.28 * 3.28)} - we found these scenarios:"
+    )
+    log.info(f"{pprint.pformat(valid_scenarios)}")
     return valid_scenarios
 
 
@@ -304,19 +412,33 @@ def analyze_one_parcel(  # noqa: PLR0915 -- too many statements
     try_garage_conversion: bool = True,
     try_split_lot: bool = True,
     force_uploads: bool = False,
-) -> AnalyzedListing:
-    """Runs analysis on a single parcel of land
+    layers: TileLayers | None = None,
+    defer_save: bool = False,
+    rent_cache_only: bool = False,
+) -> tuple[AnalyzedListing, ParcelFigures | None]:
+    """Runs analysis on a single parcel of land.
+
+    Doesn't draw or upload the figures for the analysis; it returns the geometry for them instead, to be published
+    by a FigurePublisher (see figures_lib.py). Returns (analyzed listing, figures), where figures is None on a
+    dry run.
 
     Args:
         parcel_model (Parcel): A Parcel Model object that we want to analyse.
         utm_crs: (pyproj.CRS): Coordinate system to use for analysis.
         property_listing (PropertyListing):
         dry_run (Boolean):
-        save_dir (str): Directory to save the generated plots/csvs to. Defaults to DEFAULT_SAVE_DIR.
+        save_dir (str): Unused, figures are saved by the FigurePublisher.
         show_plot (Boolean, optional): Shows the parcel in a GUI. Defaults to False.
         try_garage_conversion (Boolean, optional): Whether to try converting garage to an ADU. Defaults to True.
         try_split_lot (Boolean, optional): Whether to try splitting the lot into two lots. Defaults to True.
-        force_uploads (Boolean, optional): Whether to force new uploads of images to R2.
+        force_uploads (Boolean, optional): Whether to force new uploads of images to R2 (by setting the salt on
+            the returned figures).
+        layers (TileLayers, optional): Preloaded buildings / zoning / TPA / neighboring parcels for the area, used
+            instead of querying them for this parcel.
+        defer_save (Boolean, optional): Return the AnalyzedListing (and figures) without saving it, so the caller
+            can save many in bulk. The caller is responsible for the salt.
+        rent_cache_only (Boolean, optional): Only use rents we already have (or can interpolate), never call the
+            rent API.
     """
 
     log.info(
@@ -331,7 +453,7 @@ def analyze_one_parcel(  # noqa: PLR0915 -- too many statements
     # *** 1. Get information about the parcel
 
     # Get parameters based on zoning
-    zone, is_tpa, is_mf = get_parcel_zone(parcel, utm_crs)
+    zone, is_tpa, is_mf = get_parcel_zone(parcel, utm_crs, layers)
 
     # Technically don't need side or rear setbacks, but buffer by a small amount
     # to account for errors
@@ -346,7 +468,7 @@ def analyze_one_parcel(  # noqa: PLR0915 -- too many statements
 
     # Compute the spaces that we can't build on
     # Then, the setbacks around the parcel edges
-    parcel_edges = get_street_side_boundaries(parcel, utm_crs)
+    parcel_edges = get_street_side_boundaries(parcel, utm_crs, layers)
     setbacks = get_setback_geoms(parcel.geometry, setback_widths, parcel_edges)
 
     # Insert Topography no-build zones - hardcoded to max 10% grade for the moment
@@ -354,7 +476,7 @@ def analyze_one_parcel(  # noqa: PLR0915 -- too many statements
     topos = get_topo_lines(parcel_model)
     topos_df = models_to_utm_gdf(topos, utm_crs)
 
-    buildings = get_buildings(parcel_model)
+    buildings = get_buildings(parcel_model, layers)
     if not len(buildings):
         log.info(f"No buildings found for parcel: {apn}")
         messages["warning"].append(f"No buildings found for parcel: {apn}")
@@ -387,23 +509,13 @@ def analyze_one_parcel(  # noqa: PLR0915 -- too many statements
     ) = _get_existing_floor_area_stats(parcel, buildings)
 
     # *** 2a. Compute rent for existing unit.
-    existing_units = property_listing.parcel.rental_units
-    if property_listing.neighborhood in HIGH_PRIORITY_NEIGHBORHOODS:
-        interp_dist = 500 if is_mf else 1000
-    else:
-        interp_dist = 3000
-    existing_units_rents = rent_data.rent_for_location(
-        property_listing,
-        existing_units,
-        messages,
-        dry_run,
-        percentile=re_params.existing_unit_rent_percentile,
-        interpolate_distance=interp_dist,
+    interp_dist = get_interpolate_distance(property_listing, is_mf)
+    existing_units_rents, existing_units_with_rent = existing_unit_rents(
+        property_listing, messages, interp_dist, re_params, dry_run, rent_cache_only
     )
-    existing_units_with_rent = list(zip([x.dict() for x in existing_units], existing_units_rents, strict=True))
 
     if (
-        not len(existing_units_rents)
+        not existing_units_rents
         and property_listing.br
         and property_listing.br > 0
         and property_listing.ba
@@ -423,6 +535,7 @@ def analyze_one_parcel(  # noqa: PLR0915 -- too many statements
         int(avail_geom.area),
         re_params,
         dry_run,
+        rent_cache_only,
     )
     # *** 2c. See what we can build on the lot -- geometry-focused
     new_building_polys = find_largest_rectangles_on_avail_geom(
@@ -454,36 +567,30 @@ def analyze_one_parcel(  # noqa: PLR0915 -- too many statements
         except Exception:
             messages["note"].append("Lot split attempt failed with exception")
 
-    # 3. *** Plot and/or save results
-    plt.close()
-    # Generate the figures
-    new_buildings_fig = plot_new_buildings(
-        parcel,
-        buildings,
-        utm_crs,
-        topos_df,
-        too_high_df,
-        too_low_df,
-        new_building_polys,
-        parcel_edges["front"],
-        flag_poly,
+    # 3. *** Collect the geometry for the figures. Rendering and saving them is up to the caller.
+    figures = ParcelFigures(
+        parcel=parcel,
+        utm_crs=utm_crs,
+        buildings=buildings,
+        topos=topos_df,
+        too_high_topos=too_high_df,
+        too_low_topos=too_low_df,
+        new_buildings=new_building_polys,
+        street_edges=parcel_edges["front"],
+        flag_poly=flag_poly,
+        buffered_buildings=buffered_buildings_geom,
+        setbacks=list(setbacks),
+        too_steep=too_steep,
+        second_lot=second_lot,
     )
-    cant_build_fig = plot_cant_build(
-        parcel,
-        buildings,
-        utm_crs,
-        buffered_buildings_geom,
-        list(setbacks),
-        too_steep,
-        flag_poly,
-        parcel_edges["front"],
-    )
-    split_lot_fig = plot_split_lot(parcel, buildings, utm_crs, second_lot) if second_lot else None
     # Show figures
     if show_plot:
+        plt.close("all")
+        figures.render(make_figure=plt.figure)
         plt.show()
-    max_cap_rate = 0
-    if dev_scenarios:
+    # No cap rate without the existing units' rents, so the listing sorts after the ones we could model
+    max_cap_rate = None if existing_units_rents is None else 0
+    if dev_scenarios and existing_units_rents is not None:
         cap_rates = [scenario.finances.cap_rate_calc for scenario in dev_scenarios if scenario.finances]
         cap_rates.append(0)  # in case there are no scenarios with finances
         max_cap_rate = max(cap_rates)
@@ -496,6 +603,7 @@ def analyze_one_parcel(  # noqa: PLR0915 -- too many statements
             "apn": apn,
             "address": parcel.model.address,
             "existing_units_with_rent": existing_units_with_rent,
+            "rent_missing": bool(messages["stats"]["rent_missing"]),
             "num_existing_buildings": num_existing_buildings,
             "carports": num_carports,
             "garages": num_garages,
@@ -550,7 +658,7 @@ def analyze_one_parcel(  # noqa: PLR0915 -- too many statements
         "zone": zone,
         "details": details,
         "input_parameters": input_parameters,
-        "geometry_details": {},
+        "geometry_details": figures.geometry_payload(),
         "dev_scenarios": dev_scenarios_dict,
         "parcel": parcel.model,
     }
@@ -558,7 +666,10 @@ def analyze_one_parcel(  # noqa: PLR0915 -- too many statements
         # dry-run -- create analyzed listing object but don't save it to DB, and bail out of function
         a = AnalyzedListing(**al_defaults)
         a.listing = property_listing
-        return a
+        return a, None
+    if defer_save:
+        a = AnalyzedListing(listing=property_listing, **al_defaults)
+        return a, figures
     a: AnalyzedListing
     created: bool
     a, created = AnalyzedListing.objects.update_or_create(listing=property_listing, defaults=al_defaults)
@@ -573,20 +684,11 @@ def analyze_one_parcel(  # noqa: PLR0915 -- too many statements
             a.salt = secrets.token_urlsafe(10)
         salt = a.salt
         a.save(update_fields=["salt"])
-        save_and_upload_figures(
-            new_buildings_fig,
-            cant_build_fig,
-            split_lot_fig,
-            salt,
-            save_dir,
-            apn,
-            parcel.model.address,
-            messages,
-            save_to_cloud=True,
-        )
+        # Tell the publisher to upload the images too.
+        figures.salt = salt
     else:
         log.debug(f"Reusing salt and images for {parcel.model.address}")
-    return a
+    return a, figures
 
 
 def analyze_batch(
@@ -598,6 +700,7 @@ def analyze_batch(
     limit: int = None,
     try_split_lot: bool = True,
     single_process: bool = False,
+    rent_budget: int | None = None,
 ) -> (list[AnalyzedListing], list[AnalyzedListing]):
     from .parallel_worker import analyze_one_parcel_worker
 
@@ -606,6 +709,7 @@ def analyze_batch(
         property_listings: a list of listings of same length as parcels. Maps each
         dry_run: if True, don't save anything to filesystem or DB
         parcel to a listing to save, if preferred
+        rent_budget: max number of Rentometer calls to make for the batch (None for no limit)
     """
     # Format save_dir properly
     save_dir = os.path.join(save_dir, "")
@@ -625,39 +729,50 @@ def analyze_batch(
     log.info(f"Found {len(parcels)} parcels. Analyzing {num_analyze}.")
 
     assert property_listings is not None
+    # Interpolate the rents all the parcels need in a few vectorized lookups, instead of one per unit per parcel
+    batch_parcels, batch_listings = parcels[:num_analyze], property_listings[:num_analyze]
+    rent_estimates = prefetch_rent_estimates(batch_parcels, batch_listings, ReParams())
+    # Fetch the missing rents in one planned pass, and don't let the analysis call Rentometer itself.
+    # (In dry-run mode, analysis makes its dummy calls as before.)
+    rent_cache_only = not dry_run
+    if rent_cache_only:
+        missing = collect_missing_rents(batch_parcels, batch_listings, ReParams(), rent_estimates)
+        if missing:
+            fetch_rent_requests(plan_rent_requests(missing, get_rent_index()), rent_budget)
+            rent_estimates = prefetch_rent_estimates(batch_parcels, batch_listings, ReParams())
     n_jobs = 1 if single_process else 8
     log.info(f"Launching {n_jobs} process for analysis...")
 
-    if n_jobs == 1:
-        results = [
-            analyze_one_parcel_worker(
-                parcels[i],
-                utm_crs,
-                property_listings[i],
-                dry_run,
-                save_dir=save_dir,
-                try_split_lot=try_split_lot,
-                i=i,
-            )
-            for i in range(num_analyze)
-        ]
-    else:
-        results = Parallel(n_jobs=n_jobs)(
-            delayed(analyze_one_parcel_worker)(
-                parcels[i],
-                utm_crs,
-                property_listings[i],
-                dry_run,
-                save_dir=save_dir,
-                try_split_lot=try_split_lot,
-                i=i,
-            )
-            for i in range(num_analyze)
-        )
-
-    analyzed = [x[0] for x in results if x[0] is not None]
-    errors = [x[1] for x in results if x[1] is not None]
-    log.info(f"Done analyzing {num_analyze} parcels. {len(errors)} errors")
+    def analyze_args(i: int) -> tuple[tuple, dict]:
+        args = (parcels[i], utm_crs, property_listings[i], dry_run)
+        kwargs = {
+            "save_dir": save_dir,
+            "try_split_lot": try_split_lot,
+            "rent_estimates": rent_estimates.get(parcels[i].apn),
+            "rent_cache_only": rent_cache_only,
+            "i": i,
+        }
+        return args, kwargs
+
+    analyzed, errors = [], []
+    # Render, save and upload the figures on a thread pool as results arrive, a few per worker at a time,
+    # so we don't hold the whole batch's figures in memory.
+    step = n_jobs * 4
+    with FigurePublisher(get_image_store(), save_dir) as publisher, Parallel(n_jobs=n_jobs) as parallel:
+        for start in range(0, num_analyze, step):
+            chunk = [analyze_args(i) for i in range(start, min(num_analyze, start + step))]
+            if n_jobs == 1:
+                results = [analyze_one_parcel_worker(*args, **kwargs) for args, kwargs in chunk]
+            else:
+                results = parallel(delayed(analyze_one_parcel_worker)(*args, **kwargs) for args, kwargs in chunk)
+            for listing, error, figures in results:
+                if listing is not None:
+                    analyzed.append(listing)
+                if error is not None:
+                    errors.append(error)
+                publisher.submit(figures)
+        log.info(f"Done analyzing {num_analyze} parcels. {len(errors)} errors")
+    log.info(f"Done publishing figures: {dict(publisher.stats)}")
     return analyzed, errors
 
 
@@ -1,5 +1,6 @@
 from math import asin, cos, radians, sin, sqrt
 
+import numpy as np
 import pyproj
 from pyproj import CRS, Transformer
 from pyproj.aoi import AreaOfInterest
@@ -39,6 +40,22 @@ def meters_to_latlong(meters, baselat, baselong):
     return (lat1 - lat2, long1 - long2)
 
 
+def meters_to_latlong_many(meters, baselats, baselongs) -> tuple[np.ndarray, np.ndarray]:
+    """meters_to_latlong() for arrays of base points. Points in the same UTM zone are transformed together."""
+    baselats, baselongs = np.asarray(baselats, dtype=float), np.asarray(baselongs, dtype=float)
+    lat_deltas, long_deltas = np.empty(len(baselats)), np.empty(len(baselats))
+    zones = np.floor((baselongs + 180) / 6) * np.sign(baselats + 1e-12)
+    for zone in np.unique(zones):
+        idx = np.flatnonzero(zones == zone)
+        crs = latlong_to_utm_crs(baselats[idx[0]], baselongs[idx[0]])
+        (base_x, base_y) = Transformer.from_crs("epsg:4326", crs).transform(baselats[idx], baselongs[idx])
+        transformer = Transformer.from_crs(crs_from=crs, crs_to="EPSG:4326")
+        (lat1, long1) = transformer.transform(meters + base_x, meters + base_y)
+        (lat2, long2) = transformer.transform(base_x, base_y)
+        lat_deltas[idx], long_deltas[idx] = lat1 - lat2, long1 - long2
+    return lat_deltas, long_deltas
+
+
 def latlong_to_meters(lat1, lon1, lat2, lon2):
     """
     Calculate the great circle distance between two points
@@ -0,0 +1,305 @@
+"""
+Rendering and publishing of the per-parcel analysis figures (new buildings, can't-build areas, lot splits).
+
+analyze_one_parcel() only computes geometry and returns it as a ParcelFigures. Turning that into JPEGs and getting
+them into the image store happens here, on a thread pool (FigurePublisher), so analysis workers don't spend their
+time in matplotlib or waiting on uploads.
+
+ParcelFigures.geometry_payload() is the vector alternative: the same layers as compact, quantized coordinates in the
+parcel's local frame, stored on AnalyzedListing.geometry_details for the frontend to draw itself.
+"""
+from __future__ import annotations
+
+import io
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import boto3
+import pyproj
+from boto3.s3.transfer import TransferConfig
+from geopandas import GeoDataFrame
+from matplotlib.figure import Figure
+from parsnip.settings import CLOUDFLARE_R2_ENABLED, LOCAL_IMAGE_STORE_DIR, env
+from shapely.geometry import LineString, MultiLineString, Polygon
+from shapely.geometry.base import BaseGeometry
+from shapely.ops import unary_union
+
+from .plot_lib import plot_cant_build, plot_new_buildings, plot_split_lot
+from .types import ParcelDC, Polygonal
+
+log = logging.getLogger(__name__)
+
+R2_BUCKET_NAME = "parsnip-images"
+GEOMETRY_PAYLOAD_SCALE = 0.1  # meters per unit of quantized coordinates
+
+
+class ImageStore(ABC):
+    """Somewhere to publish images to, under a flat key namespace"""
+
+    @abstractmethod
+    def put(self, key: str, data: bytes, content_type: str = "image/jpeg") -> None:
+        ...
+
+
+class R2ImageStore(ImageStore):
+    """Cloudflare R2 bucket. Ironically the instructions say to use the S3 API client!"""
+
+    def __init__(self, bucket: str = R2_BUCKET_NAME, max_concurrency: int = 4):
+        self.bucket = bucket
+        # boto3 clients (unlike resources) are safe to share between threads
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=env("R2_ENDPOINT_URL"),
+            aws_access_key_id=env("R2_EDIT_ACCESS_KEY"),
+            aws_secret_access_key=env("R2_EDIT_SECRET_KEY"),
+        )
+        # Big uploads are split into parts that are sent in parallel
+        self.transfer_config = TransferConfig(
+            multipart_threshold=1024 * 1024, multipart_chunksize=1024 * 1024, max_concurrency=max_concurrency
+        )
+
+    def put(self, key: str, data: bytes, content_type: str = "image/jpeg") -> None:
+        self.client.upload_fileobj(
+            io.BytesIO(data),
+            self.bucket,
+            key,
+            ExtraArgs={"ContentType": content_type},
+            Config=self.transfer_config,
+        )
+
+
+class LocalImageStore(ImageStore):
+    """Stand-in for R2 that writes to a local directory, for development and tests"""
+
+    def __init__(self, root: str | Path, bucket: str = R2_BUCKET_NAME):
+        self.root = Path(root) / bucket
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def put(self, key: str, data: bytes, content_type: str = "image/jpeg") -> None:
+        (self.root / key).write_bytes(data)
+
+
+def get_image_store() -> ImageStore | None:
+    """The image store for this environment: a local directory if LOCAL_IMAGE_STORE_DIR is set, otherwise R2 if
+    it's enabled. None means don't publish images."""
+    if LOCAL_IMAGE_STORE_DIR:
+        return LocalImageStore(LOCAL_IMAGE_STORE_DIR)
+    if CLOUDFLARE_R2_ENABLED:
+        return R2ImageStore()
+    return None
+
+
+@dataclass
+class ParcelFigures:
+    """The geometry needed to draw a parcel's analysis figures. Produced by analyze_one_parcel()."""
+
+    parcel: ParcelDC
+    utm_crs: pyproj.CRS
+    buildings: GeoDataFrame | None
+    topos: GeoDataFrame
+    too_high_topos: GeoDataFrame | None
+    too_low_topos: GeoDataFrame | None
+    new_buildings: list[Polygon]
+    street_edges: MultiLineString
+    flag_poly: Polygon | None
+    buffered_buildings: Polygonal | None
+    setbacks: list[Polygonal]
+    too_steep: list[Polygonal]
+    second_lot: Polygonal | None
+    # Set when the images should be published, to the salt used in their keys (see AnalyzedListing.salt)
+    salt: str | None = None
+
+    @property
+    def apn(self) -> str:
+        return self.parcel.model.apn
+
+    def render(self, make_figure: Callable[[str], Figure] = lambda name: Figure()) -> dict[str, Figure]:
+        """Draw the figures. Returns a dict of figure name -> Figure. Pass make_figure=plt.figure to get pyplot
+        figures you can plt.show()."""
+        figs = {
+            "buildings": plot_new_buildings(
+                self.parcel,
+                self.buildings,
+                self.utm_crs,
+                self.topos,
+                self.too_high_topos,
+                self.too_low_topos,
+                self.new_buildings,
+                self.street_edges,
+                self.flag_poly,
+                fig=make_figure(f"new_buildings-{self.apn}"),
+            ),
+            "cant_build": plot_cant_build(
+                self.parcel,
+                self.buildings,
+                self.utm_crs,
+                self.buffered_buildings,
+                self.setbacks,
+                self.too_steep,
+                self.flag_poly,
+                self.street_edges,
+                fig=make_figure(f"cant_build-{self.apn}"),
+            ),
+        }
+        if self.second_lot:
+            figs["lot_splits"] = plot_split_lot(
+                self.parcel, self.buildings, self.utm_crs, self.second_lot, fig=make_figure(f"lot_split-{self.apn}")
+            )
+        return figs
+
+    def geometry_payload(self, scale: float = GEOMETRY_PAYLOAD_SCALE) -> dict:
+        """The figures' layers as quantized geometry in the parcel's local frame (see quantize_geometry)."""
+        minx, miny, _, _ = self.parcel.geometry.bounds
+        origin = (round(minx, 2), round(miny, 2))
+
+        def layer(*geoms: BaseGeometry | None) -> list[dict]:
+            return [q for geom in geoms for q in quantize_geometry(geom, origin, scale)]
+
+        buildings = []
+        if self.buildings is not None:
+            for building_type, geom in zip(self.buildings.building_type, self.buildings.geometry, strict=True):
+                buildings += [{**q, "building_type": building_type} for q in quantize_geometry(geom, origin, scale)]
+
+        return {
+            "version": 1,
+            "crs": pyproj.CRS(self.utm_crs).to_string(),
+            "origin": origin,
+            "scale": scale,
+            "layers": {
+                "parcel": layer(self.parcel.geometry),
+                "buildings": buildings,
+                "buffered_buildings": layer(self.buffered_buildings),
+                "setbacks": layer(*self.setbacks),
+                "too_steep": layer(unary_union(self.too_steep).intersection(self.parcel.geometry))
+                if self.too_steep
+                else [],
+                "flag": layer(self.flag_poly),
+                "street_edges": layer(self.street_edges),
+                "new_buildings": layer(*self.new_buildings),
+                "second_lot": layer(self.second_lot),
+            },
+        }
+
+
+def _simple_parts(geom: BaseGeometry) -> Iterator[BaseGeometry]:
+    if hasattr(geom, "geoms"):  # Multi* and GeometryCollection
+        for part in geom.geoms:
+            yield from _simple_parts(part)
+    elif not geom.is_empty:
+        yield geom
+
+
+def quantize_geometry(geom: BaseGeometry | None, origin: tuple[float, float], scale: float) -> list[dict]:
+    """Convert a geometry into a list of GeoJSON-style Polygon / LineString dicts with integer coordinates, in units
+    of `scale` meters relative to `origin`. Multi-part geometries are split into their parts, points are dropped, and
+    consecutive points that quantize to the same coordinate are collapsed."""
+    if geom is None or geom.is_empty:
+        return []
+    ox, oy = origin
+
+    def q(coords) -> list[list[int]]:
+        out = []
+        for x, y, *_ in coords:
+            pt = [round((x - ox) / scale), round((y - oy) / scale)]
+            if not out or out[-1] != pt:
+                out.append(pt)
+        return out
+
+    result = []
+    for part in _simple_parts(geom):
+        if isinstance(part, Polygon):
+            exterior = q(part.exterior.coords)
+            if len(exterior) < 4:
+                continue  # collapsed to (less than) a line at this scale
+            holes = [hole for hole in (q(ring.coords) for ring in part.interiors) if len(hole) >= 4]
+            result.append({"type": "Polygon", "coordinates": [exterior, *holes]})
+        elif isinstance(part, LineString):
+            line = q(part.coords)
+            if len(line) >= 2:
+                result.append({"type": "LineString", "coordinates": line})
+    return result
+
+
+# figure name -> (local filename prefix, image store key prefix or None if it's not published)
+FIGURE_NAMES = {
+    "buildings": ("buildings-", "buildings-"),
+    "cant_build": ("cant-build-", "cant_build-"),
+    "lot_splits": ("lot-splits-", None),
+}
+
+
+def figure_to_jpeg(fig: Figure) -> bytes:
+    buf = io.BytesIO()
+    fig.savefig(buf, format="jpg")
+    return buf.getvalue()
+
+
+def has_figure_destination(figures: ParcelFigures, image_store: ImageStore | None, save_dir: str | None) -> bool:
+    return bool(save_dir or (image_store and figures.salt))
+
+
+def publish_parcel_figures(figures: ParcelFigures, image_store: ImageStore | None, save_dir: str | None) -> None:
+    """Render a parcel's figures, save them to save_dir (if given) and publish them to image_store (if given and the
+    figures have a salt)."""
+    if not has_figure_destination(figures, image_store, save_dir):
+        return
+    for name, fig in figures.render().items():
+        local_prefix, key_prefix = FIGURE_NAMES[name]
+        jpeg = figure_to_jpeg(fig)
+        if save_dir:
+            with open(os.path.join(save_dir, f"{local_prefix}{figures.apn}.jpg"), "wb") as f:
+                f.write(jpeg)
+        if image_store and figures.salt and key_prefix:
+            image_store.put(f"{key_prefix}{figures.apn}-{figures.salt}", jpeg)
+
+
+class FigurePublisher:
+    """Renders and publishes ParcelFigures on a thread pool. Use as a context manager, which waits for all
+    submitted work on exit:
+
+        with FigurePublisher(get_image_store(), save_dir) as publisher:
+            for figures in ...:
+                publisher.submit(figures)
+        print(publisher.stats)
+    """
+
+    def __init__(self, image_store: ImageStore | None, save_dir: str | None = None, max_workers: int = 4):
+        self.image_store = image_store
+        self.save_dir = save_dir
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="figures")
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    def submit(self, figures: ParcelFigures | None) -> Future | None:
+        if figures is None:
+            return None
+        if not has_figure_destination(figures, self.image_store, self.save_dir):
+            # Nowhere to save or upload them, so don't bother rendering
+            self.stats["skipped"] += 1
+            return None
+        future = self.executor.submit(publish_parcel_figures, figures, self.image_store, self.save_dir)
+        future.add_done_callback(lambda f, apn=figures.apn: self._on_done(f, apn))
+        return future
+
+    def _on_done(self, future: Future, apn: str):
+        err = future.exception()
+        if err:
+            log.error(f"ERROR publishing images for {apn}. Error = {err}")
+        with self._stats_lock:
+            self.stats["publish_failed" if err else "published"] += 1
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -1,10 +1,18 @@
 from __future__ import annotations
 
+import logging
 import re
 import traceback
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Any
 
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db.models import Case, IntegerField, When
 from world.models import Parcel
 
+log = logging.getLogger(__name__)
+
 street_suffixes = [
     "dr",
     "drive",
@@ -74,44 +82,68 @@ normalize_suffix = {
 normalize_prefix = {"north": "n", "south": "s", "east": "e", "west": "w"}
 
 
-# TODO: THIS IS NOT COMPLETE - MEANT TO BE AN ADDRESS MATCHER
-# def address_to_parcels_loose(addr: str) -> list[Parcel]:
-#     """Take a street address, and return any that loosely match, best match on top. For typeahead matching"""
-#     addr_normalized = re.sub(r"\.", "", addr.lower())
-#     addr_parts = addr_normalized.split()
-#     pquery = Parcel.objects.annotate(str_situs_addr=RawSQL("select cast(situs_addr as VARCHAR)", ()))
-#     if addr_parts[0].isnumeric():
-#         pquery = pquery.filter(str_situs_addr__regex=r"%s" % addr_parts[0])
-#         addr_parts.pop()
-#     # pquery = pquery.filter(str_situs_str)
-#     # Concatenating address in postgres:
-#     # select apn, concat_ws(
-#     #    ' ', situs_pre_field, situs_addr, situs_stre, situs_suff, situs_post
-#     #    ) as addr from world_parcel
-#
-#     # Using pg_tgrm extension (Trigram word similarity)
-#     # CREATE EXTENSION btree_gin;
-#     # CREATE EXTENSION pg_trgm;
-#     # CREATE OR REPLACE FUNCTION immutable_concat_ws(text, VARIADIC text[])
-#     # create index str_search_try_index on world_parcel using GIN (
-#     #  immutable_concat_ws(' ', situs_pre_field, situs_addr::text, situs_stre, situs_suff, situs_post));
-#     # https://leandronsp.com/a-powerful-full-text-search-in-postgresql-in-less-than-20-lines
-#
-
-
-def address_to_parcel(  # noqa: PLR0911, PLR0915 : too many returns, too many statements
-    addr: str,
-    jurisdiction: str,
-    neighborhood: str = None,
-) -> (Parcel | None, str | None):
-    """Take a street address and look for a matching Parcel. Return the Parcel or an error string"""
+def normalize_address_query(addr: str) -> str:
+    """Lowercase an address and abbreviate its street direction and suffix the way Parcel addresses are"""
+    words = re.sub(r"[.,#]", " ", addr.lower()).split()
+    if not words:
+        return ""
+    # Use first address of a hyphenated address range
+    hyphenated_addr_num = re.match(r"(\d+)-(\d+)", words[0])
+    if hyphenated_addr_num:
+        words[0] = hyphenated_addr_num.groups()[0]
+    start = 1 if words[0].isnumeric() else 0
+    if len(words) > start + 1:
+        words[start] = {"mount": "mt", "saint": "st", **normalize_prefix}.get(words[start], words[start])
+        # "w" is ambiguous as a suffix ("way") since it's also a direction, so leave it alone
+        if words[-1] != "w":
+            words[-1] = normalize_suffix.get(words[-1], words[-1])
+    return " ".join(words)
+
+
+def address_to_parcels_loose(addr: str, limit: int = 10) -> list[Parcel]:
+    """Take a partial street address, and return parcels that loosely match, best match on top. For typeahead
+    matching. Each parcel has a `similarity` attribute from 0 to 1.
+
+    Matches by trigram word similarity against Parcel.search_address, which is GIN indexed. Addresses that start with
+    the query rank first."""
+    query = normalize_address_query(addr)
+    if len(query) < 3:
+        return []
+    parcels = (
+        Parcel.objects.filter(search_address__trigram_word_similar=query)
+        .annotate(
+            similarity=TrigramWordSimilarity(query, "search_address"),
+            is_prefix=Case(When(search_address__startswith=query, then=1), default=0, output_field=IntegerField()),
+        )
+        .order_by("-is_prefix", "-similarity", "search_address")
+        # Not the geometry
+        .only("apn", "situs_addr", "situs_pre_field", "situs_stre", "situs_suff", "situs_post", "situs_juri")
+    )
+    return list(parcels[:limit])
+
+
+@dataclass
+class ParsedAddress:
+    """A street address split the way Parcel stores it"""
+
+    normalized: str
+    addr_num: str
+    street_name: str
+    street_prefix: str | None
+    street_suffix: str | None
+    hyphenated: bool
+
+
+def parse_address(addr: str) -> tuple[ParsedAddress | None, str | None]:
+    """Split a street address into number, street name, prefix and suffix. Returns the parsed address or an error
+    string"""
     street_suffix = None
     street_prefix = None
     addr_normalized = re.sub(r"\.", "", addr.lower())
-    addr_num, *rest = addr_normalized.split()
+    addr_num, *rest = addr_normalized.split() or [""]
     # do more address normalization if the address broke up properly:
     if len(rest) == 0:
-        print(f"Error, address is single-word: {addr_normalized}")
+        log.debug(f"Error, address is single-word: {addr_normalized}")
         return None, "error_single_word_address"
     if rest[0] == "mount":
         rest[0] = "mt"
@@ -123,7 +155,6 @@ def address_to_parcel(  # noqa: PLR0911, PLR0915 : too many returns, too many st
             rest = rest[1:]
     # Check for a postfix and remove if present
     if rest[-1] in ["n", "s", "w", "e"]:
-        postfix = rest[-1]  # noqa: F841 -- unused variable
         rest = rest[:-1]
     # Separate the street suffix if it exists
     if rest and (rest[-1] in street_suffixes):
@@ -135,28 +166,24 @@ def address_to_parcel(  # noqa: PLR0911, PLR0915 : too many returns, too many st
     # Use first address of a hyphenated address range
     hyphenated_addr_num = re.match(r"(\d+)-(\d+)", addr_num)
     if hyphenated_addr_num:
-        print(f"Hyphenated address -- {addr_normalized}")
+        log.debug(f"Hyphenated address -- {addr_normalized}")
         addr_num = hyphenated_addr_num.groups()[0]
+    return (
+        ParsedAddress(
+            addr_normalized, addr_num, street_name, street_prefix, street_suffix, bool(hyphenated_addr_num)
+        ),
+        None,
+    )
 
-    try:
-        parcels_exact = Parcel.objects.filter(
-            situs_addr=addr_num,
-            situs_stre__iexact=street_name,
-        )
-        parcels_inexact = Parcel.objects.filter(
-            situs_addr=addr_num,
-            situs_stre__istartswith=street_name,
-        )
-    except ValueError as e:
-        # This can happen when address has a non-number in it. allow it to pass for now
-        print(f"Error processing {addr_normalized} {str(e)}")
-        return None, "dberror-valueerror"
-    except Exception as e:
-        print(f"Error processing {addr_normalized} {str(e)}")
-        traceback.print_exc()
-        return None, "dberror"
+
+def pick_parcel(  # noqa: PLR0911 : too many returns
+    parsed: ParsedAddress, exact: Sequence, inexact: Sequence, jurisdiction: str
+) -> tuple[Any, str | None]:
+    """Choose the parcel for an address among the parcels with its number and street name (exact), or a street name
+    starting with it (inexact). Works on anything with Parcel's situs_* attributes. Returns the parcel or an error
+    string."""
     # repeat loop twice, looking at exact match first.
-    for parcels in [parcels_exact, parcels_inexact]:
+    for parcels in [exact, inexact]:
         if len(parcels) == 1:
             # exact match but check jurisdiction
             if parcels[0].situs_juri == jurisdiction:
@@ -174,8 +201,8 @@ def address_to_parcel(  # noqa: PLR0911, PLR0915 : too many returns, too many st
         matched_jurisdiction_candidates = []
         jurisdictions = set()
         for p in parcels:
-            if not p.situs_pre_field or (p.situs_pre_field and (p.situs_pre_field.lower() == street_prefix)):
-                if not street_suffix or (p.situs_suff.lower() == street_suffix):
+            if not p.situs_pre_field or (p.situs_pre_field and (p.situs_pre_field.lower() == parsed.street_prefix)):
+                if not parsed.street_suffix or (p.situs_suff.lower() == parsed.street_suffix):
                     matched_parcel_candidates.append(p)
                 jurisdictions.add(p.situs_juri)
             # keep jurisdiction match loose, since prefix and suffix are not always present
@@ -188,13 +215,42 @@ def address_to_parcel(  # noqa: PLR0911, PLR0915 : too many returns, too many st
         elif len(matched_parcel_candidates) == 1 and matched_parcel_candidates[0].situs_juri == jurisdiction:
             return matched_parcel_candidates[0], None
         else:
-            print(f"Multiple matches ({len(parcels)}) for {addr_normalized} in jurisdiction {jurisdiction}")
+            log.debug(f"Multiple matches ({len(parcels)}) for {parsed.normalized} in jurisdiction {jurisdiction}")
             return None, f"multimatch_{jurisdictions}"
     # After exact and inexact attempts, we're still here, and nothing matched.
-    if hyphenated_addr_num:
+    if parsed.hyphenated:
         # Need to build out this case: we found a hyphenated address, but the first address didn't work.
         # Maybe another address in the hyphen range would?
-        print(f"Error processing {addr_normalized}: hyphenated address we didn't find")
+        log.debug(f"Error processing {parsed.normalized}: hyphenated address we didn't find")
         return None, "dberror"
-    print(f"No match in Parcel table for {addr_normalized}, {neighborhood}")
     return None, "unmatched"
+
+
+def address_to_parcel(
+    addr: str,
+    jurisdiction: str,
+    neighborhood: str = None,
+) -> (Parcel | None, str | None):
+    """Take a street address and look for a matching Parcel. Return the Parcel or an error string. To match many
+    addresses, see ParcelAddressIndex."""
+    parsed, error = parse_address(addr)
+    if error:
+        return None, error
+    try:
+        # Lazy: the inexact query only runs if there's no exact match
+        parcels_exact = Parcel.objects.filter(situs_addr=parsed.addr_num, situs_stre__iexact=parsed.street_name)
+        parcels_inexact = Parcel.objects.filter(
+            situs_addr=parsed.addr_num, situs_stre__istartswith=parsed.street_name
+        )
+    except ValueError as e:
+        # This can happen when address has a non-number in it. allow it to pass for now
+        print(f"Error processing {parsed.normalized} {str(e)}")
+        return None, "dberror-valueerror"
+    except Exception as e:
+        print(f"Error processing {parsed.normalized} {str(e)}")
+        traceback.print_exc()
+        return None, "dberror"
+    parcel, error = pick_parcel(parsed, parcels_exact, parcels_inexact, jurisdiction)
+    if error == "unmatched":
+        print(f"No match in Parcel table for {parsed.normalized}, {neighborhood}")
+    return parcel, error
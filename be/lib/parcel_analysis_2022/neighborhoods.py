@@ -13,6 +13,19 @@ class Neighborhood(Enum):
     PacificBeach = [92109]
 
 
+# Bounding boxes of neighborhoods, for commands that work on all parcels in an area
+@unique
+class NeighborhoodBBox(Enum):
+    # Mira Mesa neighborhood of San Diego
+    Miramesa = -117.17987773162996, 32.930825570911985, -117.12513392170659, 32.894946222075184
+    MiramesaSmall = (-117.135284737197, 32.905422120627904, -117.13317320050437, 32.90428935023001)
+
+    # Special "neighborhood" - compute full extents of all parcels
+    all = ()
+
+    # ... add more neighborhoods here
+
+
 # Neighborhood names matching the MLS listings site
 HIGH_PRIORITY_NEIGHBORHOODS = [
     "North Park",
@@ -1,39 +1,19 @@
 import logging
+from collections import Counter
 from typing import TYPE_CHECKING
 
 import django
 import pyproj
-from joblib import Parallel, delayed
-from world.models import Roads
 
 if TYPE_CHECKING:
     from world.models import Parcel, PropertyListing
 
-log = logging.getLogger(__name__)
-django.setup()
-
-
-def analyze_road_batch(
-    roads: list[Roads],
-    utm_crs: pyproj.CRS,
-    single_process=False,
-):
-    n_jobs = 1 if single_process else 2
-    if n_jobs == 1:
-        [analyze_road_worker(road, utm_crs) for road in roads]
-    else:
-        Parallel(n_jobs=n_jobs)(delayed(parallel_analyze_road_worker)(road, utm_crs) for road in roads)
+    from lib.tile_lib import Tile
 
+    from .region_lib import RegionOptions
 
-def analyze_road_worker(road: Roads, utm_crs: pyproj.CRS):
-    # print(f"Analyzing road {road.name}")
-    # road.analyze(utm_crs)
-    raise AssertionError("Not implemented yet... copy from co.py mgmt command")
-    return road
-
-
-def parallel_analyze_road_worker(*args, **kwargs):
-    analyze_road_worker(*args, **kwargs)
+log = logging.getLogger(__name__)
+django.setup()
 
 
 def analyze_one_parcel_worker(
@@ -44,13 +24,17 @@ def analyze_one_parcel_worker(
     save_dir: str,  # this used to have a default, but it shouldn't be used
     try_garage_conversion=True,
     try_split_lot=True,
+    rent_estimates: dict | None = None,
+    rent_cache_only: bool = False,
     i: int = 0,
 ):
-    from .analyze_parcel_lib import analyze_one_parcel
+    from .analyze_parcel_lib import analyze_one_parcel, rent_data
 
     assert property_listing is not None
+    if rent_estimates:
+        rent_data.prime(rent_estimates)
     try:
-        result = analyze_one_parcel(
+        result, figures = analyze_one_parcel(
             parcel,
             utm_crs,
             property_listing,
@@ -59,13 +43,47 @@ def analyze_one_parcel_worker(
             show_plot=False,
             try_garage_conversion=try_garage_conversion,
             try_split_lot=try_split_lot,
+            rent_cache_only=rent_cache_only,
         )
-        return result, None
+        return result, None, figures
     except Exception as e:
         # log.error()
         log.error(f"Exception on parcel {parcel.apn}", exc_info=True)
         # raise e
-        return None, {
-            "apn": parcel.apn,
-            "error": e,
-        }
+        return (
+            None,
+            {
+                "apn": parcel.apn,
+                "error": e,
+            },
+            None,
+        )
+
+
+def analyze_tile_worker(tile: "Tile", apns: list[str], utm_crs: pyproj.CRS, options: "RegionOptions") -> Counter:
+    from .region_lib import analyze_tile
+
+    try:
+        return analyze_tile(apns, utm_crs, options)
+    except Exception:
+        # Eg. a DB error loading the tile's layers. Don't take down the rest of the region.
+        log.error(f"Exception on tile ({tile.ix}, {tile.iy}) with {len(apns)} parcels", exc_info=True)
+        return Counter(tile_error=1, error=len(apns))
+
+
+def measure_road_tile_worker(tile: "Tile", roadsegids: list[int], utm_crs: pyproj.CRS) -> Counter:
+    from lib.co.road_width_lib import measure_tile
+
+    try:
+        return measure_tile(roadsegids, utm_crs)
+    except Exception:
+        log.error(f"Exception on road tile ({tile.ix}, {tile.iy}) with {len(roadsegids)} roads", exc_info=True)
+        return Counter(tile_error=1, error=len(roadsegids))
+
+
+def render_tiles_worker(layer: str, tiles: list[tuple[int, int, int]]) -> list[tuple[int, int, int, bytes]]:
+    """Render a batch of (z, x, y) tiles of a static layer from the DB, for seeding its MBTiles file"""
+    from world.views import STATIC_TILE_VIEWS
+
+    view = STATIC_TILE_VIEWS[layer]()
+    return [(z, x, y, view.render_tile(x, y, z)) for z, x, y in tiles]
@@ -1,5 +1,6 @@
 import json
 import re
+from dataclasses import dataclass
 from math import sqrt
 
 import django.contrib.gis.geos
@@ -88,42 +89,72 @@ def get_parcels_by_zip_codes(zip_codes: list) -> QuerySet:
 
 
 def get_parcels_by_neighborhood(bounding_box: django.contrib.gis.geos.GEOSGeometry) -> QuerySet:
-    # Returns a Queryset of parcels that intersect with the bounding box (are in a neighborhood)
-    # and are not marked as skip in our analyzed table (so they are residential and match our criteria).
+    # Returns a Queryset of parcels that intersect with the bounding box (are in a neighborhood).
     # Results are ordered by APN so there's a consistent analysis order (and can thus start midway if needed).
-    # NOTE: We should create a foreign key relationship so we don't need this ugly query.
+    # NOTE: this used to also filter out parcels marked as 'skip' in world_analyzedparcel, but that column
+    # no longer exists.
 
-    return (
-        Parcel.objects.filter(geom__intersects=bounding_box)
-        .extra(
-            tables=["world_analyzedparcel"],
-            where=[
-                "world_parcel.apn=world_analyzedparcel.apn",
-                "world_analyzedparcel.skip is false",
-            ],
+    return Parcel.objects.filter(geom__intersects=bounding_box).order_by("apn")
+
+
+def _extents_overlap(a: tuple, b: tuple) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+@dataclass
+class TileLayers:
+    """GIS layers preloaded for an area (typically a tile of a larger region), so analyzing many parcels in the area
+    doesn't need a few spatial queries per parcel. Pass to get_buildings(), get_parcel_zone() and
+    get_street_side_boundaries() in place of querying the DB."""
+
+    buildings: list[BuildingOutlines]
+    zones: list[ZoningBase]
+    tpas: list[TransitPriorityArea]
+    parcels: list[Parcel]
+
+    @classmethod
+    def load(cls, area: GEOSGeometry) -> "TileLayers":
+        """Load every feature that intersects the area. Make the area a bit bigger than the parcels you want to
+        analyze, so neighboring parcels on the edge are included."""
+        return cls(
+            buildings=list(BuildingOutlines.objects.filter(geom__intersects=area)),
+            zones=list(ZoningBase.objects.filter(geom__intersects=area)),
+            tpas=list(TransitPriorityArea.objects.filter(geom__intersects=area)),
+            parcels=list(Parcel.objects.filter(geom__intersects=area)),
         )
-        .order_by("apn")
-    )
+
+    @staticmethod
+    def intersecting(layer: list, geom: GEOSGeometry) -> list:
+        """Features in the layer that intersect the geometry, in layer order (like the equivalent DB query)."""
+        extent = geom.extent
+        prepared = geom.prepared
+        return [f for f in layer if _extents_overlap(f.geom.extent, extent) and prepared.intersects(f.geom)]
 
 
-def get_buildings(parcel: Parcel) -> QuerySet:
+def get_buildings(parcel: Parcel, layers: TileLayers | None = None) -> QuerySet | list[BuildingOutlines]:
     """Returns a list of BuildingOutlines objects from the database that intersect with
     the given parcel object.
 
     Args:
         parcel (Parcel): Parcel object to intersect buildings with
+        layers (TileLayers, optional): Preloaded layers to use instead of querying the DB
 
     Returns:
         A list of BuildingOutlines objects
     """
+    if layers is not None:
+        return layers.intersecting(layers.buildings, parcel.geom)
     return BuildingOutlines.objects.filter(geom__intersects=parcel.geom)
 
 
-def get_parcel_zone(parcel: ParcelDC, utm_crs: pyproj.CRS) -> tuple[str, bool, bool]:
+def get_parcel_zone(
+    parcel: ParcelDC, utm_crs: pyproj.CRS, layers: TileLayers | None = None
+) -> tuple[str, bool, bool]:
     """Gets the zone of a parcel.
 
     Args:
         parcel(ParcelDC)
+        layers (TileLayers, optional): Preloaded layers to use instead of querying the DB
 
     Returns:
         Tuple:
@@ -131,8 +162,12 @@ def get_parcel_zone(parcel: ParcelDC, utm_crs: pyproj.CRS) -> tuple[str, bool, b
             is_tpa: is it in transit priority area
             is_mf: is it a multifamily parcel (either due to unit qty or zoning)
     """
-    zones = ZoningBase.objects.filter(geom__intersects=parcel.model.geom)
-    tpa = TransitPriorityArea.objects.filter(geom__intersects=parcel.model.geom)
+    if layers is not None:
+        zones = layers.intersecting(layers.zones, parcel.model.geom)
+        tpa = layers.intersecting(layers.tpas, parcel.model.geom)
+    else:
+        zones = ZoningBase.objects.filter(geom__intersects=parcel.model.geom)
+        tpa = TransitPriorityArea.objects.filter(geom__intersects=parcel.model.geom)
     is_tpa = len(tpa) > 0
     is_mf = parcel.model.unitqty > 1
     if len(zones) == 1:
@@ -301,7 +336,7 @@ def find_largest_rectangles_on_avail_geom(
     return placed_polys
 
 
-def get_street_side_boundaries(parcel: ParcelDC, utm_crs: pyproj.CRS) -> dict:
+def get_street_side_boundaries(parcel: ParcelDC, utm_crs: pyproj.CRS, layers: TileLayers | None = None) -> dict:
     """Returns the edges of a parcel that are on the street side, the sides of the lot,
     and the back of the lot respectively as Shapely MultiLineStrings.
     Function can be greatly improved with road data, and other types of data we can
@@ -310,6 +345,7 @@ def get_street_side_boundaries(parcel: ParcelDC, utm_crs: pyproj.CRS) -> dict:
     Args:
         parcel (ParcelDC): A Django Parcel model
         utm_crs: (pyproj.CRS): Coordinate system to use for analysis.
+        layers (TileLayers, optional): Preloaded layers to use instead of querying the DB
     Returns:
         (MultiLineString, MultiLineString, MultiLineString): A tuple of MultiLineStrings
         representing the front (street), side, and back edges respectively.
@@ -317,7 +353,12 @@ def get_street_side_boundaries(parcel: ParcelDC, utm_crs: pyproj.CRS) -> dict:
     d = {"front": None, "side": None, "back": None, "alley": None}
 
     # Get our adjacent parcels
-    intersecting_parcels = Parcel.objects.filter(geom__intersects=parcel.model.geom).exclude(apn=parcel.model.apn)
+    if layers is not None:
+        intersecting_parcels = [
+            p for p in layers.intersecting(layers.parcels, parcel.model.geom) if p.apn != parcel.model.apn
+        ]
+    else:
+        intersecting_parcels = Parcel.objects.filter(geom__intersects=parcel.model.geom).exclude(apn=parcel.model.apn)
     intersecting_utm = models_to_utm_gdf(intersecting_parcels, utm_crs)
 
     # First Heuristic for determining street side:
@@ -1,9 +1,11 @@
-# Helper functions to plot geographical data
+# Helper functions to plot geographical data.
+# NOTE: these build standalone matplotlib Figures rather than going through pyplot's global state, so they can be
+# rendered from a thread pool (see figures_lib.py). Pass in a pyplot figure if you want to show it interactively.
 
 import geopandas
-import matplotlib.pyplot as plt
 import pyproj
 from geopandas import GeoDataFrame
+from matplotlib.figure import Figure
 from shapely.geometry import LineString, MultiLineString, Polygon
 from shapely.ops import unary_union
 
@@ -46,10 +48,11 @@ def plot_new_buildings(
     new_buildings: list[Polygon],
     street_edges: MultiLineString,
     flag_poly: Polygon | None,
-):
-    fig = plt.figure(f"new_buildings-{parcel.model.apn}")
+    fig: Figure | None = None,
+) -> Figure:
+    fig = fig if fig is not None else Figure()
     ax = fig.add_subplot()
-    plt.title(parcel.model.apn + ":" + parcel.model.address)
+    ax.set_title(parcel.model.apn + ":" + parcel.model.address)
 
     # Create the lot dataframe, which contains the parcel outline and existing buildings
 
@@ -88,13 +91,19 @@ def plot_new_buildings(
     return fig
 
 
-def plot_split_lot(parcel: ParcelDC, buildings: GeoDataFrame, utm_crs: pyproj.CRS, second_lot: Polygonal):
-    fig = plt.figure(f"lot_split-{parcel.model.apn}")
+def plot_split_lot(
+    parcel: ParcelDC,
+    buildings: GeoDataFrame,
+    utm_crs: pyproj.CRS,
+    second_lot: Polygonal,
+    fig: Figure | None = None,
+) -> Figure:
+    fig = fig if fig is not None else Figure()
     ax = fig.add_subplot()
     lot_df = geopandas.GeoDataFrame(geometry=[*buildings.geometry, parcel.geometry.boundary], crs=utm_crs)
     lot_df.plot(ax=ax)
     plot_parcel_boundary_lengths(parcel, ax)
-    plt.title("Lot split: " + parcel.model.apn + ";" + parcel.model.address)
+    ax.set_title("Lot split: " + parcel.model.apn + ";" + parcel.model.address)
     geopandas.GeoSeries(second_lot).plot(ax=ax, color="cyan", alpha=0.7)
 
     return fig
@@ -109,8 +118,9 @@ def plot_cant_build(
     too_steep: list[Polygonal],
     flag_poly: Polygon | None,
     street_edges: MultiLineString,
-):
-    fig = plt.figure(f"cant_build-{parcel.model.apn}")
+    fig: Figure | None = None,
+) -> Figure:
+    fig = fig if fig is not None else Figure()
     ax = fig.add_subplot()
 
     lot_geom = (
@@ -118,7 +128,7 @@ def plot_cant_build(
     )
     lot_df = geopandas.GeoDataFrame(geometry=lot_geom, crs=utm_crs)
     lot_df.plot(ax=ax)
-    plt.title("Cant build: " + parcel.model.apn + ";" + parcel.model.address)
+    ax.set_title("Cant build: " + parcel.model.apn + ";" + parcel.model.address)
 
     geopandas.GeoSeries(street_edges.buffer(0.4)).plot(ax=ax, color="brown")
 
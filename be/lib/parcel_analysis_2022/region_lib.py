@@ -0,0 +1,200 @@
+"""
+Region mode for parcel analysis: analyze every parcel in an area ("what could be built here"), rather than the
+scraped listings that analyze_batch() works from.
+
+The region's parcels are partitioned into a grid of spatial tiles by centroid (see lib.tile_lib). Each worker process
+gets one tile at a time, preloads the GIS layers covering the tile's parcels once (TileLayers), analyzes them, and
+writes the off-market listings and analyses in bulk. Rents are only looked up from the DB (cached or interpolated)
+so a big run doesn't burn rent API credits.
+
+NOTE: Workers run in fresh processes, so tile work items are plain apn lists, and Django models are only imported
+inside functions.
+"""
+from __future__ import annotations
+
+import logging
+import secrets
+from collections import Counter
+from dataclasses import dataclass
+
+import pyproj
+from django.contrib.gis.db.models.functions import Centroid
+from django.contrib.gis.geos import GEOSGeometry, Polygon
+from joblib import Parallel, delayed
+
+from lib.tile_lib import Tile, partition_points
+
+log = logging.getLogger(__name__)
+
+# ~500m in San Diego. Big enough that loading the tile's layers is amortized over a few hundred parcels.
+DEFAULT_TILE_SIZE = 0.005
+
+
+@dataclass
+class RegionOptions:
+    dry_run: bool = False
+    # Only analyze parcels with a zone starting with this prefix (eg. "R" for residential). None for all parcels.
+    zone_prefix: str | None = "R"
+    try_split_lot: bool = True
+    # Render and publish figures (from the worker process)
+    figures: bool = False
+
+
+def partition_region(
+    bounding_box: GEOSGeometry, tile_size: float = DEFAULT_TILE_SIZE, limit: int | None = None
+) -> dict[Tile, list[str]]:
+    """Find the parcels in the bounding box and group their apns into tiles by parcel centroid."""
+    from .parcel_lib import get_parcels_by_neighborhood
+
+    parcels = get_parcels_by_neighborhood(bounding_box).annotate(centroid=Centroid("geom"))
+    if limit:
+        parcels = parcels[:limit]
+    points = ((apn, centroid.x, centroid.y) for apn, centroid in parcels.values_list("apn", "centroid"))
+    minx, miny, _, _ = bounding_box.extent
+    return partition_points(points, (minx, miny), tile_size)
+
+
+def _latest_listings(parcels: list, dry_run: bool) -> dict:
+    """Latest listing for each parcel, keyed by apn, creating OFFMARKET listings in bulk for parcels without one.
+    Equivalent to PropertyListing.get_latest_or_create() for each parcel."""
+    from world.models import PropertyListing
+
+    latest = PropertyListing.objects.filter(parcel__in=parcels).order_by("parcel", "-founddate").distinct("parcel")
+    listings = {listing.parcel_id: listing for listing in latest}
+    new_listings = [
+        PropertyListing(
+            mlsid=parcel.apn,
+            addr=parcel.address,
+            parcel=parcel,
+            status=PropertyListing.ListingStatus.OFFMARKET,
+            br=parcel.br,
+            ba=parcel.ba,
+        )
+        for parcel in parcels
+        if parcel.apn not in listings
+    ]
+    if new_listings and not dry_run:
+        PropertyListing.objects.bulk_create(new_listings)
+        PropertyListing.refresh_latest([listing.mlsid for listing in new_listings])
+    listings.update({listing.parcel_id: listing for listing in new_listings})
+    return listings
+
+
+def _save_analyses(analyzed: list, stats: Counter) -> list[str]:
+    """Upsert the (unsaved) AnalyzedListings in one query, keeping the salt of existing analyses so their images
+    don't need to be re-uploaded. Returns the apns that got a new salt (whose images should be published)."""
+    from world.models import AnalyzedListing
+
+    existing_salts = dict(
+        AnalyzedListing.objects.filter(listing__in=[a.listing for a in analyzed]).values_list("listing_id", "salt")
+    )
+    new_salt_apns = []
+    for a in analyzed:
+        # bulk_create() doesn't call save()
+        a.promote_details()
+        a.salt = existing_salts.get(a.listing_id)
+        if not a.salt:
+            a.salt = secrets.token_urlsafe(10)
+            new_salt_apns.append(a.parcel_id)
+    update_fields = [
+        f.name for f in AnalyzedListing._meta.concrete_fields if not f.primary_key and f.name != "listing"
+    ]
+    AnalyzedListing.objects.bulk_create(
+        analyzed, update_conflicts=True, unique_fields=["listing"], update_fields=update_fields
+    )
+    stats["created"] += len(analyzed) - len(existing_salts)
+    stats["updated"] += len(existing_salts)
+    return new_salt_apns
+
+
+def analyze_tile(apns: list[str], utm_crs: pyproj.CRS, options: RegionOptions) -> Counter:
+    """Analyze all the parcels of one tile, using layers preloaded for the tile. Returns stats for the tile."""
+    from world.models import Parcel
+
+    from .analyze_parcel_lib import analyze_one_parcel, prefetch_rent_estimates, rent_data
+    from .figures_lib import FigurePublisher, get_image_store
+    from .parcel_lib import TileLayers
+    from .re_params import ReParams
+
+    stats = Counter()
+    parcels = list(Parcel.objects.filter(apn__in=apns).order_by("apn"))
+    if not parcels:
+        return stats
+    # Everything that intersects a parcel intersects the extent of all the tile's parcels
+    extent = parcels[0].geom.extent
+    for parcel in parcels[1:]:
+        e = parcel.geom.extent
+        extent = (min(extent[0], e[0]), min(extent[1], e[1]), max(extent[2], e[2]), max(extent[3], e[3]))
+    layers = TileLayers.load(Polygon.from_bbox(extent))
+
+    if options.zone_prefix is not None:
+        before = len(parcels)
+        parcels = [
+            p
+            for p in parcels
+            if any(z.zone_name.startswith(options.zone_prefix) for z in layers.intersecting(layers.zones, p.geom))
+        ]
+        stats["skipped_zone"] += before - len(parcels)
+
+    listings = _latest_listings(parcels, options.dry_run)
+    for estimates in prefetch_rent_estimates(parcels, [listings[p.apn] for p in parcels], ReParams()).values():
+        rent_data.prime(estimates)
+    analyzed, all_figures = [], {}
+    for parcel in parcels:
+        try:
+            a, figures = analyze_one_parcel(
+                parcel,
+                utm_crs,
+                listings[parcel.apn],
+                options.dry_run,
+                save_dir=None,
+                try_split_lot=options.try_split_lot,
+                layers=layers,
+                defer_save=True,
+                rent_cache_only=True,
+            )
+        except Exception:
+            log.error(f"Exception on parcel {parcel.apn}", exc_info=True)
+            stats["error"] += 1
+            continue
+        stats["analyzed"] += 1
+        if a.details.get("rent_missing"):
+            # Region mode never calls Rentometer, so parcels without cached or nearby rents are analyzed without
+            # existing rents. Count them so the run shows how many.
+            stats["rent_missing"] += 1
+        analyzed.append(a)
+        all_figures[parcel.apn] = figures
+
+    if not analyzed or options.dry_run:
+        return stats
+    new_salt_apns = _save_analyses(analyzed, stats)
+    if options.figures:
+        with FigurePublisher(get_image_store()) as publisher:
+            for a in analyzed:
+                figures = all_figures[a.parcel_id]
+                if a.parcel_id in new_salt_apns:
+                    figures.salt = a.salt
+                publisher.submit(figures)
+        stats.update(publisher.stats)
+    return stats
+
+
+def analyze_region(
+    tiles: dict[Tile, list[str]], utm_crs: pyproj.CRS, options: RegionOptions, n_jobs: int = 8
+) -> Counter:
+    """Analyze the tiled parcels, one tile per worker task. Returns overall stats."""
+    from .parallel_worker import analyze_tile_worker
+
+    log.info(f"Analyzing {sum(len(apns) for apns in tiles.values())} parcels in {len(tiles)} tiles")
+    work = [(tile, apns) for tile, apns in tiles.items()]
+    if n_jobs == 1:
+        results = [analyze_tile_worker(tile, apns, utm_crs, options) for tile, apns in work]
+    else:
+        results = Parallel(n_jobs=n_jobs)(
+            delayed(analyze_tile_worker)(tile, apns, utm_crs, options) for tile, apns in work
+        )
+    stats = Counter()
+    for (tile, _), tile_stats in zip(work, results, strict=True):
+        log.debug(f"Tile ({tile.ix}, {tile.iy}): {dict(tile_stats)}")
+        stats.update(tile_stats)
+    return stats
@@ -0,0 +1,265 @@
+"""
+In-memory spatial index of RentalData, for interpolating rents without a PostGIS query per unit.
+
+RentalData is small (one row per parcel + unit type we've paid for), so each process loads all of it once, split by
+(br, ba) class, with locations projected to UTM meters. Lookups are brute-force nearest neighbors over a numpy array,
+which is microseconds at this size, and a batch of locations is answered with one vectorized call. Rents are
+interpolated by inverse distance weighting (IDW) over the k nearest rows.
+
+The index stays fresh by:
+* adding rows saved in this process as they're saved (post_save), and
+* every REFRESH_CHECK_SECONDS, checking whether other processes have changed the table and reloading if so.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+import numpy as np
+import pyproj
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from world.models.rental_data import RentalData
+
+from .crs_lib import get_utm_crs
+
+log = logging.getLogger(__name__)
+
+REFRESH_CHECK_SECONDS = 30
+# Max size of the (locations x rental data) distance matrix computed at once in a batch query
+BATCH_CHUNK_CELLS = 4_000_000
+# Neighbors closer than this (eg. on the same parcel) are weighted as if they were this far, in meters
+MIN_IDW_DISTANCE = 10.0
+# Total Rentometer samples (weighted by distance) at which an interpolated rent gets full confidence
+FULL_CONFIDENCE_SAMPLES = 30
+
+
+@dataclass
+class _RentClass:
+    """RentalData for one (br, ba) class: locations in UTM meters and the rows in the same order"""
+
+    xy: np.ndarray = field(default_factory=lambda: np.empty((0, 2)))
+    rows: list[RentalData] = field(default_factory=list)
+    # percentile -> (rent, samples) arrays aligned with rows. Rent is nan for rows without usable data.
+    _values: dict[int, tuple[np.ndarray, np.ndarray]] = field(default_factory=dict)
+
+    def append(self, xy: np.ndarray, row: RentalData):
+        self.xy = np.vstack([self.xy, xy])
+        self.rows.append(row)
+        self._values.clear()
+
+    def values(self, percentile: int, rent_fn: Callable[[RentalData, int], float]) -> tuple[np.ndarray, np.ndarray]:
+        if percentile not in self._values:
+            rents = np.array([self._row_rent(row, percentile, rent_fn) for row in self.rows], dtype=float)
+            if invalid := int(np.isnan(rents).sum()):
+                log.warning(f"Skipping {invalid} of {len(rents)} RentalData rows with invalid data")
+            rents[rents < 0] = np.nan
+            samples = np.array([row.details.get("samples", 0) for row in self.rows], dtype=float)
+            self._values[percentile] = (rents, samples)
+        return self._values[percentile]
+
+    @staticmethod
+    def _row_rent(row: RentalData, percentile: int, rent_fn: Callable[[RentalData, int], float]) -> float:
+        """The row's rent, or nan if its data is malformed (eg. missing or inconsistent Rentometer stats)"""
+        try:
+            return rent_fn(row, percentile)
+        except (AssertionError, KeyError, TypeError, ValueError) as e:
+            log.debug(f"Invalid RentalData id={row.pk}: {e!r}")
+            return np.nan
+
+    def knn(self, xy: np.ndarray, k: int, max_distance: float) -> tuple[np.ndarray, np.ndarray]:
+        """k nearest rows within max_distance of each of an (n, 2) array of locations. Returns (n, k) arrays of
+        distances, sorted, and row indices. Missing neighbors have distance inf and index -1."""
+        n, m = len(xy), len(self.rows)
+        dists = np.full((n, k), np.inf)
+        idxs = np.full((n, k), -1)
+        kk = min(k, m)
+        if kk == 0:
+            return dists, idxs
+        chunk = max(1, BATCH_CHUNK_CELLS // m)
+        for start in range(0, n, chunk):
+            q = xy[start : start + chunk]
+            d2 = ((q[:, None, :] - self.xy[None, :, :]) ** 2).sum(axis=2)
+            part = np.argpartition(d2, kk - 1, axis=1)[:, :kk] if kk < m else np.tile(np.arange(m), (len(q), 1))
+            part_d2 = np.take_along_axis(d2, part, axis=1)
+            order = np.argsort(part_d2, axis=1)
+            idxs[start : start + chunk, :kk] = np.take_along_axis(part, order, axis=1)
+            dists[start : start + chunk, :kk] = np.sqrt(np.take_along_axis(part_d2, order, axis=1))
+        too_far = dists > max_distance
+        dists[too_far] = np.inf
+        idxs[too_far] = -1
+        return dists, idxs
+
+
+def idw(
+    dists: np.ndarray, values: np.ndarray, samples: np.ndarray, power: float
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Inverse-distance-weighted average of each row of an (n, k) array of neighbor values. Neighbors with an
+    infinite distance or a nan value are ignored.
+
+    Returns (n,) arrays of:
+    * the interpolated value (nan where there are no usable neighbors)
+    * confidence from 0 to 1: the neighbors' sample counts, weighted relative to the closest neighbor, as a fraction
+      of FULL_CONFIDENCE_SAMPLES
+    * the number of neighbors used
+    """
+    valid = np.isfinite(dists) & ~np.isnan(values)
+    weights = np.where(valid, 1.0 / np.maximum(np.where(valid, dists, 1.0), MIN_IDW_DISTANCE) ** power, 0.0)
+    total = weights.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = np.where(total > 0, (weights * np.nan_to_num(values)).sum(axis=1) / total, np.nan)
+        relative = weights / weights.max(axis=1, keepdims=True)
+    effective_samples = np.nan_to_num(relative * np.where(valid, samples, 0)).sum(axis=1)
+    confidence = np.minimum(1.0, effective_samples / FULL_CONFIDENCE_SAMPLES)
+    return result, confidence, valid.sum(axis=1)
+
+
+class RentIndex:
+    def __init__(self, rows: list[RentalData], utm_crs: pyproj.CRS):
+        self.transformer = pyproj.Transformer.from_crs("EPSG:4326", utm_crs, always_xy=True)
+        self.classes: dict[tuple[int, int], _RentClass] = {}
+        if rows:
+            xy = self.project([r.location.x for r in rows], [r.location.y for r in rows])
+            by_class: dict[tuple[int, int], list[int]] = {}
+            for i, r in enumerate(rows):
+                by_class.setdefault(self.class_key(r.br, r.ba), []).append(i)
+            for key, idxs in by_class.items():
+                self.classes[key] = _RentClass(xy[idxs], [rows[i] for i in idxs])
+        self.num_rows = len(rows)
+
+    @staticmethod
+    def class_key(br, ba) -> tuple[int, int]:
+        return int(br), int(ba)
+
+    def project(self, longs, lats) -> np.ndarray:
+        """Lat/long (EPSG:4326) to an (n, 2) array of UTM coordinates"""
+        x, y = self.transformer.transform(np.asarray(longs, dtype=float), np.asarray(lats, dtype=float))
+        return np.column_stack([np.atleast_1d(x), np.atleast_1d(y)])
+
+    def add(self, row: RentalData):
+        key = self.class_key(row.br, row.ba)
+        self.classes.setdefault(key, _RentClass()).append(self.project([row.location.x], [row.location.y]), row)
+        self.num_rows += 1
+
+    def nearest(self, xy: np.ndarray, br: int, ba: int, max_distance: float) -> RentalData | None:
+        """Closest RentalData of the class within max_distance meters of a UTM location, or None"""
+        rent_class = self.classes.get(self.class_key(br, ba))
+        if rent_class is None or not rent_class.rows:
+            return None
+        d2 = np.sum((rent_class.xy - np.asarray(xy).reshape(1, 2)) ** 2, axis=1)
+        i = int(np.argmin(d2))
+        return rent_class.rows[i] if d2[i] <= max_distance**2 else None
+
+    def nearest_batch(
+        self, xy: np.ndarray, br: int, ba: int, max_distance: float, k: int = 1
+    ) -> tuple[np.ndarray, list[list[RentalData]]]:
+        """k nearest RentalData of the class within max_distance meters, for each of an (n, 2) array of UTM
+        locations. Returns an (n, k) array of distances (sorted, inf where there's no match) and, for each
+        location, the list of matching rows in order of distance."""
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        rent_class = self.classes.get(self.class_key(br, ba), _RentClass())
+        dists, idxs = rent_class.knn(xy, k, max_distance)
+        return dists, [[rent_class.rows[j] for j in idx_row if j >= 0] for idx_row in idxs]
+
+    def interpolate(
+        self,
+        xy: np.ndarray,
+        br: int,
+        ba: int,
+        max_distance: float,
+        percentile: int,
+        rent_fn: Callable[[RentalData, int], float],
+        k: int,
+        power: float,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """IDW-interpolated rent at each of an (n, 2) array of UTM locations from the k nearest RentalData of the
+        class within max_distance meters. rent_fn gives a row's rent at the percentile (negative if unusable).
+        Returns rents, confidences and neighbor counts as for idw()."""
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        rent_class = self.classes.get(self.class_key(br, ba), _RentClass())
+        dists, idxs = rent_class.knn(xy, k, max_distance)
+        if not rent_class.rows:
+            return idw(dists, np.full(dists.shape, np.nan), np.zeros(dists.shape), power)
+        rents, samples = rent_class.values(percentile, rent_fn)
+        # index -1 (no neighbor) picks the last row, but its distance is inf so idw() ignores it
+        return idw(dists, rents[idxs], samples[idxs], power)
+
+
+def _table_version() -> tuple:
+    """Cheap fingerprint of the RentalData table, to detect changes made by other processes"""
+    agg = RentalData.objects.aggregate(count=Count("id"), max_id=Max("id"))
+    return agg["count"], agg["max_id"]
+
+
+class _RentIndexCache:
+    """Holds the process-wide RentIndex and decides when to reload it"""
+
+    def __init__(self):
+        self.index: RentIndex | None = None
+        self.version: tuple | None = None
+        self.last_check = 0.0
+        self.lock = threading.Lock()
+
+    def get(self) -> RentIndex:
+        with self.lock:
+            now = time.monotonic()
+            if self.index is not None and now - self.last_check < REFRESH_CHECK_SECONDS:
+                return self.index
+            self.last_check = now
+            version = _table_version()
+            if self.index is None or version != self.version:
+                start = time.monotonic()
+                self.index = RentIndex(list(RentalData.objects.all()), get_utm_crs())
+                log.info(f"Loaded rent index with {self.index.num_rows} rows in {time.monotonic() - start:.2f}s")
+                self.version = version
+            return self.index
+
+    def invalidate(self):
+        """Reload on next use"""
+        with self.lock:
+            self.version = None
+            self.last_check = 0.0
+
+    def clear(self):
+        with self.lock:
+            self.index = self.version = None
+
+    def added(self, row: RentalData):
+        with self.lock:
+            if self.index is None:
+                return
+            self.index.add(row)
+            # Our own write shouldn't trigger a full reload
+            if self.version is not None:
+                self.version = (self.version[0] + 1, max(self.version[1] or 0, row.pk))
+
+
+_cache = _RentIndexCache()
+
+
+def get_rent_index() -> RentIndex:
+    """The process-wide RentIndex, (re)loading it if needed"""
+    return _cache.get()
+
+
+def clear_rent_index():
+    """Drop the index so it's reloaded on next use"""
+    _cache.clear()
+
+
+@receiver(post_save, sender=RentalData, dispatch_uid="rent_index_post_save")
+def _rental_data_saved(sender, instance: RentalData, created: bool, **kwargs):
+    if created:
+        _cache.added(instance)
+    else:
+        # Updated in place: the row we hold is a different instance
+        _cache.invalidate()
+
+
+@receiver(post_delete, sender=RentalData, dispatch_uid="rent_index_post_delete")
+def _rental_data_deleted(sender, instance: RentalData, **kwargs):
+    _cache.invalidate()
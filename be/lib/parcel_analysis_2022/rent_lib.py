@@ -1,19 +1,38 @@
 import logging
+from collections import OrderedDict, defaultdict
 from statistics import NormalDist
 
+import numpy as np
 import requests
-from django.contrib.gis.db.models.functions import Distance
-from django.contrib.gis.measure import D
 from parsnip.settings import env
 from requests import HTTPError
 from world.models import PropertyListing
 from world.models.base_models import RentalUnit
 from world.models.rental_data import RentalData
 
+from .rent_index import get_rent_index
+from .rent_surface import get_rent_surface
+
 log = logging.getLogger(__name__)
 
+RENTOMETER_TIMEOUT_SECONDS = 30
+# Max number of primed rents a RentService remembers. Oldest are forgotten first.
+MAX_PRIMED_RENTS = 100_000
+
 
 class RentService:
+    def __init__(self, idw_k: int = 5, idw_power: float = 2.0, min_confidence: float = 0.0):
+        """
+        :param int idw_k: max number of nearby rental data points to interpolate a rent from
+        :param float idw_power: inverse distance weighting power. Higher values favor the closest points more.
+        :param float min_confidence: don't use interpolated rents with a lower confidence (see rent_index.idw)
+        """
+        self.idw_k = idw_k
+        self.idw_power = idw_power
+        self.min_confidence = min_confidence
+        # (apn, br, ba, percentile, interpolate_distance) -> (rent, confidence), see prime()
+        self._interpolated: OrderedDict[tuple, tuple[float, float]] = OrderedDict()
+
     def rent_for_location(
         self,
         listing: PropertyListing,
@@ -23,6 +42,7 @@ class RentService:
         percentile: int,
         interpolate_distance: int,
         is_adu=False,
+        cache_only=False,
     ) -> list[int]:
         """Get the forecast rent for actual units or a hypothetical ADU at a location, and cache it.
 
@@ -33,6 +53,7 @@ class RentService:
         :param int percentile: what percentile we expect this property to rent for relative to mean rent
         :param bool is_adu: is this an ADU calculation (meaning it's not an 'actual' unit in the building
         :param int interpolate_distance: distance in meters to interpolate rents from before resorting to API call.
+        :param bool cache_only: if True, never call the rent API -- return no rents if DB data isn't available
         :return [int]: Rent for units in this listing, or for the hypothetical ADU rental type
         """
         assert percentile < 100
@@ -62,7 +83,16 @@ class RentService:
                 rd = x[0]
                 messages["stats"]["rent_from_db"] += 1
             else:
-                # no match for rent in memory cache or DB... try interpolating rent from nearby parcels
+                # no match for rent in memory cache or DB... try the precomputed rent surface
+                tmp_rent = self.surface_rent_for_location(
+                    listing, interpolate_distance, check_br, check_ba, messages, percentile
+                )
+                if tmp_rent > -1:
+                    messages["stats"]["rent_from_surface"] += 1
+                    rent_cache[unit] = tmp_rent
+                    rents.append(round(rent_cache[unit]))
+                    continue
+                # ... or interpolating rent from nearby parcels
                 tmp_rent = self.interpolate_rent_for_location(
                     listing, interpolate_distance, check_br, check_ba, messages, percentile
                 )
@@ -71,6 +101,9 @@ class RentService:
                     rent_cache[unit] = tmp_rent
                     rents.append(round(rent_cache[unit]))
                     continue
+                if cache_only:
+                    messages["stats"]["rent_cache_only_miss"] += 1
+                    return []
                 # couldn't interpolate rent... time to use an API credit
                 messages["stats"]["rent_rentometer_call"] += 1
                 log.info(f"CALLING Rentometer: {listing.addr}, {check_br}BR,{check_ba}BA")
@@ -88,6 +121,29 @@ class RentService:
             rents.append(round(rent_cache[unit]))
         return rents
 
+    def surface_rent_for_location(
+        self,
+        listing: PropertyListing,
+        interpolate_distance: int,
+        check_br: int,
+        check_ba: int,
+        messages,
+        percentile: int,
+    ) -> int:
+        """Rent from the cell of the precomputed rent surface containing the parcel, if there's an up-to-date surface
+        built with no more than interpolate_distance and it has data there. See rent_surface.py."""
+        surface = get_rent_surface(check_br, check_ba, percentile)
+        if surface is None or not surface.covers(interpolate_distance):
+            return -1
+        loc = listing.parcel.geom.centroid
+        rent, confidence = surface.lookup_longlat(loc.x, loc.y)
+        if np.isnan(rent):
+            return -1
+        if confidence < self.min_confidence:
+            messages["stats"]["rent_from_surface_low_confidence"] += 1
+            return -1
+        return rent
+
     def interpolate_rent_for_location(
         self,
         listing: PropertyListing,
@@ -98,18 +154,56 @@ class RentService:
         percentile: int,
     ) -> int:
         """Interpolate rent from nearby parcels, with a max distance of interpolate_distance in meters."""
-        loc = listing.parcel.geom.centroid
-        near_rental_data = (
-            RentalData.objects.filter(
-                br=check_br, ba=check_ba, location__distance_lte=(loc, D(m=interpolate_distance))
+        key = (listing.parcel_id, check_br, check_ba, percentile, interpolate_distance)
+        if key in self._interpolated:
+            rent, confidence = self._interpolated[key]
+        else:
+            loc = listing.parcel.geom.centroid
+            [(rent, confidence)] = self.interpolate_rents(
+                [(loc.x, loc.y)], check_br, check_ba, percentile, interpolate_distance
             )
-            .annotate(distance=Distance("location", loc))
-            .order_by("distance")[0:19]
+        if rent < 0:
+            return -1
+        if confidence < self.min_confidence:
+            messages["stats"]["rent_interpolated_low_confidence"] += 1
+            return -1
+        return rent
+
+    def interpolate_rents(
+        self, longlats: list[tuple[float, float]], br: int, ba: int, percentile: int, interpolate_distance: int
+    ) -> list[tuple[float, float]]:
+        """Interpolate the rent at many (long, lat) locations at once, by inverse distance weighting of the
+        nearest RentalData within interpolate_distance meters. Returns (rent, confidence) for each location, with
+        rent -1 if there's no usable data nearby."""
+        if not longlats:
+            return []
+        index = get_rent_index()
+        longs, lats = zip(*longlats, strict=True)
+        rents, confidence, _ = index.interpolate(
+            index.project(longs, lats),
+            br,
+            ba,
+            interpolate_distance,
+            percentile,
+            self._rent_at_percentile,
+            self.idw_k,
+            self.idw_power,
         )
-        if len(near_rental_data) == 0:
+        return [(-1 if np.isnan(r) else float(r), float(c)) for r, c in zip(rents, confidence, strict=True)]
+
+    def prime(self, interpolated: dict[tuple, tuple[float, float]]):
+        """Remember interpolated rents computed in bulk (eg. by prefetch_rent_estimates() in another process),
+        keyed by (apn, br, ba, percentile, interpolate_distance). Only the most recent MAX_PRIMED_RENTS are kept."""
+        for key, value in interpolated.items():
+            self._interpolated[key] = value
+            self._interpolated.move_to_end(key)
+        while len(self._interpolated) > MAX_PRIMED_RENTS:
+            self._interpolated.popitem(last=False)
+
+    def _rent_at_percentile(self, rd: RentalData, percentile: int) -> float:
+        if rd.details.get("status_code", 200) != 200:
             return -1
-        # TODO: This isn't real interpolation... we literally just return the closest match within our distance limit
-        return self._calculate_rent_from_rentdata_instance(near_rental_data[0], messages, percentile)
+        return self._calculate_rent_from_rentdata_instance(rd, defaultdict(list), percentile)
 
     def _calculate_rent_from_rentdata_instance(self, rd: RentalData, messages, percentile: int) -> int:
         """Use the data in a RentalData instance to calculate the rent for a given percentile"""
@@ -155,21 +249,23 @@ class RentService:
         """Make a call to Rentometer, record the results in our DB, and return a RentalData model instance"""
         centroid = listing.parcel.geom.centroid
         (long, lat) = centroid.coords
-        data_type = (
-            RentalData.RentalDataType.ADU_RENTOMETER_ESTIMATE
-            if is_adu
-            else RentalData.RentalDataType.UNIT_RENTOMETER_ESTIMATE
+        output = self.fetch_rentometer_output(
+            lat, long, br, ba, dry_run, label=f"{listing.addr} - APN={listing.parcel_id}"
         )
+        rd = self.rental_data_from_output(listing.parcel_id, centroid, output, is_adu)
+        if not dry_run:
+            rd.save()
+        return rd
 
+    def fetch_rentometer_output(self, lat, long, br, ba, dry_run, label: str = "") -> dict:
+        """Call Rentometer (or if in dry_run mode, just return a dummy response). HTTP errors are returned as an
+        output with 'status_code' and 'errors' keys, so they get cached like any other result. Doesn't touch the DB,
+        so it's safe to call from other threads."""
         try:
-            # Call Rentometer, or if in dry_run mode, just return a dummy object
-            output = self._call_rentometer(lat, long, br, ba) if not dry_run else self._dry_run_resp(br, ba)
+            return self._call_rentometer(lat, long, br, ba) if not dry_run else self._dry_run_resp(br, ba)
         except HTTPError as e:
             # create error output and save it as a rental data object
-            log.error(
-                f"  ERROR - {listing.addr} - APN={listing.parcel_id}: RENTOMETER FAILED WITH ERROR",
-                str(e),
-            )
+            log.error(f"  ERROR - {label}: RENTOMETER FAILED WITH ERROR {e}")
             output = e.response.json()  # creates 'errors' key
             output.update(
                 {
@@ -178,18 +274,25 @@ class RentService:
                     "status_code": e.response.status_code,
                 }
             )
-        rd = RentalData(
-            parcel=listing.parcel,
+            return output
+
+    @staticmethod
+    def rental_data_from_output(apn: str, location, output: dict, is_adu: bool) -> RentalData:
+        """Unsaved RentalData instance for a Rentometer output at a location"""
+        data_type = (
+            RentalData.RentalDataType.ADU_RENTOMETER_ESTIMATE
+            if is_adu
+            else RentalData.RentalDataType.UNIT_RENTOMETER_ESTIMATE
+        )
+        return RentalData(
+            parcel_id=apn,
             br=output["bedrooms"],
             ba=output["baths"],
             sqft=None,
             details=output,
-            location=centroid,
+            location=location,
             data_type=data_type,
         )
-        if not dry_run:
-            rd.save()
-        return rd
 
     def _call_rentometer(self, lat, long, br, ba):
         q = dict(
@@ -201,7 +304,7 @@ class RentService:
                 "api_key": env("RENTOMETER_API_KEY"),
             }
         )
-        r = requests.get("https://www.rentometer.com/api/v1/summary", params=q)
+        r = requests.get(env("RENTOMETER_API_URL"), params=q, timeout=RENTOMETER_TIMEOUT_SECONDS)
         r.raise_for_status()
         output = r.json()
         output["baths"] = 1 if output["baths"] == "1 only" else 2
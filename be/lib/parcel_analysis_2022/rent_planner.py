@@ -0,0 +1,114 @@
+"""
+Plan and run the Rentometer calls for a whole batch of parcels up front, instead of making a blocking call whenever
+a unit misses the rent cache in the middle of analyze_one_parcel().
+
+1. The caller collects a RentRequest for every rent the batch can't get from the DB or by interpolation (see
+   analyze_parcel_lib.collect_missing_rents).
+2. plan_rent_requests() drops requests that are within the interpolation radius of an earlier request for the same
+   unit type: once that one is fetched, they can be interpolated from it.
+3. fetch_rent_requests() makes the remaining calls on a thread pool, stopping at a credit budget or when Rentometer
+   says we're out of credits. Results are saved as RentalData from the calling thread.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+
+import numpy as np
+from django.contrib.gis.geos import Point
+
+from .rent_index import RentIndex
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RentRequest:
+    apn: str
+    long: float
+    lat: float
+    br: int
+    ba: int
+    # Parcels within this many meters can interpolate their rent from the result of this request
+    radius: float
+    is_adu: bool = False
+
+
+def plan_rent_requests(requests: list[RentRequest], index: RentIndex) -> list[RentRequest]:
+    """Dedupe requests, keeping them in order of priority (input order). A request is dropped if an earlier kept
+    request for the same (br, ba) is within its radius, or it's an exact duplicate."""
+    planned = []
+    kept_xy: dict[tuple[int, int], list[np.ndarray]] = {}
+    seen = set()
+    xys = index.project([r.long for r in requests], [r.lat for r in requests]) if requests else []
+    for request, xy in zip(requests, xys, strict=True):
+        key = (request.apn, request.br, request.ba)
+        if key in seen:
+            continue
+        seen.add(key)
+        class_xy = kept_xy.setdefault((request.br, request.ba), [])
+        if class_xy and np.min(np.hypot(*(np.array(class_xy) - xy).T)) <= request.radius:
+            continue
+        class_xy.append(xy)
+        planned.append(request)
+    log.info(f"Planned {len(planned)} Rentometer calls for {len(requests)} missing rents")
+    return planned
+
+
+def fetch_rent_requests(
+    requests: list[RentRequest], budget: int | None = None, max_workers: int = 4, dry_run: bool = False
+) -> Counter:
+    """Call Rentometer for up to `budget` of the requests (in order), with up to max_workers calls in flight, and
+    save the results. Stops early if we run out of credits. Returns stats."""
+    from .analyze_parcel_lib import rent_data
+
+    stats = Counter()
+    if budget is not None and len(requests) > budget:
+        stats["over_budget"] = len(requests) - budget
+        requests = requests[:budget]
+    out_of_credits = threading.Event()
+
+    def fetch(request: RentRequest) -> dict | None:
+        if out_of_credits.is_set():
+            return None
+        output = rent_data.fetch_rentometer_output(
+            request.lat, request.long, request.br, request.ba, dry_run, label=f"APN={request.apn}"
+        )
+        if output.get("status_code") == 402:
+            out_of_credits.set()
+        return output
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rentometer") as executor:
+        futures = {executor.submit(fetch, r): r for r in requests}
+        for future in as_completed(futures):
+            request = futures[future]
+            try:
+                output = future.result()
+            except Exception:
+                log.error(f"Rentometer call for {request} failed", exc_info=True)
+                stats["failed"] += 1
+                continue
+            if output is None:
+                stats["skipped_out_of_credits"] += 1
+                continue
+            status_code = output.get("status_code", 200)
+            stats["fetched" if status_code == 200 else f"error_{status_code}"] += 1
+            if "credits_remaining" in output:
+                stats["credits_remaining"] = min(
+                    stats.get("credits_remaining", output["credits_remaining"]), output["credits_remaining"]
+                )
+            rd = rent_data.rental_data_from_output(
+                request.apn, Point(request.long, request.lat, srid=4326), output, request.is_adu
+            )
+            if not dry_run:
+                rd.save()
+    if out_of_credits.is_set():
+        log.critical(
+            "No credits available from Rentometer. Please buy more credits, then "
+            "run './manage.py rent_data reset_credits'"
+        )
+    log.info(f"Rentometer fetch stats: {dict(stats)}")
+    return stats
@@ -0,0 +1,219 @@
+"""
+Rent surfaces: rents interpolated from RentalData onto a square grid ahead of time, one grid per (br, ba, percentile),
+so a rent lookup is an array index instead of a nearest-neighbor search.
+
+build_rent_surface() runs the same IDW interpolation as RentService.interpolate_rents() at each cell's center and
+stores the result as a RentSurface row (see `./manage.py rent_data build_surface`). A cell's value is only a stand-in
+for an interpolated rent at a point in the cell, so RentSurfaceGrid.covers() only accepts a surface for lookups whose
+interpolation distance is at least the surface's max_distance plus half a cell diagonal.
+
+Cells with no RentalData within max_distance are NaN. Confidence is quantized to a byte.
+
+A surface built before RentalData last changed is stale: it would override newer rows (eg. ones just fetched from
+Rentometer), so get_rent_surface() doesn't return it until it's rebuilt.
+"""
+from __future__ import annotations
+
+import datetime
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pyproj
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from world.models import DataVersion, RentalData, RentSurface
+
+from .rent_index import REFRESH_CHECK_SECONDS, RentIndex
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CELL_SIZE = 100.0  # meters
+DEFAULT_MAX_DISTANCE = 400.0  # meters
+
+
+@dataclass
+class RentSurfaceGrid:
+    """A decoded RentSurface"""
+
+    br: int
+    ba: int
+    percentile: int
+    origin: tuple[float, float]
+    cell_size: float
+    max_distance: float
+    rents: np.ndarray  # (ny, nx) float32, nan where there's no data
+    confidence: np.ndarray  # (ny, nx) float32, 0 to 1
+    transformer: pyproj.Transformer
+    built: datetime.datetime | None = None
+
+    @classmethod
+    def from_model(cls, surface: RentSurface) -> RentSurfaceGrid:
+        shape = (surface.ny, surface.nx)
+        return cls(
+            br=surface.br,
+            ba=surface.ba,
+            percentile=surface.percentile,
+            origin=(surface.origin_x, surface.origin_y),
+            cell_size=surface.cell_size,
+            max_distance=surface.max_distance,
+            rents=np.frombuffer(bytes(surface.rents), dtype=np.float32).reshape(shape),
+            confidence=np.frombuffer(bytes(surface.confidence), dtype=np.uint8).reshape(shape) / 255,
+            transformer=pyproj.Transformer.from_crs("EPSG:4326", pyproj.CRS(surface.crs), always_xy=True),
+            built=surface.built,
+        )
+
+    def to_model(self, crs: pyproj.CRS) -> RentSurface:
+        ny, nx = self.rents.shape
+        return RentSurface(
+            br=self.br,
+            ba=self.ba,
+            percentile=self.percentile,
+            crs=crs.to_string(),
+            origin_x=self.origin[0],
+            origin_y=self.origin[1],
+            cell_size=self.cell_size,
+            nx=nx,
+            ny=ny,
+            max_distance=self.max_distance,
+            rents=self.rents.astype(np.float32).tobytes(),
+            confidence=np.round(np.clip(self.confidence, 0, 1) * 255).astype(np.uint8).tobytes(),
+            num_cells_with_data=int(np.count_nonzero(~np.isnan(self.rents))),
+        )
+
+    def covers(self, interpolate_distance: float) -> bool:
+        """Whether every point in a cell is within interpolate_distance of all the data that went into the cell"""
+        return self.max_distance + self.cell_size * math.sqrt(2) / 2 <= interpolate_distance
+
+    def lookup(self, xy: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Rent and confidence of the cell containing each of an (n, 2) array of locations in the surface's CRS.
+        Locations outside the grid get nan rent and 0 confidence."""
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        ny, nx = self.rents.shape
+        ix = np.floor((xy[:, 0] - self.origin[0]) / self.cell_size).astype(int)
+        iy = np.floor((xy[:, 1] - self.origin[1]) / self.cell_size).astype(int)
+        inside = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+        rents = np.full(len(xy), np.nan)
+        confidence = np.zeros(len(xy))
+        rents[inside] = self.rents[iy[inside], ix[inside]]
+        confidence[inside] = self.confidence[iy[inside], ix[inside]]
+        return rents, confidence
+
+    def lookup_longlat(self, long: float, lat: float) -> tuple[float, float]:
+        x, y = self.transformer.transform(long, lat)
+        rents, confidence = self.lookup(np.array([[x, y]]))
+        return float(rents[0]), float(confidence[0])
+
+
+def build_rent_surface(
+    index: RentIndex,
+    br: int,
+    ba: int,
+    percentile: int,
+    rent_fn,
+    k: int,
+    power: float,
+    cell_size: float = DEFAULT_CELL_SIZE,
+    max_distance: float = DEFAULT_MAX_DISTANCE,
+) -> RentSurfaceGrid | None:
+    """Interpolate the rent for a unit type at the center of each cell of a grid covering the class's RentalData
+    (plus max_distance). Returns None if there's no data for the class."""
+    rent_class = index.classes.get(index.class_key(br, ba))
+    if rent_class is None or not rent_class.rows:
+        return None
+    # Snap the origin to the cell size so rebuilt grids line up with earlier ones
+    lo = np.floor((rent_class.xy.min(axis=0) - max_distance) / cell_size) * cell_size
+    hi = rent_class.xy.max(axis=0) + max_distance
+    nx, ny = (np.ceil((hi - lo) / cell_size).astype(int) + 1).tolist()
+    xs = lo[0] + (np.arange(nx) + 0.5) * cell_size
+    ys = lo[1] + (np.arange(ny) + 0.5) * cell_size
+    centers = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)  # row-major, y then x
+    rents, confidence, _ = index.interpolate(centers, br, ba, max_distance, percentile, rent_fn, k, power)
+    return RentSurfaceGrid(
+        br=int(br),
+        ba=int(ba),
+        percentile=percentile,
+        origin=(float(lo[0]), float(lo[1])),
+        cell_size=cell_size,
+        max_distance=max_distance,
+        rents=rents.reshape(ny, nx).astype(np.float32),
+        confidence=confidence.reshape(ny, nx),
+        transformer=index.transformer,
+    )
+
+
+def _table_version() -> tuple:
+    agg = RentSurface.objects.aggregate(count=Count("id"), built=Max("built"))
+    return agg["count"], agg["built"]
+
+
+class _RentSurfaceCache:
+    """Holds the process-wide decoded surfaces, reloading them when the table changes. Also tracks when RentalData
+    last changed, to tell which surfaces are stale."""
+
+    def __init__(self):
+        self.grids: dict[tuple[int, int, int], RentSurfaceGrid] | None = None
+        self.version: tuple | None = None
+        self.rental_data_changed: datetime.datetime | None = None
+        self.last_check = 0.0
+        self.lock = threading.Lock()
+
+    def get(self) -> dict[tuple[int, int, int], RentSurfaceGrid]:
+        with self.lock:
+            now = time.monotonic()
+            if self.grids is not None and now - self.last_check < REFRESH_CHECK_SECONDS:
+                return self.grids
+            self.last_check = now
+            self.rental_data_changed = _max_time(self.rental_data_changed, DataVersion.latest(RentalData))
+            version = _table_version()
+            if self.grids is None or version != self.version:
+                self.grids = {
+                    (s.br, s.ba, s.percentile): RentSurfaceGrid.from_model(s) for s in RentSurface.objects.all()
+                }
+                log.info(f"Loaded {len(self.grids)} rent surfaces")
+                self.version = version
+                if stale := sum(self.is_stale(grid) for grid in self.grids.values()):
+                    log.warning(f"{stale} rent surfaces are older than RentalData, run `rent_data build_surface`")
+            return self.grids
+
+    def is_stale(self, grid: RentSurfaceGrid) -> bool:
+        if self.rental_data_changed is None:
+            return False
+        return grid.built is None or grid.built < self.rental_data_changed
+
+    def note_rental_data_change(self):
+        """RentalData changed in this process: don't wait for the next check to stop using older surfaces"""
+        with self.lock:
+            self.rental_data_changed = datetime.datetime.now(datetime.UTC)
+
+    def clear(self):
+        with self.lock:
+            self.grids = self.version = self.rental_data_changed = None
+
+
+_cache = _RentSurfaceCache()
+
+
+def _max_time(a: datetime.datetime | None, b: datetime.datetime | None) -> datetime.datetime | None:
+    return max((t for t in (a, b) if t is not None), default=None)
+
+
+def get_rent_surface(br: int, ba: int, percentile: int) -> RentSurfaceGrid | None:
+    """The surface for a unit type and percentile, if one has been built since RentalData last changed"""
+    grid = _cache.get().get((int(br), int(ba), int(percentile)))
+    return None if grid is None or _cache.is_stale(grid) else grid
+
+
+def clear_rent_surfaces():
+    """Drop the loaded surfaces so they're reloaded on next use"""
+    _cache.clear()
+
+
+@receiver(post_save, sender=RentalData, dispatch_uid="rent_surface_post_save")
+@receiver(post_delete, sender=RentalData, dispatch_uid="rent_surface_post_delete")
+def _rental_data_changed(sender, instance: RentalData, **kwargs):
+    _cache.note_rental_data_change()
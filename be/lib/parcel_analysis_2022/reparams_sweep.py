@@ -0,0 +1,200 @@
+"""
+Re-evaluate the finance model of existing analyses over a grid of ReParams, without re-running the geometry pipeline.
+
+The geometric results we need (available FAR area, available lot area, existing units) are already stored on
+AnalyzedListing, so a sweep only needs rents (looked up once per listing in the parent process, from the DB only) and
+the pure finance model in dev_scenarios_for_far_area().
+
+NOTE: Workers run in fresh processes, so nothing in this module imports Django models at module level -- worker
+arguments are plain dataclasses / dicts that can be unpickled before Django is set up.
+"""
+from __future__ import annotations
+
+import itertools
+import logging
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import django
+from django.apps import apps
+from joblib import Parallel, delayed
+
+if TYPE_CHECKING:
+    from world.models import AnalyzedListing
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class SweepInput:
+    """Everything the finance model needs for one analyzed listing"""
+
+    al_id: int
+    apn: str
+    price: int | None
+    is_mf: bool
+    unitqty: int
+    far_area: int  # sq meters of floor area available under FAR
+    geom_area: int  # sq meters of open lot area
+    # existing-unit rent percentile -> total monthly rent of existing units, None if we have no rent data for them
+    existing_rents: dict[int, int | None]
+    adu_rents: dict[tuple[int, int, float], int | None]  # (percentile, br, ba) -> monthly rent for one ADU
+
+
+def parse_param_grid(param_args: list[str]) -> list[dict]:
+    """Turn ["vacancy_rate=0.03,0.05", "constr_costs.soft_cost_rate=9,12"] into a list of ReParams dicts, one per
+    combination of values. Raises ValueError on unknown parameter names."""
+    from .re_params import ConstructionCosts, ReParams
+
+    axes: dict[str, list[str]] = {}
+    for arg in param_args:
+        name, _, values = arg.partition("=")
+        name = name.strip()
+        if not values:
+            raise ValueError(f"Parameter '{arg}' should look like name=value1,value2")
+        if name.startswith("constr_costs."):
+            if name.removeprefix("constr_costs.") not in ConstructionCosts.__fields__:
+                raise ValueError(f"Unknown construction cost parameter '{name}'")
+        elif name not in ReParams.__fields__ or name == "constr_costs":
+            raise ValueError(f"Unknown ReParams parameter '{name}'")
+        axes[name] = [v.strip() for v in values.split(",")]
+
+    param_sets = []
+    for combo in itertools.product(*axes.values()):
+        top, constr_costs = {}, {}
+        for name, value in zip(axes.keys(), combo, strict=True):
+            if name.startswith("constr_costs."):
+                constr_costs[name.removeprefix("constr_costs.")] = value
+            else:
+                top[name] = value
+        # round-trip through pydantic to validate and coerce the values
+        param_sets.append(ReParams(**top, constr_costs=ConstructionCosts(**constr_costs)).dict())
+    return param_sets
+
+
+def swept_param_names(param_args: list[str]) -> list[str]:
+    return [arg.partition("=")[0].strip() for arg in param_args]
+
+
+def load_sweep_inputs(
+    analyzed_listings: list[AnalyzedListing], param_sets: list[dict]
+) -> tuple[list[SweepInput], Counter]:
+    """Look up rents for every listing at every rent percentile in the grid. Only uses rents we already have in the
+    DB (or can interpolate), never the rent API. Listings missing existing-unit rents are flagged in the sweep output
+    (see sweep_worker). Returns the inputs and aggregated rent lookup stats."""
+    from .analyze_parcel_lib import get_interpolate_distance, rent_data
+    from .re_params import ConstructionCosts, get_build_specs
+
+    existing_percentiles = {p["existing_unit_rent_percentile"] for p in param_sets}
+    new_percentiles = {p["new_unit_rent_percentile"] for p in param_sets}
+    adu_specs = {(spec.br, spec.ba): spec for spec in get_build_specs(ConstructionCosts())}
+    messages = {"info": [], "warning": [], "error": [], "note": [], "stats": Counter({})}
+
+    inputs = []
+    for al in analyzed_listings:
+        listing = al.listing
+        interp_dist = get_interpolate_distance(listing, al.is_mf)
+        existing_units = listing.parcel.rental_units
+        existing_rents = {}
+        for pct in existing_percentiles:
+            rents = rent_data.rent_for_location(
+                listing, existing_units, messages, True, pct, interp_dist, cache_only=True
+            )
+            existing_rents[pct] = sum(rents) if len(rents) == len(existing_units) else None
+        if None in existing_rents.values():
+            messages["stats"]["rent_missing"] += 1
+        adu_rents = {}
+        if al.is_mf:
+            for pct, ((br, ba), spec) in itertools.product(new_percentiles, adu_specs.items()):
+                rents = rent_data.rent_for_location(
+                    listing, [spec], messages, True, pct, interp_dist, is_adu=True, cache_only=True
+                )
+                adu_rents[(pct, br, ba)] = rents[0] if rents else None
+            if None in adu_rents.values():
+                messages["stats"]["adu_rent_missing"] += 1
+        inputs.append(
+            SweepInput(
+                al_id=al.id,
+                apn=al.parcel_id,
+                price=listing.price,
+                is_mf=bool(al.is_mf),
+                unitqty=listing.parcel.unitqty,
+                far_area=int(al.details["avail_area_by_FAR"]),
+                geom_area=int(al.details["avail_geom_area"]),
+                existing_rents=existing_rents,
+                adu_rents=adu_rents,
+            )
+        )
+    if messages["stats"]["rent_missing"]:
+        log.warning(f"{messages['stats']['rent_missing']} of {len(inputs)} listings are missing existing-unit rents")
+    if messages["stats"]["adu_rent_missing"]:
+        log.warning(f"{messages['stats']['adu_rent_missing']} of {len(inputs)} listings are missing some ADU rents")
+    return inputs, messages["stats"]
+
+
+def sweep_worker(inputs: list[SweepInput], param_sets: list[dict], param_names: list[str]) -> dict[str, list]:
+    """Evaluate the finance model for each listing x parameter set. Returns a columnar dict (column -> values).
+    Rows for listings without existing-unit rents at the set's percentile have rent_missing set, and rows for
+    multi-family listings without the rent of an ADU they could build have adu_rent_missing set. Neither has
+    finances."""
+    if not apps.ready:
+        django.setup()
+    from .analyze_parcel_lib import dev_scenarios_for_far_area
+    from .re_params import ReParams
+
+    re_params_list = [ReParams.parse_obj(p) for p in param_sets]
+    columns = defaultdict(list)
+    for inp in inputs:
+        for param_set_id, (param_dict, re_params) in enumerate(zip(param_sets, re_params_list, strict=True)):
+            scenarios = []
+            existing_rent = inp.existing_rents[re_params.existing_unit_rent_percentile]
+            rent_missing = existing_rent is None
+            missing_adu_rents = []
+            if inp.is_mf and not rent_missing:
+                pct = re_params.new_unit_rent_percentile
+
+                def adu_rent(spec, pct=pct, inp=inp, missing=missing_adu_rents):
+                    rent = inp.adu_rents.get((pct, spec.br, spec.ba))
+                    if rent is None:
+                        missing.append(spec)
+                    return rent
+
+                scenarios = dev_scenarios_for_far_area(
+                    inp.price, inp.unitqty, existing_rent, inp.far_area, inp.geom_area, re_params, adu_rent
+                )
+            adu_rent_missing = bool(missing_adu_rents)
+            # The best of the scenarios we have rents for isn't the listing's best, so report none
+            with_finances = [] if adu_rent_missing else [s for s in scenarios if s.finances]
+            best = max(with_finances, key=lambda s: s.finances.cap_rate_calc, default=None)
+
+            columns["al_id"].append(inp.al_id)
+            columns["apn"].append(inp.apn)
+            columns["param_set_id"].append(param_set_id)
+            for name in param_names:
+                if name.startswith("constr_costs."):
+                    columns[name].append(param_dict["constr_costs"][name.removeprefix("constr_costs.")])
+                else:
+                    columns[name].append(param_dict[name])
+            columns["rent_missing"].append(rent_missing)
+            columns["adu_rent_missing"].append(adu_rent_missing)
+            columns["num_scenarios"].append(len(scenarios))
+            columns["max_cap_rate"].append(
+                None if rent_missing or adu_rent_missing else best.finances.cap_rate_calc if best else 0
+            )
+            columns["best_adu_qty"].append(best.adu_qty if best else None)
+            columns["best_unit_type"].append(repr(best.unit_type) if best else None)
+            columns["best_net_income"].append(best.finances.net_income_calc if best else None)
+            columns["best_capital_sum"].append(best.finances.capital_sum_calc if best else None)
+    return dict(columns)
+
+
+def run_sweep(
+    inputs: list[SweepInput], param_sets: list[dict], param_names: list[str], n_jobs: int = 8, chunk_size: int = 200
+) -> list[dict[str, list]]:
+    """Split the listings into chunks and evaluate each chunk against the whole grid in a worker process."""
+    chunks = [inputs[i : i + chunk_size] for i in range(0, len(inputs), chunk_size)]
+    log.info(f"Sweeping {len(inputs)} listings x {len(param_sets)} parameter sets in {len(chunks)} chunks")
+    if n_jobs == 1:
+        return [sweep_worker(chunk, param_sets, param_names) for chunk in chunks]
+    return Parallel(n_jobs=n_jobs)(delayed(sweep_worker)(chunk, param_sets, param_names) for chunk in chunks)
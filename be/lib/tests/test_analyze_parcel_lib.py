@@ -0,0 +1,61 @@
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+from world.models.base_models import RentalUnit
+
+from lib.parcel_analysis_2022 import analyze_parcel_lib
+from lib.parcel_analysis_2022.analyze_parcel_lib import _dev_potential_by_far, existing_unit_rents
+from lib.parcel_analysis_2022.re_params import ReParams
+
+
+def messages():
+    return {"info": [], "warning": [], "error": [], "note": [], "stats": Counter()}
+
+
+@pytest.fixture()
+def duplex():
+    units = [RentalUnit(br=2, ba=1, sqft=800), RentalUnit(br=3, ba=2, sqft=1100)]
+    return SimpleNamespace(addr="1234 Main St", parcel=SimpleNamespace(rental_units=units))
+
+
+class TestExistingUnitRents:
+    def test_rents(self, monkeypatch, duplex):
+        monkeypatch.setattr(analyze_parcel_lib.rent_data, "rent_for_location", lambda *args, **kwargs: [2500, 3100])
+        msgs = messages()
+        rents, with_rent = existing_unit_rents(duplex, msgs, 1000, ReParams(), dry_run=True, rent_cache_only=True)
+        assert rents == [2500, 3100]
+        assert [rent for _, rent in with_rent] == [2500, 3100]
+        assert not msgs["stats"]["rent_missing"]
+
+    # Over the Rentometer budget, the listing's rent was never fetched, so the cache-only lookup misses. When the
+    # representative request for its area failed, the lookup finds the cached error. Either way there are no rents.
+    @staticmethod
+    def over_budget(listing, units, messages, *args, **kwargs):
+        messages["stats"]["rent_cache_only_miss"] += 1
+        return []
+
+    @staticmethod
+    def failed_representative(listing, units, messages, *args, **kwargs):
+        return []
+
+    @pytest.mark.parametrize("rent_for_location", ["over_budget", "failed_representative"])
+    def test_missing_rent_doesnt_abort_the_analysis(self, monkeypatch, duplex, rent_for_location):
+        monkeypatch.setattr(analyze_parcel_lib.rent_data, "rent_for_location", getattr(self, rent_for_location))
+        msgs = messages()
+        rents, with_rent = existing_unit_rents(duplex, msgs, 1000, ReParams(), dry_run=True, rent_cache_only=True)
+        assert rents is None
+        assert [(unit["br"], rent) for unit, rent in with_rent] == [(2, None), (3, None)]
+        assert msgs["stats"]["rent_missing"] == 1
+        assert msgs["warning"] == ["Missing rent: no rent data for the existing units"]
+
+    def test_no_finances_without_existing_rents(self, monkeypatch, duplex):
+        monkeypatch.setattr(
+            analyze_parcel_lib.rent_data, "rent_for_location", lambda *args, **kwargs: pytest.fail("no rent lookups")
+        )
+        duplex.price = 900_000
+        duplex.parcel.unitqty = 2
+        duplex.parcel.address, duplex.parcel.apn = "1234 MAIN ST", "4151234500"
+        scenarios = _dev_potential_by_far(duplex, None, messages(), 1000, True, 500, 1000, ReParams(), dry_run=True)
+        assert scenarios
+        assert all(scenario.finances is None for scenario in scenarios)
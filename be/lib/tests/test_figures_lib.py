@@ -0,0 +1,105 @@
+import geopandas
+import pytest
+from shapely.geometry import GeometryCollection, LineString, MultiLineString, MultiPolygon, Point, box
+from world.models import Parcel
+
+from lib.parcel_analysis_2022.figures_lib import (
+    FigurePublisher,
+    LocalImageStore,
+    ParcelFigures,
+    publish_parcel_figures,
+    quantize_geometry,
+)
+from lib.parcel_analysis_2022.types import ParcelDC
+
+UTM_CRS = "EPSG:32611"
+
+
+def make_figures(salt: str | None, second_lot=None) -> ParcelFigures:
+    lot = box(0, 0, 15, 30)
+    parcel = ParcelDC(
+        geometry=MultiPolygon([lot]),
+        model=Parcel(apn="4151234500", situs_addr=1234, situs_stre="MAIN", situs_suff="ST"),
+    )
+    return ParcelFigures(
+        parcel=parcel,
+        utm_crs=UTM_CRS,
+        buildings=geopandas.GeoDataFrame({"building_type": ["MAIN"]}, geometry=[box(3, 3, 12, 12)], crs=UTM_CRS),
+        topos=geopandas.GeoDataFrame(geometry=[], crs=UTM_CRS),
+        too_high_topos=None,
+        too_low_topos=None,
+        new_buildings=[box(3, 18, 12, 27)],
+        street_edges=MultiLineString([LineString([(0, 0), (15, 0)])]),
+        flag_poly=None,
+        buffered_buildings=box(2, 2, 13, 13),
+        setbacks=[box(0, 0, 15, 2)],
+        too_steep=[],
+        second_lot=second_lot,
+        salt=salt,
+    )
+
+
+class TestFigurePublisher:
+    def test_publishes_to_store_and_save_dir(self, tmp_path):
+        store = LocalImageStore(tmp_path / "store")
+        save_dir = tmp_path / "local"
+        save_dir.mkdir()
+        with FigurePublisher(store, str(save_dir)) as publisher:
+            publisher.submit(make_figures(salt="abc", second_lot=box(0, 15, 15, 30)))
+            publisher.submit(None)  # dry-run analyses have no figures
+        assert publisher.stats == {"published": 1}
+
+        assert sorted(p.name for p in store.root.iterdir()) == [
+            "buildings-4151234500-abc",
+            "cant_build-4151234500-abc",
+        ]
+        assert (store.root / "buildings-4151234500-abc").read_bytes()[:2] == b"\xff\xd8"  # JPEG magic
+        assert sorted(p.name for p in save_dir.iterdir()) == [
+            "buildings-4151234500.jpg",
+            "cant-build-4151234500.jpg",
+            "lot-splits-4151234500.jpg",
+        ]
+
+    def test_no_upload_without_salt(self, tmp_path):
+        store = LocalImageStore(tmp_path)
+        save_dir = tmp_path / "local"
+        save_dir.mkdir()
+        with FigurePublisher(store, str(save_dir)) as publisher:
+            publisher.submit(make_figures(salt=None))
+        assert publisher.stats == {"published": 1}
+        assert list(store.root.iterdir()) == []
+        assert len(list(save_dir.iterdir())) == 2
+
+    def test_nothing_to_publish(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(ParcelFigures, "render", lambda self: pytest.fail("nothing to save, shouldn't render"))
+        with FigurePublisher(LocalImageStore(tmp_path)) as publisher:
+            publisher.submit(make_figures(salt=None))
+        assert publisher.stats == {"skipped": 1}
+        publish_parcel_figures(make_figures(salt="abc"), None, None)
+
+
+class TestGeometryPayload:
+    def test_quantize_geometry(self):
+        origin = (1000.0, 2000.0)
+        square = box(1000, 2000, 1010.04, 2010)
+        assert quantize_geometry(square, origin, 0.1) == [
+            {"type": "Polygon", "coordinates": [[[100, 0], [100, 100], [0, 100], [0, 0], [100, 0]]]}
+        ]
+        # multi-part geometries are split, slivers that collapse at this scale and points are dropped
+        sliver = box(1000, 2000, 1000.01, 2010)
+        line = LineString([(1000, 2000), (1000.01, 2000), (1005, 2000)])
+        assert quantize_geometry(MultiPolygon([sliver]), origin, 0.1) == []
+        assert quantize_geometry(GeometryCollection([line, Point(0, 0)]), origin, 0.1) == [
+            {"type": "LineString", "coordinates": [[0, 0], [50, 0]]}
+        ]
+        assert quantize_geometry(None, origin, 0.1) == []
+
+    def test_payload_layers(self):
+        payload = make_figures(salt=None).geometry_payload()
+        assert payload["origin"] == (0, 0)
+        assert payload["scale"] == 0.1
+        layers = payload["layers"]
+        assert layers["parcel"][0]["coordinates"][0][0:2] == [[150, 0], [150, 300]]
+        assert layers["buildings"][0]["building_type"] == "MAIN"
+        assert len(layers["new_buildings"]) == 1
+        assert layers["second_lot"] == layers["flag"] == layers["too_steep"] == []
@@ -0,0 +1,96 @@
+import numpy as np
+from django.contrib.gis.geos import Point
+from world.models.rental_data import RentalData
+
+from lib.parcel_analysis_2022 import rent_lib
+from lib.parcel_analysis_2022.crs_lib import get_utm_crs
+from lib.parcel_analysis_2022.rent_index import FULL_CONFIDENCE_SAMPLES, RentIndex, idw
+
+
+def rental(br: int, ba: int, long: float, lat: float, samples: int = 10) -> RentalData:
+    return RentalData(
+        br=br, ba=ba, location=Point(long, lat, srid=4326), details={"mean": br * 1000, "samples": samples}
+    )
+
+
+class TestRentIndex:
+    def setup_method(self):
+        self.rows = [
+            rental(2, 1, -117.1500, 32.7500),
+            rental(2, 1, -117.1600, 32.7500),  # ~940m west of the first
+            rental(3, 2, -117.1500, 32.7500),
+        ]
+        self.index = RentIndex(self.rows, get_utm_crs())
+
+    def test_nearest(self):
+        xy = self.index.project([-117.1590], [32.7500])[0]
+        assert self.index.nearest(xy, 2, 1, 500) is self.rows[1]
+        assert self.index.nearest(xy, 3, 2, 500) is None  # too far
+        assert self.index.nearest(xy, 3, 2, 2000) is self.rows[2]
+        assert self.index.nearest(xy, 1, 1, 2000) is None  # no data for the class
+
+    def test_nearest_batch_matches_nearest(self):
+        xy = self.index.project([-117.1590, -117.1510, -117.1000], [32.7500, 32.7500, 32.7500])
+        dists, matches = self.index.nearest_batch(xy, 2, 1, 500, k=2)
+        assert dists.shape == (3, 2)
+        assert [m[:1] for m in matches] == [[self.rows[1]], [self.rows[0]], []]
+        assert np.isinf(dists[2]).all()
+        for point, m in zip(xy, matches, strict=True):
+            assert self.index.nearest(point, 2, 1, 500) is (m[0] if m else None)
+
+    def test_add(self):
+        row = rental(1, 1, -117.1500, 32.7500)
+        self.index.add(row)
+        assert self.index.nearest(self.index.project([-117.1500], [32.7500])[0], 1, 1, 10) is row
+        assert self.index.num_rows == 4
+
+
+class TestIdw:
+    def test_weights_by_inverse_distance(self):
+        dists = np.array([[100.0, 200.0, np.inf], [50.0, np.inf, np.inf]])
+        values = np.array([[1000.0, 2000.0, 5000.0], [3000.0, np.nan, np.nan]])
+        samples = np.full((2, 3), 15.0)
+        rents, confidence, counts = idw(dists, values, samples, power=1)
+        # weights 1/100 and 1/200 -> (1000 * 2 + 2000) / 3
+        np.testing.assert_allclose(rents, [4000 / 3, 3000])
+        np.testing.assert_allclose(confidence, [(15 + 7.5) / FULL_CONFIDENCE_SAMPLES, 15 / FULL_CONFIDENCE_SAMPLES])
+        assert counts.tolist() == [2, 1]
+
+    def test_no_usable_neighbors(self):
+        dists = np.array([[10.0, np.inf]])
+        values = np.array([[np.nan, 1000.0]])
+        rents, confidence, counts = idw(dists, values, np.ones((1, 2)), power=2)
+        assert np.isnan(rents[0])
+        assert confidence[0] == 0
+        assert counts[0] == 0
+
+    def test_index_interpolate(self):
+        index = RentIndex(
+            [rental(2, 1, -117.1500, 32.7500, samples=100), rental(2, 1, -117.1600, 32.7500, samples=100)],
+            get_utm_crs(),
+        )
+        halfway = index.project([-117.1550], [32.7500])
+        rents, confidence, counts = index.interpolate(
+            halfway, 2, 1, 1000, 80, lambda rd, pct: rd.details["mean"] * pct / 100, k=5, power=2
+        )
+        np.testing.assert_allclose(rents, [1600], rtol=1e-3)
+        assert confidence[0] == 1
+        assert counts[0] == 2
+
+    def test_index_interpolate_skips_invalid_rows(self):
+        bad = rental(2, 1, -117.1550, 32.7500)
+        del bad.details["mean"]
+        index = RentIndex([rental(2, 1, -117.1500, 32.7500), bad], get_utm_crs())
+        rents, _, counts = index.interpolate(
+            index.project([-117.1550], [32.7500]), 2, 1, 1000, 80, lambda rd, pct: rd.details["mean"], k=5, power=2
+        )
+        np.testing.assert_allclose(rents, [2000])
+        assert counts[0] == 1
+
+
+def test_primed_rents_are_bounded(monkeypatch):
+    monkeypatch.setattr(rent_lib, "MAX_PRIMED_RENTS", 2)
+    service = rent_lib.RentService()
+    service.prime({("a", 2, 1, 50, 800): (2000.0, 1.0), ("b", 2, 1, 50, 800): (2100.0, 1.0)})
+    service.prime({("c", 2, 1, 50, 800): (2200.0, 1.0), ("a", 2, 1, 50, 800): (2000.0, 1.0)})
+    assert list(service._interpolated) == [("c", 2, 1, 50, 800), ("a", 2, 1, 50, 800)]
@@ -0,0 +1,112 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from world.models.rental_data import RentalData
+
+from lib.parcel_analysis_2022.crs_lib import get_utm_crs
+from lib.parcel_analysis_2022.rent_index import RentIndex
+from lib.parcel_analysis_2022.rent_planner import RentRequest, fetch_rent_requests, plan_rent_requests
+
+# ~0.0054 degrees of longitude is 500m at this latitude
+LONG, LAT = -117.15, 32.75
+
+
+class StubRentometer(ThreadingHTTPServer):
+    """Local stand-in for the Rentometer summary API. Answers with `status` and records the requests."""
+
+    def __init__(self, status: int = 200):
+        super().__init__(("127.0.0.1", 0), StubRentometerHandler)
+        self.status = status
+        self.requests = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/api/v1/summary"
+
+
+class StubRentometerHandler(BaseHTTPRequestHandler):
+    def do_GET(self):  # noqa: N802
+        q = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        self.server.requests.append(q)
+        if self.server.status == 200:
+            body = {
+                "bedrooms": int(q["bedrooms"]),
+                "baths": "1 only" if q["baths"] == "1" else "1.5+ baths",
+                "mean": 2900,
+                "median": 2850,
+                "min": 1800,
+                "max": 4300,
+                "percentile_25": 2363,
+                "percentile_75": 3466,
+                "std_dev": 817,
+                "samples": 12,
+                "credits_remaining": 100 - len(self.server.requests),
+                "links": {},
+                "quickview_url": "",
+            }
+        else:
+            body = {"errors": ["Insufficient credits"]}
+        payload = json.dumps(body).encode()
+        self.send_response(self.server.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture()
+def rentometer(monkeypatch):
+    server = StubRentometer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("RENTOMETER_API_URL", server.url)
+    monkeypatch.setenv("RENTOMETER_API_KEY", "test-key")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def request(apn: str, long_offset: float = 0, br: int = 2, ba: int = 1, radius: float = 1000) -> RentRequest:
+    return RentRequest(apn, LONG + long_offset, LAT, br, ba, radius)
+
+
+class TestPlanRentRequests:
+    def test_dedupes_within_radius(self):
+        index = RentIndex([], get_utm_crs())
+        requests = [
+            request("a"),
+            request("a"),  # exact duplicate
+            request("b", long_offset=0.0054),  # ~500m from a
+            request("c", long_offset=0.0216),  # ~2km from a
+            request("d", long_offset=0.0054, br=3, ba=2),  # different unit type
+            request("e", long_offset=0.0054, radius=100),  # only interpolates from within 100m
+        ]
+        assert [r.apn for r in plan_rent_requests(requests, index)] == ["a", "c", "d", "e"]
+
+
+@pytest.mark.django_db
+class TestFetchRentRequests:
+    def test_fetches_within_budget(self, rentometer):
+        requests = [request("a"), request("b", br=3, ba=2), request("c", br=4, ba=2)]
+        stats = fetch_rent_requests(requests, budget=2, max_workers=2)
+        assert stats["fetched"] == 2
+        assert stats["over_budget"] == 1
+        assert len(rentometer.requests) == 2
+        assert {q["api_key"] for q in rentometer.requests} == {"test-key"}
+        saved = RentalData.objects.order_by("parcel_id")
+        assert [(rd.parcel_id, rd.br, rd.ba) for rd in saved] == [("a", 2, 1), ("b", 3, 2)]
+        assert "links" not in saved[0].details
+
+    def test_stops_when_out_of_credits(self, rentometer):
+        rentometer.status = 402
+        stats = fetch_rent_requests([request("a"), request("b"), request("c")], max_workers=1)
+        assert stats["error_402"] == 1
+        assert stats["skipped_out_of_credits"] == 2
+        assert len(rentometer.requests) == 1
+        assert RentalData.objects.get().details["status_code"] == 402
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from django.contrib.gis.geos import Point
+from world.models import DataVersion
+from world.models.rental_data import RentalData
+
+from lib.parcel_analysis_2022.crs_lib import get_utm_crs
+from lib.parcel_analysis_2022.rent_index import RentIndex
+from lib.parcel_analysis_2022.rent_surface import (
+    RentSurfaceGrid,
+    build_rent_surface,
+    clear_rent_surfaces,
+    get_rent_surface,
+)
+
+
+def rental(br: int, ba: int, long: float, lat: float) -> RentalData:
+    return RentalData(br=br, ba=ba, location=Point(long, lat, srid=4326), details={"mean": br * 1000, "samples": 100})
+
+
+def mean_rent(rd: RentalData, percentile: int) -> float:
+    return rd.details["mean"]
+
+
+class TestRentSurface:
+    def setup_method(self):
+        self.index = RentIndex([rental(2, 1, -117.1500, 32.7500), rental(2, 1, -117.1600, 32.7500)], get_utm_crs())
+        self.grid = build_rent_surface(self.index, 2, 1, 80, mean_rent, k=5, power=2, cell_size=100, max_distance=400)
+
+    def test_lookup_matches_interpolation_at_cell_center(self):
+        xy = self.index.project([-117.1500], [32.7500])
+        rents, confidence = self.grid.lookup(xy)
+        assert rents[0] == pytest.approx(2000)
+        assert confidence[0] == 1
+        # far outside the grid, or inside it but out of range of any data
+        rents, confidence = self.grid.lookup(self.index.project([-117.3, -117.1550], [32.75, 32.75]))
+        assert np.isnan(rents).all()
+        assert confidence.tolist() == [0, 0]
+
+    def test_build_no_data(self):
+        assert build_rent_surface(self.index, 3, 2, 80, mean_rent, k=5, power=2) is None
+
+    def test_model_round_trip(self):
+        surface = self.grid.to_model(get_utm_crs())
+        assert surface.num_cells_with_data == np.count_nonzero(~np.isnan(self.grid.rents))
+        decoded = RentSurfaceGrid.from_model(surface)
+        np.testing.assert_array_equal(decoded.rents, self.grid.rents)
+        np.testing.assert_allclose(decoded.confidence, self.grid.confidence, atol=1 / 255)
+        assert decoded.lookup_longlat(-117.1600, 32.7500)[0] == pytest.approx(2000)
+
+    def test_covers(self):
+        assert not self.grid.covers(400)
+        assert self.grid.covers(500)
+
+    @pytest.mark.django_db
+    def test_stale_surface_isnt_used(self):
+        clear_rent_surfaces()
+        surface = self.grid.to_model(get_utm_crs())
+        surface.save()
+        assert get_rent_surface(2, 1, 80) is not None
+        # Rental data changed by another process, noticed on the next check
+        DataVersion.bump(RentalData)
+        clear_rent_surfaces()
+        assert get_rent_surface(2, 1, 80) is None
+        # Rebuilt
+        surface.save()
+        clear_rent_surfaces()
+        assert get_rent_surface(2, 1, 80) is not None
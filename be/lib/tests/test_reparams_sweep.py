@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+from world.models.base_models import RentalUnit
+
+from lib.parcel_analysis_2022 import analyze_parcel_lib
+from lib.parcel_analysis_2022.re_params import ReParams
+from lib.parcel_analysis_2022.reparams_sweep import load_sweep_inputs, sweep_worker
+
+
+def analyzed_listing(al_id: int, apn: str, is_mf: bool = False):
+    parcel = SimpleNamespace(rental_units=[RentalUnit(br=2, ba=1, sqft=800)], unitqty=1)
+    listing = SimpleNamespace(addr=f"{al_id} Main St", price=900_000, parcel=parcel)
+    return SimpleNamespace(
+        id=al_id,
+        parcel_id=apn,
+        listing=listing,
+        is_mf=is_mf,
+        details={"avail_area_by_FAR": 100, "avail_geom_area": 200},
+    )
+
+
+class TestSweepRentMiss:
+    def test_rent_miss_is_flagged(self, monkeypatch):
+        # Only the first listing has a rent in the DB
+        def rent_for_location(listing, units, messages, *args, **kwargs):
+            return [2500] if listing.addr.startswith("1 ") else []
+
+        monkeypatch.setattr(analyze_parcel_lib.rent_data, "rent_for_location", rent_for_location)
+        monkeypatch.setattr(analyze_parcel_lib, "get_interpolate_distance", lambda listing, is_mf: 1000)
+        param_sets = [ReParams().dict()]
+        inputs, stats = load_sweep_inputs([analyzed_listing(1, "a"), analyzed_listing(2, "b")], param_sets)
+        assert stats["rent_missing"] == 1
+        assert [list(inp.existing_rents.values()) for inp in inputs] == [[2500], [None]]
+
+        columns = sweep_worker(inputs, param_sets, [])
+        assert columns["rent_missing"] == [False, True]
+        assert columns["max_cap_rate"] == [0, None]
+
+    def test_adu_rent_miss_is_flagged(self, monkeypatch):
+        # Both listings have existing-unit rents, but only the first has rents for the ADUs it could build
+        def rent_for_location(listing, units, messages, *args, is_adu=False, **kwargs):
+            if not is_adu:
+                return [2500]
+            return [2000] if listing.addr.startswith("1 ") else []
+
+        monkeypatch.setattr(analyze_parcel_lib.rent_data, "rent_for_location", rent_for_location)
+        monkeypatch.setattr(analyze_parcel_lib, "get_interpolate_distance", lambda listing, is_mf: 1000)
+        param_sets = [ReParams().dict()]
+        listings = [analyzed_listing(1, "a", is_mf=True), analyzed_listing(2, "b", is_mf=True)]
+        inputs, stats = load_sweep_inputs(listings, param_sets)
+        assert stats["adu_rent_missing"] == 1
+
+        columns = sweep_worker(inputs, param_sets, [])
+        assert columns["rent_missing"] == [False, False]
+        assert columns["adu_rent_missing"] == [False, True]
+        assert columns["num_scenarios"][1] > 0
+        assert columns["max_cap_rate"][0] is not None
+        assert columns["max_cap_rate"][1] is None
+        assert columns["best_net_income"][1] is None
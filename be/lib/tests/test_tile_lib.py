@@ -0,0 +1,50 @@
+from lib.tile_lib import Tile, grid_tiles, lonlat_to_xyz, partition_points, tile_index, xyz_bounds, xyz_tiles
+
+
+class TestTileLib:
+    def test_tile_index_is_half_open(self):
+        origin = (10.0, 20.0)
+        assert tile_index(10.0, 20.0, origin, 1.0) == (0, 0)
+        assert tile_index(10.999, 20.999, origin, 1.0) == (0, 0)
+        assert tile_index(11.0, 20.5, origin, 1.0) == (1, 0)
+        assert tile_index(9.5, 19.5, origin, 1.0) == (-1, -1)
+
+    def test_grid_tiles_cover_bbox(self):
+        tiles = grid_tiles((0, 0, 2.5, 1), 1.0)
+        assert [(t.ix, t.iy) for t in tiles] == [(0, 0), (1, 0), (2, 0)]
+        assert tiles[-1].bbox == (2.0, 0.0, 3.0, 1.0)
+        assert grid_tiles((0, 0, 0, 0), 1.0) == [Tile(0, 0, (0, 0, 1, 1))]
+
+    def test_partition_points(self):
+        points = [("a", 0.5, 1.5), ("b", 0.2, 0.2), ("c", 1.5, 0.5), ("d", 0.8, 0.9)]
+        tiles = partition_points(points, (0, 0), 1.0)
+        # row-major order, keys keep their input order within a tile
+        assert [(t.ix, t.iy, keys) for t, keys in tiles.items()] == [
+            (0, 0, ["b", "d"]),
+            (1, 0, ["c"]),
+            (0, 1, ["a"]),
+        ]
+        assert Tile(0, 1, (0, 1, 1, 2)).buffered(0.5) == (-0.5, 0.5, 1.5, 2.5)
+
+
+class TestXyzTiles:
+    def test_lonlat_to_xyz(self):
+        assert lonlat_to_xyz(0, 0, 0) == (0, 0)
+        assert lonlat_to_xyz(-117.16, 32.72, 12) == (714, 1653)
+        assert lonlat_to_xyz(180, -90, 2) == (3, 3)  # clamped to the grid
+
+    def test_xyz_bounds_contains_point(self):
+        minx, miny, maxx, maxy = xyz_bounds(12, 714, 1653)
+        assert minx <= -117.16 < maxx
+        assert miny <= 32.72 < maxy
+
+    def test_xyz_tiles(self):
+        bbox = xyz_bounds(12, 714, 1653)
+        inner = (bbox[0] + 1e-6, bbox[1] + 1e-6, bbox[2] - 1e-6, bbox[3] - 1e-6)
+        assert xyz_tiles(inner, 12, 13) == [
+            (12, 714, 1653),
+            (13, 1428, 3306),
+            (13, 1428, 3307),
+            (13, 1429, 3306),
+            (13, 1429, 3307),
+        ]
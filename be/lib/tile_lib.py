@@ -0,0 +1,91 @@
+"""
+Helpers for partitioning an area into a regular grid of rectangular tiles, so work over a large region can be split
+into spatially compact chunks (eg. one tile per worker process).
+
+Tiles are half-open: a point on the boundary between two tiles belongs to the tile above / to the right of it, so
+every point belongs to exactly one tile.
+"""
+import math
+from collections import defaultdict
+from collections.abc import Hashable, Iterable
+from dataclasses import dataclass
+
+BBox = tuple[float, float, float, float]  # (minx, miny, maxx, maxy)
+
+
+@dataclass(frozen=True)
+class Tile:
+    ix: int
+    iy: int
+    bbox: BBox
+
+    def buffered(self, margin: float) -> BBox:
+        minx, miny, maxx, maxy = self.bbox
+        return minx - margin, miny - margin, maxx + margin, maxy + margin
+
+
+def tile_index(x: float, y: float, origin: tuple[float, float], tile_size: float) -> tuple[int, int]:
+    """Grid position of the tile containing the point"""
+    return math.floor((x - origin[0]) / tile_size), math.floor((y - origin[1]) / tile_size)
+
+
+def tile_at(ix: int, iy: int, origin: tuple[float, float], tile_size: float) -> Tile:
+    minx, miny = origin[0] + ix * tile_size, origin[1] + iy * tile_size
+    return Tile(ix, iy, (minx, miny, minx + tile_size, miny + tile_size))
+
+
+def grid_tiles(bbox: BBox, tile_size: float) -> list[Tile]:
+    """All the tiles of a grid anchored at the bbox's lower-left corner that cover the bbox"""
+    minx, miny, maxx, maxy = bbox
+    nx = max(1, math.ceil((maxx - minx) / tile_size))
+    ny = max(1, math.ceil((maxy - miny) / tile_size))
+    return [tile_at(ix, iy, (minx, miny), tile_size) for iy in range(ny) for ix in range(nx)]
+
+
+def partition_points(
+    points: Iterable[tuple[Hashable, float, float]], origin: tuple[float, float], tile_size: float
+) -> dict[Tile, list]:
+    """Group (key, x, y) points by the tile they fall in. Only tiles with at least one point are returned, in
+    row-major order; keys within a tile keep their input order."""
+    grouped = defaultdict(list)
+    for key, x, y in points:
+        grouped[tile_index(x, y, origin, tile_size)].append(key)
+    return {
+        tile_at(ix, iy, origin, tile_size): keys
+        for (ix, iy), keys in sorted(grouped.items(), key=lambda item: (item[0][1], item[0][0]))
+    }
+
+
+# ------------------------------------------------------
+# Web map (slippy map / XYZ) tiles, in lon / lat
+# ------------------------------------------------------
+
+
+def lonlat_to_xyz(lon: float, lat: float, z: int) -> tuple[int, int]:
+    """Column and row of the zoom z web map tile containing the point. Rows count down from the north."""
+    n = 2**z
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = math.floor((lon + 180) / 360 * n)
+    y = math.floor((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def xyz_bounds(z: int, x: int, y: int) -> BBox:
+    """Lon / lat bounding box of a web map tile"""
+    n = 2**z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)
+
+
+def xyz_tiles(bbox: BBox, min_zoom: int, max_zoom: int) -> list[tuple[int, int, int]]:
+    """(z, x, y) of every web map tile intersecting a lon / lat bbox, for each zoom in [min_zoom, max_zoom]"""
+    minx, miny, maxx, maxy = bbox
+    tiles = []
+    for z in range(min_zoom, max_zoom + 1):
+        x0, y0 = lonlat_to_xyz(minx, maxy, z)
+        x1, y1 = lonlat_to_xyz(maxx, miny, z)
+        tiles.extend((z, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+    return tiles
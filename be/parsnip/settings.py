@@ -41,11 +41,13 @@ env = environ.Env(
     DJANGO_ENV=(str, "production"),
     SENTRY_DSN=(str, None),
     CLOUDFLARE_R2_ENABLED=(bool, True),
+    LOCAL_IMAGE_STORE_DIR=(str, None),  # write analysis images to this directory instead of R2
     AIRTABLE_API_KEY=(str, None),
     AIRTABLE_YIMBY_LAW_HE_API_KEY=(str, None),
     HCD_EMAIL_SUBS=(str, "nils+test@home3.co"),
     MAPBOX_API_KEY=(str, None),
     ATTOM_DATA_API_KEY=(str, None),
+    RENTOMETER_API_URL=(str, "https://www.rentometer.com/api/v1/summary"),  # point at a stub server for testing
 )
 
 DJANGO_ENV: str = env("DJANGO_ENV")
@@ -61,6 +63,7 @@ assert DJANGO_LOG_LEVEL in ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
 eprint("Django Log Level (to stderr)", DJANGO_LOG_LEVEL)
 TOPO_DB_ALIAS = "local_db" if DEV_ENV else "default"
 CLOUDFLARE_R2_ENABLED = env("CLOUDFLARE_R2_ENABLED") and not TEST_ENV
+LOCAL_IMAGE_STORE_DIR: str | None = env("LOCAL_IMAGE_STORE_DIR")
 
 LOCAL_DB: bool = DB == "LOCAL"
 
@@ -129,6 +132,7 @@ INSTALLED_APPS = keep_truthy(
     # "django.contrib.sites",   # seems to disable site switching for django-allauth?
     "django_extensions",
     "django.contrib.gis",
+    "django.contrib.postgres",  # for trigram lookups
     "silk" if ENABLE_SILK else None,
     "debug_toolbar" if ENABLE_DEBUG_TOOLBAR else None,
     ## For django-two-factor-auth package:
@@ -481,5 +485,22 @@ CACHES = {
         "LOCATION": "/parsnip_data/django-cache" if prod_cache else BASE_DIR / ".django-cache",
         "TIMEOUT": 3600 * 24 * 365,  # default timeout of 1 year
         "OPTIONS": {"MAX_ENTRIES": 10000, "CULL_FREQUENCY": 4},  # Cull 1/4th of entries when we hit max-entries
-    }
+    },
+    # Tile views (see world/infra/django_cache.py): millions of small entries
+    "tiles": {
+        "BACKEND": "world.infra.sqlite_cache.ShardedSQLiteCache",
+        "LOCATION": "/parsnip_data/tile-cache" if prod_cache else BASE_DIR / ".tile-cache",
+        "TIMEOUT": 3600 * 24 * 365,
+        "OPTIONS": {"SHARDS": 16, "MAX_ENTRIES": 5_000_000, "MAX_SIZE": 20 * 2**30},  # evict LRU past 20GB
+    },
+    # Memoized eligibility check results (see lib/co/co_eligibility_lib.py): one small entry per check per parcel
+    "eligibility": {
+        "BACKEND": "world.infra.sqlite_cache.ShardedSQLiteCache",
+        "LOCATION": "/parsnip_data/eligibility-cache" if prod_cache else BASE_DIR / ".eligibility-cache",
+        "TIMEOUT": 3600 * 24 * 365,
+        "OPTIONS": {"SHARDS": 4, "MAX_ENTRIES": 2_000_000},
+    },
 }
+
+# Pre-rendered tiles for static map layers, see world/infra/mbtiles.py
+MBTILES_DIR = "/parsnip_data/mbtiles" if prod_cache else BASE_DIR / ".mbtiles"
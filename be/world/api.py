@@ -1,15 +1,14 @@
-import tempfile
 import time
 import traceback
 
 from django.contrib.admin.views.decorators import staff_member_required
-from django.contrib.gis.db.models.functions import Centroid
-from django.db.models import F
-from lib.co.co_eligibility_lib import AB2011Eligible
+from django.db.models import F, JSONField, Value
+from django.db.models.functions import Cast, NullIf
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from lib.co.co_eligibility_lib import ab2011_result
 from lib.mapbox import get_temporary_mapbox_token
-from lib.parcel_analysis_2022.analyze_parcel_lib import analyze_one_parcel
-from lib.parcel_analysis_2022.crs_lib import get_utm_crs
-from lib.parcel_analysis_2022.listings_lib import address_to_parcel
+from lib.parcel_analysis_2022.listings_lib import address_to_parcel, address_to_parcels_loose
 from ninja import NinjaAPI, Query
 from ninja.errors import ValidationError
 from ninja.pagination import paginate
@@ -17,15 +16,18 @@ from ninja.security import django_auth
 from parsnip.util import field_exists_on_model
 
 from world.api_gis_schema import (
+    AddressCandidateSchema,
+    AnalysisJobSchema,
     AnalysisResponseSchema,
     ListingHistorySchema,
     ListingSchema,
     ListingsFilters,
     ParcelSchema,
-    RentalRatesSchema,
     RoadSchema,
 )
-from world.models import AnalyzedListing, Parcel, PropertyListing, RentalData, Roads
+from world.infra.keyset_pagination import KeysetPagination, keyset_order
+from world.infra.rental_rates_cache import get_rental_rates_payload
+from world.models import AnalysisJob, AnalyzedListing, Parcel, PropertyListing, Roads
 
 # Require auth on all API routes (can be overriden if needed)
 world_api = NinjaAPI(auth=django_auth, csrf=True, urls_namespace="world_api", docs_decorator=staff_member_required)
@@ -66,35 +68,40 @@ def _get_mapbox_token(request):
 
 
 @world_api.get("/world/rentalrates")  # response=List[RentalRatesSchema])
-def _get_rental_rates(request) -> list[RentalRatesSchema]:
-    rental_data = RentalData.objects.exclude(details__has_key="status_code").order_by("parcel", "-details__mean")
-    pid: str = ""
-    retlist = []
-    for rd in rental_data:
-        if rd.parcel_id != pid:
-            retlist.append(
-                {
-                    "pid": rd.parcel_id,
-                    "lat": round(rd.location.y, 7),
-                    "long": round(rd.location.x, 7),
-                    "rents": {},
-                }
-            )
-        assert retlist[-1]["pid"] == rd.parcel_id
-        retlist[-1]["rents"][f"{rd.br}BR,{rd.ba}BA"] = {
-            "rent_mean": rd.details["mean"],
-            "rent_75_percentile": rd.details["percentile_75"],
-            "num_samples": rd.details["samples"],
-        }
-        pid = rd.parcel_id
-
-    # print(f"Returning {len(retlist)} items")
-    # pprint.pprint(retlist)
-    return retlist
+def _get_rental_rates(request) -> HttpResponse:
+    # The payload is prebuilt (and compressed) until RentalData changes, so this is constant-time.
+    payload = get_rental_rates_payload()
+    if payload.etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
+    elif "gzip" in request.headers.get("Accept-Encoding", ""):
+        response = HttpResponse(payload.gzip_body, content_type="application/json")
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(payload.json_body, content_type="application/json")
+    response["ETag"] = payload.etag
+    response["Vary"] = "Accept-Encoding"
+    # Let the browser keep it, but always check the ETag with us
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+# Fields ListingSchema reads, for get_listings() to load
+LISTING_FIELDS = (
+    *ListingSchema.__fields__.keys() - {"analysis", "centroid_x", "centroid_y", "metadata"},
+    "parcel",
+    "analyzedlisting__id",
+    "analyzedlisting__details",
+    "analyzedlisting__is_tpa",
+    "analyzedlisting__is_mf",
+    "analyzedlisting__parcel",
+    "analyzedlisting__zone",
+    "prev_listing__price",
+    "parcel__centroid",
+)
 
 
 @world_api.get("/world/listings", response=list[ListingSchema])
-@paginate
+@paginate(KeysetPagination)
 def get_listings(request, order_by: str = "founddate", asc: bool = False, filters: ListingsFilters = Query(...)):
     # Strip away the filter params that are none
     # Filters are already validated by the ListingsFilters Schema above
@@ -117,31 +124,34 @@ def get_listings(request, order_by: str = "founddate", asc: bool = False, filter
             filter_params[filters_xlat.get(key, key)] = filters.dict()[key]
 
     # Construct ordering query: if the field doesn't exist on the PropertyListing model, it probably exists
-    # either on AnalyzedListing model or AnalyzedListing's detail field, so let's prefix it
-    if not field_exists_on_model(PropertyListing, order_by):
-        if field_exists_on_model(AnalyzedListing, order_by):
-            # field is on AnalyzedListing.
-            order_by = "analyzedlisting__" + order_by
-        else:
-            order_by = "analyzedlisting__details__" + order_by
-
-    if not asc:
-        order_by = "-" + order_by
+    # either on AnalyzedListing model or AnalyzedListing's detail field, so let's prefix it. The commonly sorted
+    # details are also indexed columns on AnalyzedListing.
+    if order_by in AnalyzedListing.DETAILS_COLUMNS:
+        sort_expression = F("analyzedlisting__" + AnalyzedListing.DETAILS_COLUMNS[order_by])
+    elif field_exists_on_model(PropertyListing, order_by):
+        sort_expression = F(order_by)
+    elif field_exists_on_model(AnalyzedListing, order_by):
+        # field is on AnalyzedListing.
+        sort_expression = F("analyzedlisting__" + order_by)
+    else:
+        # JSON nulls sort before everything else, SQL nulls after. Make them the same so the cursor can skip them.
+        sort_expression = NullIf(F("analyzedlisting__details__" + order_by), Cast(Value("null"), JSONField()))
 
     listings = (
         PropertyListing.active_listings_queryset()
         .filter(analyzedlisting__isnull=False, **filter_params)
-        .prefetch_related("analyzedlisting", "prev_listing", "parcel")
-        .annotate(centroid=Centroid(F("parcel__geom")))
-        .order_by(order_by)
+        .select_related("analyzedlisting", "prev_listing", "parcel")
+        # Only what ListingSchema needs: not the parcel's geometry or the analysis' other JSON blobs
+        .only(*LISTING_FIELDS)
     )
+    return keyset_order(listings, sort_expression, descending=not asc)
 
-    return listings
 
-
-@world_api.post("/world/analysis/")
+@world_api.post("/world/analysis/", response=AnalysisJobSchema)
 def redo_analysis(request, apn: str = None, al_id: int = None):
-    """Trigger a re-run of parcel analysis, used by /new-listing frontend"""
+    """Queue a re-run of parcel analysis, used by /new-listing frontend. The analysis itself is run by the
+    analysis_worker command; poll /world/analysis-job/{job_id} for its status and resulting analysis id.
+    A request for a parcel that already has a pending or running job returns that job."""
 
     if al_id:
         analyzed_listing = AnalyzedListing.objects.prefetch_related("listing").get(id=al_id)
@@ -150,38 +160,33 @@ def redo_analysis(request, apn: str = None, al_id: int = None):
         parcel = Parcel.objects.get(apn=apn)
         property_listing = PropertyListing.get_latest_or_create(parcel)
 
-    sd_utm_crs = get_utm_crs()  # San Diego specific
+    return AnalysisJob.enqueue(property_listing)
 
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        # Generally should match this call to analyze_batch() call in scrape.py
-        analyzed_listing = analyze_one_parcel(
-            property_listing.parcel,
-            sd_utm_crs,
-            property_listing,
-            save_dir=tmpdirname,
-            dry_run=False,
-            show_plot=False,
-            force_uploads=True,
-        )
 
-    return {"analysisId": analyzed_listing.id}
+@world_api.get("/world/analysis-job/{job_id}", response=AnalysisJobSchema)
+def get_analysis_job(request, job_id: int):
+    """Get the status of a queued analysis job"""
+    return AnalysisJob.objects.get(id=job_id)
 
 
 @world_api.get("/world/analysis/{al_id}", response=AnalysisResponseSchema)
-def get_analysis(request, al_id: int):
-    """Get analysis results for a given analysis id"""
-    # al_json = AnalysisResponseSchema.from_orm(analyzed_listing).dict()
-    return AnalyzedListing.objects.prefetch_related("listing").get(id=al_id)
+def get_analysis(request, al_id: int, geometry: bool = False):
+    """Get analysis results for a given analysis id. With geometry=true, also return the parcel, buildings, setbacks,
+    new buildings and lot split as quantized coordinates in the parcel's local frame, for drawing on the frontend."""
+    analyzed_listing = AnalyzedListing.objects.prefetch_related("listing").get(id=al_id)
+    retval = AnalysisResponseSchema.from_orm(analyzed_listing)
+    if geometry:
+        # analyses from before we stored geometry have an empty dict
+        retval.geometry = analyzed_listing.geometry_details or None
+    return retval
 
 
 @world_api.get("/world/parcel/{apn}", response=ParcelSchema)
 def get_parcel(request, apn: str):
     """Get parcel info for a given APN"""
     parcel = Parcel.objects.get(apn=apn)
-    x = AB2011Eligible()
-    x.run(parcel)
     retval = ParcelSchema.from_orm(parcel)
-    retval.ab2011_result = x.check
+    retval.ab2011_result = ab2011_result(parcel)
     return retval
 
 
@@ -198,8 +203,6 @@ def address_search(request, addr: str):
     # Temporary. Let's clean this up later
     try:
         parcel, error = address_to_parcel(addr, jurisdiction="SD")
-        # TODO: Finish this better address matcher
-        # parcel, error = address_to_parcels_loose(addr)
     except Exception as e:
         traceback.print_exc()
         return {"error": str(e)}
@@ -215,3 +218,9 @@ def address_search(request, addr: str):
 
     analysis_id = analyzed_listing.id if analyzed_listing else None
     return {"apn": parcel.apn, "address": parcel.address, "analyzed_listing": analysis_id}
+
+
+@world_api.get("/world/address-typeahead", response=list[AddressCandidateSchema])
+def address_typeahead(request, q: str, limit: int = 10):
+    """Parcels whose address loosely matches a partial address, best match first"""
+    return address_to_parcels_loose(q, limit=min(limit, 50))
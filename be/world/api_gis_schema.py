@@ -1,7 +1,7 @@
 import datetime
 from typing import Any
 
-from lib.co.co_eligibility_lib import EligibilityCheck
+from lib.parcel_analysis_2022.types import CheckResultEnum
 from ninja import ModelSchema, Schema
 from pydantic import Field
 
@@ -80,17 +80,17 @@ class ListingSchema(ModelSchema):
         analysis_dict["analysis_id"] = analysis.id
         analysis_dict["is_tpa"] = analysis.is_tpa
         analysis_dict["is_mf"] = analysis.is_mf
-        analysis_dict["apn"] = analysis.parcel.apn
+        analysis_dict["apn"] = analysis.parcel_id  # parcel is keyed by apn
         analysis_dict["zone"] = analysis.zone
         return analysis_dict
 
     @staticmethod
     def resolve_centroid_x(obj):
-        return obj.centroid[0]
+        return obj.parcel.centroid.x
 
     @staticmethod
     def resolve_centroid_y(obj):
-        return obj.centroid[1]
+        return obj.parcel.centroid.y
 
     @staticmethod
     def resolve_metadata(obj):
@@ -148,14 +148,52 @@ class AnalysisResponseSchema(Schema):
     listing: PropertyListingSchema
     apn: str = Field(None, alias="parcel.apn")
     centroid: tuple = Field(None, alias="parcel.geom.centroid.coords")
+    # Vector version of the analysis figures (see ParcelFigures.geometry_payload). Only sent when requested.
+    geometry: dict[str, Any] | None = None
+
+
+class AnalysisJobSchema(Schema):
+    job_id: int = Field(..., alias="pk")
+    apn: str = Field(..., alias="parcel_id")
+    status: str
+    queue_position: int | None  # number of pending jobs ahead of this one
+    analysis_id: int | None = Field(None, alias="analyzed_listing_id")
+    error: str | None
+    created: datetime.datetime
+    started: datetime.datetime | None
+    finished: datetime.datetime | None
+
+    @staticmethod
+    def resolve_queue_position(obj):
+        return obj.queue_position()
+
+
+class EligibilityCheckSchema(Schema):
+    """An EligibilityCheck and its children, as run or as stored in AnalyzedParcel"""
+
+    name: str
+    description: str
+    result: CheckResultEnum
+    notes: list[str] = []
+    children: list["EligibilityCheckSchema"] = []
+
+
+EligibilityCheckSchema.update_forward_refs()
 
 
 class ParcelSchema(ModelSchema):
-    ab2011_result: EligibilityCheck | None = None
+    ab2011_result: EligibilityCheckSchema | None = None
 
     class Config:
         model = Parcel
-        model_exclude = ("geom",)
+        # ninja has no type for geometry fields
+        model_exclude = ("geom", "geom_z12", "geom_z14", "centroid")
+
+
+class AddressCandidateSchema(Schema):
+    apn: str
+    address: str
+    similarity: float
 
 
 class RoadSchema(ModelSchema):
@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import pre_migrate
+
+
+def create_extensions(sender, using, **kwargs):
+    """Install the Postgres extensions our models' indexes need. The migrations do this too, but tests create tables
+    straight from the models (--nomigrations), so it has to happen before migrate creates any table."""
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
 
 
 class WorldConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "world"
+
+    def ready(self):
+        pre_migrate.connect(create_extensions, sender=self)
@@ -1,24 +1,59 @@
+import logging
+
+from django.core.cache import caches
 from django.middleware.cache import CacheMiddleware
+from django.utils.cache import patch_response_headers
 from django.utils.decorators import decorator_from_middleware_with_args
 
+log = logging.getLogger(__name__)
+
+# Cache for tile views, see settings.CACHES
+TILE_CACHE_ALIAS = "tiles"
+KEY_PREFIX = "h3"
 
-## Create our own thin layer around Django caching middleware so we can cache empty responses.
+
+## Create our own thin layer around Django caching middleware, for tile views.
+## * We cache empty (204) responses too.
+## * Entries are keyed by URL alone, not by Vary headers. Tiles are the same for every user, so this avoids a copy
+##   per session, and lets us invalidate by URL prefix (see invalidate_cached_pages). Since entries are shared, we
+##   only serve them to logged-in users.
 class H3CacheMiddleware(CacheMiddleware):
+    def cache_key(self, request) -> str:
+        return ":".join(part for part in (KEY_PREFIX, self.key_prefix, request.get_full_path()) if part)
+
+    def process_request(self, request):
+        if request.method not in ("GET", "HEAD") or not request.user.is_authenticated:
+            request._cache_update_cache = False
+            return None
+        response = self.cache.get(self.cache_key(request))
+        request._cache_update_cache = response is None
+        return response
+
     def process_response(self, request, response):
-        if response.status_code == 204:
-            # Fudge the response so that it's cacheable.
-            response.status_code = 200
-            resp = super().process_response(request, response)
-            resp.status_code = 204
-            return resp
-        else:
-            return super().process_response(request, response)
+        if not getattr(request, "_cache_update_cache", False):
+            return response
+        if response.streaming or response.status_code not in (200, 204) or response.cookies:
+            return response
+        patch_response_headers(response, self.page_timeout)
+        self.cache.set(self.cache_key(request), response, self.page_timeout)
+        return response
 
 
 # cache_page decorator, adapted from django.views.decorator.cache
-def h3_cache_page(seconds, *, cache=None, key_prefix=None):
+def h3_cache_page(seconds, *, cache=TILE_CACHE_ALIAS, key_prefix=None):
     return decorator_from_middleware_with_args(H3CacheMiddleware)(
         page_timeout=seconds,
         cache_alias=cache,
         key_prefix=key_prefix,
     )
+
+
+def invalidate_cached_pages(path_prefix: str, cache=TILE_CACHE_ALIAS) -> int | None:
+    """Drop cached responses for URLs starting with path_prefix (eg. "/dj/api/worldview/zoningtile/14/"). Returns
+    the number dropped, or None if the cache backend can't delete by prefix, in which case it's cleared."""
+    backend = caches[cache]
+    if hasattr(backend, "delete_prefix"):
+        return backend.delete_prefix(f"{KEY_PREFIX}:{path_prefix}")
+    log.warning(f"Cache {cache} can't delete by prefix. Clearing it")
+    backend.clear()
+    return None
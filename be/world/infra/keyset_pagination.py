@@ -0,0 +1,92 @@
+"""
+Keyset (cursor) pagination for django-ninja list endpoints, so a deep page costs the same as the first one.
+
+Offset pagination makes the DB produce and throw away every row before the page. Instead, each page returns a
+next_cursor holding the sort key and id of its last row, and the next request asks for the rows after it:
+
+    @paginate(KeysetPagination)
+    def get_things(request, ...):
+        return keyset_order(Thing.objects.filter(...), F("price"), descending=True)
+
+The queryset must be ordered with keyset_order(): by the sort key, nulls last, then by id in the same direction, so
+every row has a unique position. Requests without a cursor fall back to limit / offset.
+"""
+import base64
+import binascii
+import datetime
+import json
+from typing import Any
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q, QuerySet
+from ninja import Field, Schema
+from ninja.conf import settings
+from ninja.errors import HttpError
+from ninja.pagination import PaginationBase
+
+SORT_KEY = "keyset_sort_key"
+
+
+def keyset_order(queryset: QuerySet, sort_expression, descending: bool) -> QuerySet:
+    """Annotate the sort key and order the queryset for KeysetPagination"""
+    if descending:
+        ordering = (F(SORT_KEY).desc(nulls_last=True), F("id").desc())
+    else:
+        ordering = (F(SORT_KEY).asc(nulls_last=True), F("id").asc())
+    return queryset.annotate(**{SORT_KEY: sort_expression}).order_by(*ordering)
+
+
+def encode_cursor(sort_value, row_id: int) -> str:
+    # DjangoJSONEncoder rounds datetimes to milliseconds, which would repeat or skip rows whose sort keys differ by
+    # less than that, so keep them at full precision
+    if isinstance(sort_value, datetime.datetime):
+        sort_value = {"datetime": sort_value.isoformat()}
+    return base64.urlsafe_b64encode(json.dumps([sort_value, row_id], cls=DjangoJSONEncoder).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[Any, int]:
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if isinstance(sort_value, dict):
+            sort_value = datetime.datetime.fromisoformat(sort_value["datetime"])
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError) as e:
+        raise HttpError(400, "Invalid cursor") from e
+    if not isinstance(row_id, int):
+        raise HttpError(400, "Invalid cursor")
+    return sort_value, row_id
+
+
+def after_cursor(sort_value, row_id: int, descending: bool) -> Q:
+    """Rows after (sort_value, row_id) in keyset_order(), where null sort keys come last in either direction"""
+    after = "lt" if descending else "gt"
+    if sort_value is None:
+        return Q(**{f"{SORT_KEY}__isnull": True, f"id__{after}": row_id})
+    return (
+        Q(**{f"{SORT_KEY}__{after}": sort_value})
+        | Q(**{SORT_KEY: sort_value, f"id__{after}": row_id})
+        | Q(**{f"{SORT_KEY}__isnull": True})
+    )
+
+
+class KeysetPagination(PaginationBase):
+    class Input(Schema):
+        limit: int = Field(settings.PAGINATION_PER_PAGE, ge=1)
+        offset: int = Field(0, ge=0)
+        cursor: str = Field(None, description="next_cursor from the previous page. Overrides offset.")
+
+    class Output(Schema):
+        items: list[Any]
+        count: int
+        next_cursor: str | None
+
+    def paginate_queryset(self, queryset: QuerySet, pagination: Input, **params) -> dict:
+        if pagination.cursor:
+            sort_value, row_id = decode_cursor(pagination.cursor)
+            descending = queryset.query.order_by[-1].descending
+            items = list(queryset.filter(after_cursor(sort_value, row_id, descending))[: pagination.limit])
+        else:
+            items = list(queryset[pagination.offset : pagination.offset + pagination.limit])
+        next_cursor = None
+        if len(items) == pagination.limit:
+            next_cursor = encode_cursor(getattr(items[-1], SORT_KEY), items[-1].id)
+        return {"items": items, "count": queryset.count(), "next_cursor": next_cursor}
@@ -0,0 +1,149 @@
+"""
+MBTiles (https://github.com/mapbox/mbtiles-spec) files of pre-rendered vector tiles, for map layers whose data rarely
+changes. `./manage.py tiles seed` renders a layer's tiles into <MBTILES_DIR>/<layer>.mbtiles, and the layer's tile
+view (see MBTilesMixin in world/views.py) serves tiles in the seeded zooms and bounds from the file without touching
+the DB.
+
+Tiles are stored gzipped, as the spec expects for pbf tiles. Empty tiles aren't stored: a missing tile in a seeded
+zoom means the tile is empty. Seeding writes a new file next to the old one and renames it into place, so readers
+never see a half-written file.
+"""
+import gzip
+import logging
+import os
+import sqlite3
+import threading
+from collections.abc import Iterable
+from pathlib import Path
+
+from django.conf import settings
+from lib.tile_lib import lonlat_to_xyz
+
+log = logging.getLogger(__name__)
+
+
+class MBTiles:
+    def __init__(self, path: Path, readonly: bool = True):
+        self.path = Path(path)
+        if readonly:
+            self.conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self.conn = sqlite3.connect(self.path)
+            self.conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS tiles (
+                    zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB,
+                    PRIMARY KEY (zoom_level, tile_column, tile_row)
+                );
+                """
+            )
+        self.metadata = dict(self.conn.execute("SELECT name, value FROM metadata"))
+
+    @property
+    def zoom_range(self) -> tuple[int, int] | None:
+        if "minzoom" not in self.metadata:
+            return None
+        return int(self.metadata["minzoom"]), int(self.metadata["maxzoom"])
+
+    def covers(self, z: int, x: int, y: int) -> bool:
+        """Whether the tile was in the seeded zoom range and bounds. Tiles outside them weren't rendered, so the file
+        can't say whether they're empty."""
+        zooms = self.zoom_range
+        if zooms is None or not zooms[0] <= z <= zooms[1]:
+            return False
+        if "bounds" not in self.metadata:
+            return True
+        minx, miny, maxx, maxy = (float(v) for v in self.metadata["bounds"].split(","))
+        x0, y0 = lonlat_to_xyz(minx, maxy, z)
+        x1, y1 = lonlat_to_xyz(maxx, miny, z)
+        return x0 <= x <= x1 and y0 <= y <= y1
+
+    def get_tile(self, z: int, x: int, y: int) -> bytes:
+        """Uncompressed tile, or b"" if the tile is empty"""
+        # MBTiles rows count up from the south (TMS), web map tiles count down from the north
+        row = self.conn.execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (z, x, (1 << z) - 1 - y),
+        ).fetchone()
+        return gzip.decompress(row[0]) if row else b""
+
+    def put_tiles(self, tiles: Iterable[tuple[int, int, int, bytes]]) -> int:
+        """Store (z, x, y, uncompressed tile) tuples. Empty tiles are deleted rather than stored. Returns the number
+        of non-empty tiles stored."""
+        rows, empty = [], []
+        for z, x, y, data in tiles:
+            if data:
+                rows.append((z, x, (1 << z) - 1 - y, gzip.compress(data, mtime=0)))
+            else:
+                empty.append((z, x, (1 << z) - 1 - y))
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)", rows)
+            self.conn.executemany(
+                "DELETE FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?", empty
+            )
+        return len(rows)
+
+    def set_metadata(self, **values):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO metadata VALUES (?, ?)", [(k, str(v)) for k, v in values.items()]
+            )
+        self.metadata.update({k: str(v) for k, v in values.items()})
+
+    def close(self):
+        self.conn.close()
+
+
+def mbtiles_path(layer: str) -> Path:
+    return Path(settings.MBTILES_DIR) / f"{layer}.mbtiles"
+
+
+class _MBTilesReaders:
+    """Open read-only MBTiles per layer, reopened when the file is replaced by a new seed"""
+
+    def __init__(self):
+        self.readers: dict[str, tuple[tuple, MBTiles]] = {}
+        self.lock = threading.Lock()
+
+    def get(self, layer: str) -> MBTiles | None:
+        path = mbtiles_path(layer)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        version = (stat.st_ino, stat.st_mtime_ns)
+        with self.lock:
+            cached = self.readers.get(layer)
+            if cached and cached[0] == version:
+                return cached[1]
+            # The old reader may still be in use by another thread; it's closed when it's garbage collected
+            reader = MBTiles(path)
+            self.readers[layer] = (version, reader)
+            return reader
+
+
+_readers = _MBTilesReaders()
+
+
+def get_mbtiles(layer: str) -> MBTiles | None:
+    """The seeded MBTiles for a layer, or None if it hasn't been seeded"""
+    return _readers.get(layer)
+
+
+def write_mbtiles(layer: str, tiles: Iterable[list[tuple[int, int, int, bytes]]], **metadata) -> int:
+    """Write batches of (z, x, y, tile) to a new MBTiles file for the layer, then swap it in for the current one.
+    Returns the number of non-empty tiles written."""
+    path = mbtiles_path(layer)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".mbtiles.tmp")
+    tmp_path.unlink(missing_ok=True)
+    mbtiles = MBTiles(tmp_path, readonly=False)
+    try:
+        count = sum(mbtiles.put_tiles(batch) for batch in tiles)
+        mbtiles.set_metadata(name=layer, format="pbf", **metadata)
+    finally:
+        mbtiles.close()
+    os.replace(tmp_path, path)
+    log.info(f"Wrote {count} tiles to {path}")
+    return count
@@ -0,0 +1,81 @@
+import gzip
+import hashlib
+import json
+from dataclasses import dataclass
+
+from django.core.cache import cache
+from django.db.models.fields.json import KT
+
+from world.models import DataVersion, RentalData
+
+CACHE_KEY_PREFIX = "rentalrates-v1"
+
+
+@dataclass(frozen=True)
+class RentalRatesPayload:
+    """The /world/rentalrates response, serialized once and reused until RentalData changes"""
+
+    etag: str
+    json_body: bytes
+    gzip_body: bytes
+
+
+def rental_data_fingerprint() -> str:
+    """Changes whenever RentalData rows are added, deleted, re-fetched or edited: saves and deletes bump RentalData's
+    DataVersion (see world/models/rental_data.py). One primary key lookup, so serving a built payload doesn't scan
+    RentalData."""
+    version = DataVersion.latest(RentalData)
+    return str(version.timestamp() if version else 0)
+
+
+def build_rental_rates() -> list[dict]:
+    """Rent data points grouped by parcel, for the rent map. Only the fields we need are extracted from `details`,
+    in the DB."""
+    rows = (
+        RentalData.objects.exclude(details__has_key="status_code")
+        .order_by("parcel", "-details__mean")
+        .values_list(
+            "parcel_id",
+            "location",
+            "br",
+            "ba",
+            KT("details__mean"),
+            KT("details__percentile_75"),
+            KT("details__samples"),
+        )
+    )
+    retlist = []
+    for pid, location, br, ba, mean, percentile_75, samples in rows:
+        if not retlist or retlist[-1]["pid"] != pid:
+            retlist.append({"pid": pid, "lat": round(location.y, 7), "long": round(location.x, 7), "rents": {}})
+        retlist[-1]["rents"][f"{br}BR,{ba}BA"] = {
+            # KT() extracts JSON values as text
+            "rent_mean": json.loads(mean),
+            "rent_75_percentile": json.loads(percentile_75),
+            "num_samples": json.loads(samples),
+        }
+    return retlist
+
+
+# fingerprint -> payload, for the latest payload this process has served
+_memo: dict[str, RentalRatesPayload] = {}
+
+
+def get_rental_rates_payload() -> RentalRatesPayload:
+    """The current payload, from this process's memory, the Django cache, or rebuilt if RentalData has changed."""
+    fingerprint = rental_data_fingerprint()
+    if fingerprint in _memo:
+        return _memo[fingerprint]
+    key = f"{CACHE_KEY_PREFIX}-{fingerprint}"
+    payload = cache.get(key)
+    if payload is None:
+        json_body = json.dumps(build_rental_rates(), separators=(",", ":")).encode()
+        payload = RentalRatesPayload(
+            etag=f'"{hashlib.sha256(json_body).hexdigest()[:32]}"',
+            json_body=json_body,
+            gzip_body=gzip.compress(json_body, mtime=0),
+        )
+        cache.set(key, payload, timeout=60 * 60 * 24 * 30)
+    _memo.clear()
+    _memo[fingerprint] = payload
+    return payload
@@ -0,0 +1,242 @@
+"""
+Django cache backend for large numbers of small entries, like map tiles.
+
+FileBasedCache writes a file per key and culls by listing the whole cache directory, which gets slow with millions of
+tiles. This backend spreads keys over SHARDS SQLite files by hash, so a get or set is one indexed lookup in one
+small-ish database, and keeps running totals of each shard's entries and bytes so eviction doesn't need a scan.
+
+* Eviction: when a shard goes over its share of MAX_ENTRIES or MAX_SIZE (bytes), expired entries are dropped, then
+  the least recently used ones, down to EVICT_TO of the limit. Access times are only updated once per
+  ACCESS_RESOLUTION seconds per entry, so reads don't turn into writes.
+* delete_prefix(prefix) drops every key starting with prefix, as a range delete on each shard.
+* stats() reports hits, misses, sets and evictions for this process, plus the entries and bytes stored.
+
+Configure with eg.:
+    "BACKEND": "world.infra.sqlite_cache.ShardedSQLiteCache",
+    "LOCATION": "/path/to/cache/dir",
+    "OPTIONS": {"SHARDS": 16, "MAX_ENTRIES": 5_000_000, "MAX_SIZE": 20 * 2**30},
+"""
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+log = logging.getLogger(__name__)
+
+ACCESS_RESOLUTION = 3600  # seconds
+EVICT_TO = 0.9  # fraction of the limit to evict down to
+BUSY_TIMEOUT_MS = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL, accessed REAL NOT NULL, size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires) WHERE expires IS NOT NULL;
+CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), entries INTEGER, size INTEGER);
+INSERT OR IGNORE INTO totals VALUES (0, 0, 0);
+"""
+
+
+class ShardedSQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._dir = Path(location)
+        self._num_shards = int(options.get("SHARDS", 8))
+        self._max_size = options.get("MAX_SIZE")
+        self._local = threading.local()
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    # ---- connections ----
+
+    def _connection(self, shard: int) -> sqlite3.Connection:
+        # One connection per shard per thread, and new ones after a fork
+        conns = getattr(self._local, "conns", None)
+        if conns is None or self._local.pid != os.getpid():
+            conns = self._local.conns = {}
+            self._local.pid = os.getpid()
+        if shard not in conns:
+            self._dir.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self._dir / f"shard-{shard:03d}.sqlite3", isolation_level=None)
+            conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.executescript(_SCHEMA)
+            conns[shard] = conn
+        return conns[shard]
+
+    def _shard(self, key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode(), usedforsecurity=False).digest()[:4], "big") % self._num_shards
+
+    @contextmanager
+    def _write(self, shard: int):
+        conn = self._connection(shard)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _count(self, stat: str, n: int = 1):
+        with self._stats_lock:
+            self._stats[stat] += n
+
+    # ---- Django cache API ----
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        shard = self._shard(key)
+        row = (
+            self._connection(shard)
+            .execute("SELECT value, expires, accessed FROM cache WHERE key = ?", (key,))
+            .fetchone()
+        )
+        now = time.time()
+        if row is None or (row[1] is not None and row[1] <= now):
+            self._count("misses")
+            return default
+        self._count("hits")
+        if now - row[2] > ACCESS_RESOLUTION:
+            with self._write(shard) as conn:
+                conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+        return pickle.loads(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._set(key, value, timeout, only_if_missing=False)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._set(key, value, timeout, only_if_missing=True)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._write(self._shard(key)) as conn:
+            cursor = conn.execute(
+                "UPDATE cache SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (self.get_backend_timeout(timeout), key, time.time()),
+            )
+            return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._write(self._shard(key)) as conn:
+            return self._delete_rows(conn, "key = ?", (key,)) > 0
+
+    def delete_many(self, keys, version=None) -> int:
+        """Delete keys with one transaction per shard. Returns the number deleted."""
+        by_shard = defaultdict(list)
+        for key in keys:
+            full_key = self.make_and_validate_key(key, version=version)
+            by_shard[self._shard(full_key)].append(full_key)
+        deleted = 0
+        for shard, shard_keys in by_shard.items():
+            with self._write(shard) as conn:
+                for i in range(0, len(shard_keys), 500):
+                    chunk = shard_keys[i : i + 500]
+                    deleted += self._delete_rows(conn, f"key IN ({','.join('?' * len(chunk))})", tuple(chunk))
+        return deleted
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = (
+            self._connection(self._shard(key))
+            .execute("SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time()))
+            .fetchone()
+        )
+        return row is not None
+
+    def clear(self):
+        for shard in range(self._num_shards):
+            with self._write(shard) as conn:
+                conn.execute("DELETE FROM cache")
+                conn.execute("UPDATE totals SET entries = 0, size = 0")
+
+    # ---- extensions ----
+
+    def delete_prefix(self, prefix: str, version=None) -> int:
+        """Delete every entry whose key starts with prefix. Returns the number deleted."""
+        full_prefix = self.make_key(prefix, version=version)
+        deleted = 0
+        for shard in range(self._num_shards):
+            with self._write(shard) as conn:
+                # Range scan on the primary key. No key we make contains the max code point.
+                deleted += self._delete_rows(conn, "key >= ? AND key < ?", (full_prefix, full_prefix + "\U0010ffff"))
+        self._count("prefix_deletes", deleted)
+        return deleted
+
+    def stats(self) -> dict:
+        """This process's counters, plus the entries and bytes in the cache"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        entries = size = 0
+        for shard in range(self._num_shards):
+            shard_entries, shard_size = self._connection(shard).execute("SELECT entries, size FROM totals").fetchone()
+            entries += shard_entries
+            size += shard_size
+        gets = stats.get("hits", 0) + stats.get("misses", 0)
+        return {**stats, "hit_rate": stats.get("hits", 0) / gets if gets else None, "entries": entries, "size": size}
+
+    # ---- internals ----
+
+    def _set(self, key: str, value, timeout, only_if_missing: bool) -> bool:
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        shard = self._shard(key)
+        with self._write(shard) as conn:
+            row = conn.execute("SELECT size, expires FROM cache WHERE key = ?", (key,)).fetchone()
+            if only_if_missing and row is not None and (row[1] is None or row[1] > now):
+                return False
+            conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)", (key, blob, expires, now, len(blob)))
+            conn.execute(
+                "UPDATE totals SET entries = entries + ?, size = size + ?",
+                (0 if row else 1, len(blob) - (row[0] if row else 0)),
+            )
+            self._evict_if_needed(conn, now)
+        self._count("sets")
+        return True
+
+    def _delete_rows(self, conn: sqlite3.Connection, where: str, params: tuple) -> int:
+        entries, size = conn.execute(
+            f"SELECT count(*), coalesce(sum(size), 0) FROM cache WHERE {where}", params
+        ).fetchone()
+        if entries:
+            conn.execute(f"DELETE FROM cache WHERE {where}", params)
+            conn.execute("UPDATE totals SET entries = entries - ?, size = size - ?", (entries, size))
+        return entries
+
+    def _evict_if_needed(self, conn: sqlite3.Connection, now: float):
+        max_entries = self._max_entries / self._num_shards
+        max_size = self._max_size / self._num_shards if self._max_size else None
+        entries, size = conn.execute("SELECT entries, size FROM totals").fetchone()
+        if entries <= max_entries and (max_size is None or size <= max_size):
+            return
+        evicted = self._delete_rows(conn, "expires IS NOT NULL AND expires <= ?", (now,))
+        entries, size = conn.execute("SELECT entries, size FROM totals").fetchone()
+        excess_entries = max(0, entries - int(max_entries * EVICT_TO))
+        excess_size = max(0, size - int(max_size * EVICT_TO)) if max_size else 0
+        if excess_entries or excess_size:
+            # Least recently used first, until we're under both limits
+            keys, freed = [], 0
+            for key, entry_size in conn.execute("SELECT key, size FROM cache ORDER BY accessed"):
+                if len(keys) >= excess_entries and freed >= excess_size:
+                    break
+                keys.append(key)
+                freed += entry_size
+            conn.executemany("DELETE FROM cache WHERE key = ?", [(k,) for k in keys])
+            conn.execute("UPDATE totals SET entries = entries - ?, size = size - ?", (len(keys), freed))
+            evicted += len(keys)
+        self._count("evictions", evicted)
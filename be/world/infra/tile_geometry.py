@@ -0,0 +1,73 @@
+"""
+Simplified parcel geometry for map tiles at low zooms.
+
+Parcel polygons are surveyed to the centimeter, far finer than a pixel until ~zoom 16, so tiles at city-level zooms
+spend most of their ST_AsMVT time and bytes on vertices nobody can see. Parcel has a geometry column per zoom band,
+simplified to half a pixel at the band's highest zoom, and the parcel tile views (see ParcelGeomBandMixin in
+world/views.py) render from the column for the requested zoom:
+
+    zoom 12-13: geom_z12
+    zoom 14-15: geom_z14
+    zoom 16+:   geom
+
+The columns are filled by simplify_parcel_geometries() (`./manage.py tiles simplify`), which runs after parcels are
+loaded. Parcels whose columns haven't been filled yet are missing from low zoom tiles.
+"""
+import logging
+
+from django.contrib.gis.db.models import MultiPolygonField
+from django.db.models import FloatField, Func, Max, Min, Value
+
+from world.models import Parcel
+
+log = logging.getLogger(__name__)
+
+# (lowest zoom, column) of each simplified band, in zoom order. A band runs up to the next band's lowest zoom.
+GEOM_BANDS = ((12, "geom_z12"), (14, "geom_z14"))
+FULL_GEOM_ZOOM = 16  # zoom from which tiles use the full geometry
+TILE_SIZE_PX = 256
+
+
+def geom_column_for_zoom(z: int) -> str:
+    """The Parcel geometry column for tiles at zoom z. Zooms below the lowest band use the coarsest band."""
+    if z >= FULL_GEOM_ZOOM:
+        return "geom"
+    column = GEOM_BANDS[0][1]
+    for min_zoom, band_column in GEOM_BANDS:
+        if z >= min_zoom:
+            column = band_column
+    return column
+
+
+def simplify_tolerance(z: int) -> float:
+    """Half a pixel at zoom z, in degrees of longitude"""
+    return 360 / (TILE_SIZE_PX << z) / 2
+
+
+def band_tolerances() -> dict[str, float]:
+    """Simplification tolerance of each band's column, set by the highest zoom the band is used at"""
+    max_zooms = [min_zoom - 1 for min_zoom, _ in GEOM_BANDS[1:]] + [FULL_GEOM_ZOOM - 1]
+    return {column: simplify_tolerance(max_zoom) for (_, column), max_zoom in zip(GEOM_BANDS, max_zooms, strict=True)}
+
+
+def _simplified(tolerance: float) -> Func:
+    # ST_SimplifyPreserveTopology never collapses a polygon, so small parcels stay on the map
+    return Func(
+        Func("geom", Value(tolerance, output_field=FloatField()), function="ST_SimplifyPreserveTopology"),
+        function="ST_Multi",
+        output_field=MultiPolygonField(srid=4326),
+    )
+
+
+def simplify_parcel_geometries(batch_size: int = 50_000) -> int:
+    """Fill every band's geometry column from Parcel.geom, in batches of ids. Returns the number of parcels
+    updated."""
+    updates = {column: _simplified(tolerance) for column, tolerance in band_tolerances().items()}
+    id_range = Parcel.objects.aggregate(lo=Min("id"), hi=Max("id"))
+    if id_range["lo"] is None:
+        return 0
+    updated = 0
+    for start in range(id_range["lo"], id_range["hi"] + 1, batch_size):
+        updated += Parcel.objects.filter(id__gte=start, id__lt=start + batch_size).update(**updates)
+        log.info(f"Simplified {updated} parcels (ids up to {min(start + batch_size - 1, id_range['hi'])})")
+    return updated
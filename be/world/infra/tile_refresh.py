@@ -0,0 +1,242 @@
+"""
+Refresh map tiles after a data load, touching only the tiles whose content changed, instead of wiping the tile cache.
+
+    with track_tile_changes([ZoningBase]):
+        ... reload zoning ...
+
+Before the change, TileChangeTracker snapshots the features of every tile view serving one of the models: a hash of
+each feature's geometry and tile fields, with its bbox. After the change it snapshots again. Features in only one of
+the snapshots were added, removed or edited, and the web map tiles covering their bboxes are:
+* re-rendered in the layer's MBTiles file, if it's been seeded (see mbtiles.py), and
+* dropped from the tile response cache (see django_cache.py), at every zoom up to MAX_CACHED_ZOOM.
+
+Tile views whose URLs have parameters besides z/x/y (or whose queryset depends on the request) can't be enumerated
+tile by tile, so all their cached tiles are dropped instead.
+"""
+import logging
+from collections import Counter, defaultdict
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from django.core.cache import caches
+from django.db import models
+from django.db.models import BinaryField, CharField, FloatField, Func
+from django.urls import URLResolver, get_resolver
+from joblib import Parallel, delayed
+from lib.tile_lib import BBox, lonlat_to_xyz
+from vectortiles.mixins import BaseVectorTileMixin
+
+from world.infra.django_cache import KEY_PREFIX, TILE_CACHE_ALIAS, invalidate_cached_pages
+from world.infra.mbtiles import MBTiles, get_mbtiles
+from world.views import STATIC_TILE_VIEWS
+
+log = logging.getLogger(__name__)
+
+MAX_CACHED_ZOOM = 20
+# Past this many changed tiles at a zoom, drop whole columns of tiles from the cache instead of single tiles
+MAX_TILES_PER_ZOOM = 4096
+# Tiles rendered per worker task
+RENDER_BATCH_SIZE = 64
+
+
+@dataclass(frozen=True)
+class TileRoute:
+    route: str  # URL pattern, eg. "/dj/api/worldview/zoningtile/<int:z>/<int:x>/<int:y>"
+    view_class: type
+
+    @property
+    def is_xyz(self) -> bool:
+        """Whether z, x and y are the only URL parameters"""
+        return self.route.endswith("<int:z>/<int:x>/<int:y>") and self.route.count("<") == 3
+
+    @property
+    def prefix(self) -> str:
+        """The static start of the URL, before any parameters"""
+        return self.route.split("<")[0]
+
+    def path(self, z: int, x: int, y: int) -> str:
+        return f"{self.prefix}{z}/{x}/{y}"
+
+
+def tile_routes() -> list[TileRoute]:
+    """Every vector tile view in the URL conf"""
+    routes = []
+
+    def walk(patterns, prefix: str):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                walk(pattern.url_patterns, prefix + str(pattern.pattern))
+                continue
+            view_class = getattr(pattern.callback, "view_class", None)
+            if view_class is not None and issubclass(view_class, BaseVectorTileMixin):
+                routes.append(TileRoute("/" + prefix + str(pattern.pattern), view_class))
+
+    walk(get_resolver().url_patterns, "")
+    return routes
+
+
+def _bbox_func(fn: str, geom_name: str) -> Func:
+    return Func(geom_name, function=fn, output_field=FloatField())
+
+
+def snapshot_features(view_class) -> dict[tuple, list[BBox]]:
+    """(geometry hash, tile field values) -> bboxes of the features the view puts in tiles"""
+    view = view_class()
+    geom_name = view.vector_tile_geom_name
+    # The geometry itself is hashed in the DB
+    fields = tuple(f for f in view.vector_tile_fields or () if f != geom_name)
+    rows = (
+        view.get_vector_tile_queryset()
+        .annotate(
+            _geom_md5=Func(
+                Func(geom_name, function="ST_AsBinary", output_field=BinaryField()),
+                function="md5",
+                output_field=CharField(),
+            ),
+            _xmin=_bbox_func("ST_XMin", geom_name),
+            _ymin=_bbox_func("ST_YMin", geom_name),
+            _xmax=_bbox_func("ST_XMax", geom_name),
+            _ymax=_bbox_func("ST_YMax", geom_name),
+        )
+        .values_list("_geom_md5", "_xmin", "_ymin", "_xmax", "_ymax", *fields)
+        .order_by()
+    )
+    features = defaultdict(list)
+    for geom_md5, xmin, ymin, xmax, ymax, *values in rows.iterator(chunk_size=10_000):
+        if geom_md5 is not None:
+            features[(geom_md5, repr(values))].append((xmin, ymin, xmax, ymax))
+    return features
+
+
+def changed_bboxes(before: dict[tuple, list[BBox]], after: dict[tuple, list[BBox]]) -> list[BBox]:
+    """Bboxes of features that were added, removed or changed between two snapshots"""
+    changed = []
+    for key in before.keys() | after.keys():
+        if Counter(before.get(key, [])) != Counter(after.get(key, [])):
+            changed.extend(before.get(key, []))
+            changed.extend(after.get(key, []))
+    return changed
+
+
+def _xyz_range(bbox: BBox, z: int) -> tuple[int, int, int, int]:
+    minx, miny, maxx, maxy = bbox
+    x0, y0 = lonlat_to_xyz(minx, maxy, z)
+    x1, y1 = lonlat_to_xyz(maxx, miny, z)
+    return x0, y0, x1, y1
+
+
+def tiles_covering(bboxes: Iterable[BBox], z: int) -> set[tuple[int, int]]:
+    """(x, y) of the zoom z tiles intersecting any of the bboxes"""
+    tiles = set()
+    for bbox in bboxes:
+        x0, y0, x1, y1 = _xyz_range(bbox, z)
+        tiles.update((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+    return tiles
+
+
+def invalidate_tiles(route: TileRoute, bboxes: list[BBox]) -> int:
+    """Drop the route's cached tiles covering the bboxes, at every zoom. Returns the number dropped."""
+    keys, prefixes = [], []
+    for z in range(MAX_CACHED_ZOOM + 1):
+        ranges = [_xyz_range(bbox, z) for bbox in bboxes]
+        # Count first, so a large change at a high zoom doesn't build millions of keys
+        if sum((x1 - x0 + 1) * (y1 - y0 + 1) for x0, y0, x1, y1 in ranges) <= MAX_TILES_PER_ZOOM:
+            keys.extend(f"{KEY_PREFIX}:{route.path(z, x, y)}" for x, y in tiles_covering(bboxes, z))
+        else:
+            columns = {x for x0, _, x1, _ in ranges for x in range(x0, x1 + 1)}
+            prefixes.extend(f"{route.prefix}{z}/{x}/" for x in sorted(columns))
+    # Only our cache backend reports how many keys it deleted
+    dropped = caches[TILE_CACHE_ALIAS].delete_many(keys) or 0
+    for prefix in prefixes:
+        dropped += invalidate_cached_pages(prefix) or 0
+    return dropped
+
+
+def render_tiles(layer: str, tiles: list[tuple[int, int, int]], n_jobs: int = 1) -> Iterator[list]:
+    """Render (z, x, y) tiles of a static layer from the DB, yielding batches of (z, x, y, tile). With n_jobs > 1,
+    batches are rendered on a process pool, a few per worker at a time so we don't hold every tile in memory."""
+    from lib.parcel_analysis_2022.parallel_worker import render_tiles_worker
+
+    batches = [tiles[i : i + RENDER_BATCH_SIZE] for i in range(0, len(tiles), RENDER_BATCH_SIZE)]
+    if n_jobs == 1:
+        view = STATIC_TILE_VIEWS[layer]()
+        for i, batch in enumerate(batches):
+            yield [(z, x, y, view.render_tile(x, y, z)) for z, x, y in batch]
+            log.info(f"{layer}: {i + 1}/{len(batches)} batches")
+        return
+    with Parallel(n_jobs=n_jobs) as parallel:
+        step = n_jobs * 4
+        for i in range(0, len(batches), step):
+            yield from parallel(delayed(render_tiles_worker)(layer, batch) for batch in batches[i : i + step])
+            log.info(f"{layer}: {min(len(batches), i + step)}/{len(batches)} batches")
+
+
+def rerender_mbtiles(route: TileRoute, bboxes: list[BBox], n_jobs: int = 1) -> int:
+    """Re-render the tiles covering the bboxes in the layer's MBTiles file, if it's seeded. Returns the number of
+    tiles re-rendered."""
+    layer = getattr(route.view_class, "mbtiles_layer", None)
+    mbtiles = get_mbtiles(layer) if layer else None
+    if mbtiles is None or mbtiles.zoom_range is None:
+        return 0
+    min_zoom, max_zoom = mbtiles.zoom_range
+    tiles = [
+        (z, x, y)
+        for z in range(min_zoom, max_zoom + 1)
+        for x, y in sorted(tiles_covering(bboxes, z))
+        if mbtiles.covers(z, x, y)
+    ]
+    writer = MBTiles(mbtiles.path, readonly=False)
+    try:
+        for batch in render_tiles(layer, tiles, n_jobs):
+            writer.put_tiles(batch)
+    finally:
+        writer.close()
+    return len(tiles)
+
+
+class TileChangeTracker:
+    def __init__(self, changed_models: Iterable[type[models.Model]], n_jobs: int = 1):
+        labels = {m._meta.label for m in changed_models}
+        self.routes = [
+            r
+            for r in tile_routes()
+            if getattr(r.view_class, "model", None) and r.view_class.model._meta.label in labels
+        ]
+        self.n_jobs = n_jobs
+        self.before: dict[TileRoute, dict] = {}
+
+    def snapshot(self):
+        for route in self.routes:
+            if route.is_xyz:
+                try:
+                    self.before[route] = snapshot_features(route.view_class)
+                except Exception:
+                    # eg. the view's queryset depends on the request
+                    log.warning(f"Can't snapshot {route.route}, will drop all its cached tiles", exc_info=True)
+
+    def refresh(self) -> Counter:
+        stats = Counter()
+        for route in self.routes:
+            if route not in self.before:
+                stats["prefix_dropped"] += invalidate_cached_pages(route.prefix) or 0
+                continue
+            bboxes = changed_bboxes(self.before[route], snapshot_features(route.view_class))
+            if not bboxes:
+                continue
+            stats["changed_bboxes"] += len(bboxes)
+            stats["rerendered"] += rerender_mbtiles(route, bboxes, self.n_jobs)
+            stats["dropped"] += invalidate_tiles(route, bboxes)
+        log.info(f"Refreshed tiles for {[r.route for r in self.routes]}: {dict(stats)}")
+        return stats
+
+
+@contextmanager
+def track_tile_changes(changed_models: Iterable[type[models.Model]], n_jobs: int = 1):
+    """Refresh the tiles of views serving changed_models for whatever changes in the block. See module docstring."""
+    tracker = TileChangeTracker(changed_models, n_jobs)
+    tracker.snapshot()
+    try:
+        yield tracker
+    finally:
+        tracker.refresh()
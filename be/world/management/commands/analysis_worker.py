@@ -0,0 +1,152 @@
+import datetime
+import logging
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+
+from django.db import connection
+from lib.mgmt_lib import Home3Command
+from lib.parcel_analysis_2022.analyze_parcel_lib import analyze_one_parcel
+from lib.parcel_analysis_2022.crs_lib import get_utm_crs
+from lib.parcel_analysis_2022.figures_lib import FigurePublisher, get_image_store
+
+from world.models import AnalysisJob, AnalyzedListing
+
+log = logging.getLogger(__name__)
+
+# Seconds between heartbeats of the jobs a worker is running
+HEARTBEAT_INTERVAL = 30
+
+
+def run_analysis_job(job: AnalysisJob, publisher: FigurePublisher) -> None:
+    """Run one claimed job to completion, recording the result (or the failure) on the job. The job's figures are
+    handed to the publisher, which renders and uploads them in the background; the job is done once they're
+    published."""
+    sd_utm_crs = get_utm_crs()  # San Diego specific
+    try:
+        # Generally should match this call to analyze_batch() call in scrape.py
+        analyzed_listing, figures = analyze_one_parcel(
+            job.listing.parcel,
+            sd_utm_crs,
+            job.listing,
+            save_dir=None,
+            dry_run=False,
+            show_plot=False,
+            force_uploads=True,
+        )
+    except Exception as e:
+        log.error(f"Analysis job {job.pk} for {job.parcel_id} failed: {e}")
+        job.mark_failed(traceback.format_exc())
+        return
+    publish = publisher.submit(figures)
+    if publish is None:
+        job.mark_done(analyzed_listing)
+    else:
+        publish.add_done_callback(lambda f: finish_analysis_job(job, analyzed_listing, f))
+
+
+def finish_analysis_job(job: AnalysisJob, analyzed_listing: AnalyzedListing, publish: Future) -> None:
+    """Mark the job done once its figures are published. A failed upload is recorded as a warning on the analysis,
+    so clients can tell why its images are missing."""
+    try:
+        err = publish.exception()
+        if err:
+            messages = analyzed_listing.details.setdefault("messages", {})
+            messages.setdefault("warning", []).append(f"Couldn't publish images: {err}")
+            analyzed_listing.save(update_fields=["details"])
+        job.mark_done(analyzed_listing)
+    except Exception:
+        # Runs on a publisher thread, where nobody would see the exception
+        log.error(f"Finishing analysis job {job.pk} failed", exc_info=True)
+        job.mark_failed(traceback.format_exc())
+
+
+class JobHeartbeat:
+    """Background thread that beats the worker's running jobs (see AnalysisJob.beat), including jobs whose figures
+    are still being published, until they're finished."""
+
+    def __init__(self, interval: float = HEARTBEAT_INTERVAL):
+        self.interval = interval
+        self.job_ids: set[int] = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="analysis-job-heartbeat", daemon=True)
+
+    def __enter__(self) -> "JobHeartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+    def add(self, job: AnalysisJob):
+        with self._lock:
+            self.job_ids.add(job.pk)
+
+    def beat(self):
+        with self._lock:
+            job_ids = list(self.job_ids)
+        if not job_ids:
+            return
+        running = AnalysisJob.beat(job_ids)
+        with self._lock:
+            self.job_ids -= set(job_ids) - running
+
+    def _run(self):
+        try:
+            while not self._stopped.wait(self.interval):
+                try:
+                    self.beat()
+                except Exception:
+                    log.error("Couldn't record analysis job heartbeats", exc_info=True)
+        finally:
+            connection.close()
+
+
+class Command(Home3Command):
+    help = "Process queued parcel analysis jobs (requested via the /world/analysis API). Can run several in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--poll-interval", action="store", type=float, default=2.0, help="Seconds to wait when the queue is empty"
+        )
+        parser.add_argument(
+            "--stale-after",
+            action="store",
+            type=int,
+            default=5,
+            help="Minutes without a heartbeat after which a running job is considered dead and marked as failed",
+        )
+        parser.add_argument("--drain", action="store_true", help="Exit once the queue is empty instead of polling")
+
+    def handle(self, *args, **options):
+        stale_after = datetime.timedelta(minutes=options["stale_after"])
+        log.info("Analysis worker started")
+        with JobHeartbeat() as heartbeat, FigurePublisher(get_image_store()) as publisher:
+            self.process_jobs(publisher, heartbeat, stale_after, options["poll_interval"], options["drain"])
+        log.info(f"Queue is empty, exiting. Figures: {dict(publisher.stats)}")
+
+    def process_jobs(
+        self,
+        publisher: FigurePublisher,
+        heartbeat: JobHeartbeat,
+        stale_after: datetime.timedelta,
+        poll_interval: float,
+        drain: bool,
+    ):
+        while True:
+            if num_stale := AnalysisJob.fail_stale(stale_after):
+                log.warning(f"Marked {num_stale} stale running jobs as failed")
+            job = AnalysisJob.claim_next()
+            if not job:
+                if drain:
+                    break
+                time.sleep(poll_interval)
+                continue
+            log.info(f"Running {job}")
+            heartbeat.add(job)
+            start = time.monotonic()
+            run_analysis_job(job, publisher)
+            log.info(f"Finished {job} in {time.monotonic() - start:.1f}s")
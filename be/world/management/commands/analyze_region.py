@@ -0,0 +1,71 @@
+import logging
+import time
+
+from django.contrib.gis.db.models import Extent
+from django.contrib.gis.geos import Polygon
+from django.core.management import CommandError
+from lib.mgmt_lib import Home3Command
+from lib.parcel_analysis_2022.crs_lib import get_utm_crs
+from lib.parcel_analysis_2022.neighborhoods import NeighborhoodBBox
+from lib.parcel_analysis_2022.region_lib import DEFAULT_TILE_SIZE, RegionOptions, analyze_region, partition_region
+
+from world.models import Parcel
+
+log = logging.getLogger(__name__)
+
+
+class Command(Home3Command):
+    help = (
+        "Analyze every parcel in a neighborhood (not just listings), creating off-market listings as needed. "
+        "Parcels are split into spatial tiles which are analyzed in parallel."
+    )
+
+    def add_arguments(self, parser):
+        area = parser.add_mutually_exclusive_group(required=True)
+        area.add_argument("--hood", choices=NeighborhoodBBox.__members__)
+        area.add_argument("--bbox", action="store", help="Bounding box as minx,miny,maxx,maxy (lon / lat)")
+        parser.add_argument(
+            "--tile-size",
+            action="store",
+            type=float,
+            default=DEFAULT_TILE_SIZE,
+            help="Tile size in degrees",
+        )
+        parser.add_argument(
+            "--zone-prefix",
+            action="store",
+            default="R",
+            help="Only analyze parcels whose zone starts with this. Pass '' to analyze all parcels",
+        )
+        parser.add_argument("--n-jobs", action="store", type=int, default=8, help="Number of worker processes")
+        parser.add_argument("--limit", action="store", type=int, help="Max number of parcels to analyze")
+        parser.add_argument("--dry-run", action="store_true", help="Don't save anything to the DB")
+        parser.add_argument("--figures", action="store_true", help="Render and upload figures for new analyses")
+        parser.add_argument("--no-split-lot", action="store_true", help="Don't try splitting lots")
+
+    def handle(self, *args, **options):
+        if options["bbox"]:
+            try:
+                bbox = tuple(float(x) for x in options["bbox"].split(","))
+            except ValueError as e:
+                raise CommandError(f"Invalid --bbox: {options['bbox']}") from e
+            if len(bbox) != 4:
+                raise CommandError(f"Invalid --bbox: {options['bbox']}")
+        elif options["hood"] == "all":
+            bbox = Parcel.objects.aggregate(extent=Extent("geom"))["extent"]
+        else:
+            bbox = NeighborhoodBBox[options["hood"]].value
+        bounding_box = Polygon.from_bbox(bbox)
+
+        tiles = partition_region(bounding_box, options["tile_size"], options["limit"])
+        region_options = RegionOptions(
+            dry_run=options["dry_run"],
+            zone_prefix=options["zone_prefix"] or None,
+            try_split_lot=not options["no_split_lot"],
+            figures=options["figures"],
+        )
+        start = time.monotonic()
+        stats = analyze_region(tiles, get_utm_crs(), region_options, n_jobs=options["n_jobs"])
+        elapsed = time.monotonic() - start
+        rate = stats["analyzed"] / elapsed if elapsed else 0
+        log.info(f"Done in {elapsed:.0f}s ({rate:.1f} parcels/s). Stats: {dict(stats)}")
@@ -1,34 +1,24 @@
 import pprint
-from collections import Counter
 from enum import Enum
 
 import django
 from django.contrib.gis.db.models import Extent, Union
 from django.contrib.gis.geos import MultiPolygon
-from lib.co.co_eligibility_lib import AB2011Eligible
+from lib.co.co_eligibility_lib import run_ab2011_set
 from lib.mgmt_lib import Home3Command
 from lib.parcel_analysis_2022.crs_lib import get_utm_crs
+from lib.parcel_analysis_2022.neighborhoods import NeighborhoodBBox
 from lib.parcel_analysis_2022.topo_lib import (
     calculate_parcel_slopes,
     calculate_parcel_slopes_mp,
     check_topos_for_parcels,
 )
 
+from world.infra.tile_refresh import track_tile_changes
 from world.models import AnalyzedParcel, Parcel, ZoningBase
 from world.models.base_models import ZoningMapLabel
 
 
-class Neighborhood(Enum):
-    # Mira Mesa neighborhood of San Diego
-    Miramesa = -117.17987773162996, 32.930825570911985, -117.12513392170659, 32.894946222075184
-    MiramesaSmall = (-117.135284737197, 32.905422120627904, -117.13317320050437, 32.90428935023001)
-
-    # Special "neighborhood" - compute full extents of all parcels
-    all = ()
-
-    # ... add more neighborhoods here
-
-
 class DataPrepCmd(Enum):
     labels = 1
     topos = 2
@@ -41,7 +31,7 @@ class Command(Home3Command):
     def add_arguments(self, parser):
         parser.add_argument("cmd", choices=DataPrepCmd.__members__)
 
-        parser.add_argument("--hood", choices=Neighborhood.__members__)
+        parser.add_argument("--hood", choices=NeighborhoodBBox.__members__)
         parser.add_argument(
             "--check",
             "-c",
@@ -62,16 +52,9 @@ class Command(Home3Command):
             a=Union("geom")
         )["a"]
         comm_parcels = Parcel.objects.filter(geom__intersects=c_zones)
-        stats = Counter({})
-        print(comm_parcels)
-        print(f"Checking {len(comm_parcels)} parcels for AB2011 eligibility")
-        for idx, parcel in enumerate(comm_parcels):
-            if idx % 50 == 0:
-                print(idx, ":", stats)
-            x = AB2011Eligible()
-            result = x.run(parcel)
-            stats[result] += 1
-            AnalyzedParcel(apn=parcel, ab2011_eligible=result).save()
+        print(f"Checking {comm_parcels.count()} parcels for AB2011 eligibility")
+        with track_tile_changes([AnalyzedParcel]):
+            stats = run_ab2011_set(comm_parcels)
         #     if result in [CheckResultEnum.failed, CheckResultEnum.error]:
         #     if result == CheckResultEnum.passed:
         #         ab2011_parcels.append(parcel.apn)
@@ -93,7 +76,7 @@ class Command(Home3Command):
             print(f"Bounding box is {bounding_box_tuple}")
         else:
             print(f"Working with parcels in {hood} neighborhood")
-            bounding_box_tuple = Neighborhood[hood].value
+            bounding_box_tuple = NeighborhoodBBox[hood].value
         bounding_box = django.contrib.gis.geos.Polygon.from_bbox(bounding_box_tuple)
         sd_utm_crs = get_utm_crs()
         if options["check"]:
@@ -109,9 +92,10 @@ class Command(Home3Command):
             self.stdout.write(self.style.SUCCESS(f"Finished calculating parcel slopes for neighborhood {hood}"))
 
     def handle_labels(self, cmd, hood, *args, **options):
-        ZoningMapLabel.objects.all().delete()
-        zone_blobs = ZoningBase.objects.all()
-        # zone_blobs = ZoningBase.objects.all().filter(zone_name__startswith="RS")
-        for blob in zone_blobs:
-            x = ZoningMapLabel(text=blob.zone_name, geom=blob.geom.centroid, model=blob)
-            x.save()
+        with track_tile_changes([ZoningMapLabel]):
+            ZoningMapLabel.objects.all().delete()
+            zone_blobs = ZoningBase.objects.all()
+            # zone_blobs = ZoningBase.objects.all().filter(zone_name__startswith="RS")
+            for blob in zone_blobs:
+                x = ZoningMapLabel(text=blob.zone_name, geom=blob.geom.centroid, model=blob)
+                x.save()
@@ -11,8 +11,11 @@ from elt.lib.types import Juri
 from lib.mgmt_lib import Home3Command
 from parsnip.util import eprint
 
+from world.infra.tile_geometry import simplify_parcel_geometries
+from world.infra.tile_refresh import track_tile_changes
 from world.models import (
     BuildingOutlines,
+    DataVersion,
     Parcel,
     Roads,
     Topography,
@@ -30,6 +33,7 @@ from world.models.base_models_mapping import (
     transitpriorityarea_mapping,
     zoningbase_mapping,
 )
+from world.models.models import PARCEL_ADDRESS_VERSION
 
 
 class Cmd(Enum):
@@ -207,7 +211,14 @@ class Command(Home3Command):
         using_db = "default"
         lm = LayerMapping(db_model, data_dir / fname, mapper, transform=True, using=using_db)
 
-        lm.save(strict=True, verbose=False, progress=True)
+        with track_tile_changes([db_model]):
+            lm.save(strict=True, verbose=False, progress=True)
+            if model == "Parcel":
+                # Low zoom parcel tiles render from the simplified columns
+                simplify_parcel_geometries()
+        DataVersion.bump(db_model)
+        if model == "Parcel":
+            DataVersion.bump(PARCEL_ADDRESS_VERSION)
 
         # Execute post-load tasks
         if model == "Topography":
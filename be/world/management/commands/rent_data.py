@@ -1,9 +1,13 @@
 import logging
 
+from django.db import transaction
 from django.db.models import Count
 from lib.mgmt_lib import Home3Command
+from lib.parcel_analysis_2022.re_params import ReParams
+from lib.parcel_analysis_2022.rent_index import get_rent_index
+from lib.parcel_analysis_2022.rent_surface import DEFAULT_CELL_SIZE, DEFAULT_MAX_DISTANCE, build_rent_surface
 
-from world.models import RentalData
+from world.models import RentalData, RentSurface
 
 log = logging.getLogger(__name__)
 
@@ -13,7 +17,24 @@ class Command(Home3Command):
 
     # Positional arguments
     def add_arguments(self, parser):
-        parser.add_argument("cmd_name", type=str, help="Command to run. Valid option are: dedup, reset_credits")
+        parser.add_argument(
+            "cmd_name", type=str, help="Command to run. Valid option are: dedup, reset_credits, build_surface"
+        )
+        parser.add_argument(
+            "--cell-size", type=float, default=DEFAULT_CELL_SIZE, help="build_surface: grid cell size in meters"
+        )
+        parser.add_argument(
+            "--max-distance",
+            type=float,
+            default=DEFAULT_MAX_DISTANCE,
+            help="build_surface: max distance in meters from a cell to the rental data it's interpolated from",
+        )
+        parser.add_argument(
+            "--percentile",
+            type=int,
+            action="append",
+            help="build_surface: rent percentile to build a surface for (repeatable). Defaults to the ReParams ones",
+        )
 
     def handle(self, *args, **options):
         log.setLevel(logging.INFO)
@@ -32,6 +53,37 @@ class Command(Home3Command):
                 for item in items[1:]:
                     item.delete()
             log.info("Removed duplicates.")
+        elif options["cmd_name"] == "build_surface":
+            self.build_surfaces(options["cell_size"], options["max_distance"], options["percentile"])
 
         else:
             log.error(f"Unknown command {options['cmd_name']}")
+
+    def build_surfaces(self, cell_size: float, max_distance: float, percentiles: list[int] | None):
+        from lib.parcel_analysis_2022.analyze_parcel_lib import rent_data
+
+        if not percentiles:
+            re_params = ReParams()
+            percentiles = sorted({re_params.existing_unit_rent_percentile, re_params.new_unit_rent_percentile})
+        index = get_rent_index()
+        crs = index.transformer.target_crs
+        for br, ba in sorted(index.classes):
+            for percentile in percentiles:
+                grid = build_rent_surface(
+                    index,
+                    br,
+                    ba,
+                    percentile,
+                    rent_data._rent_at_percentile,
+                    rent_data.idw_k,
+                    rent_data.idw_power,
+                    cell_size=cell_size,
+                    max_distance=max_distance,
+                )
+                if grid is None:
+                    continue
+                surface = grid.to_model(crs)
+                with transaction.atomic():
+                    RentSurface.objects.filter(br=br, ba=ba, percentile=percentile).delete()
+                    surface.save()
+                log.info(f"Built {surface}, {surface.num_cells_with_data} cells with data")
@@ -11,9 +11,9 @@ from collections import Counter, defaultdict
 
 from django.core.exceptions import ObjectDoesNotExist
 from lib.mgmt_lib import Home3Command
+from lib.parcel_analysis_2022.address_index import ParcelAddressIndex
 from lib.parcel_analysis_2022.analyze_parcel_lib import analyze_batch
 from lib.parcel_analysis_2022.crs_lib import get_utm_crs
-from lib.parcel_analysis_2022.listings_lib import address_to_parcel
 from lib.parcel_analysis_2022.neighborhoods import AllSdCityZips, Neighborhood
 from lib.parcel_analysis_2022.scraping_lib import scrape_san_diego_listings_by_zip_groups
 from pandas import DataFrame
@@ -87,6 +87,9 @@ class Command(Home3Command):
         parser.add_argument("--skip-analysis", action="store_true", help="Don't run parcel analysis")
         parser.add_argument("--parcel", action="store", help="Run analysis only (no scrape) on a single parcel")
         parser.add_argument("--single-process", action="store_true", help="Run analysis with only a single process")
+        parser.add_argument(
+            "--rent-budget", action="store", type=int, help="Max number of Rentometer calls for the analysis batch"
+        )
 
     def handle(self, *args, **options):  # noqa: PLR0915 - too many statements.
         # -----
@@ -141,6 +144,7 @@ class Command(Home3Command):
 
             prop_listings = PropertyListing.active_listings_queryset().prefetch_related("analyzedlisting", "parcel")
             logging.info(f"Found {len(prop_listings)} properties to associate")
+            to_match = []
             for prop_listing in prop_listings:
                 try:
                     # If we're caching and the parcel, and analyzed listing exists, we can skip analysis and
@@ -151,12 +155,15 @@ class Command(Home3Command):
                 except ObjectDoesNotExist:
                     # we're missing a relationship, so we need to analyze this parcel.
                     pass
-                matched_parcel, error = address_to_parcel(prop_listing.addr, jurisdiction="SD")
-                if error:
-                    stats[error] += 1
-                else:
+                to_match.append(prop_listing)
+            # Match the whole batch in memory, then fetch the matched parcels in one query
+            apns, match_stats = ParcelAddressIndex.load().resolve_many([p.addr for p in to_match], jurisdiction="SD")
+            stats.update(match_stats)
+            parcels_by_apn = Parcel.objects.in_bulk({apn for apn in apns if apn}, field_name="apn")
+            for prop_listing, apn in zip(to_match, apns, strict=True):
+                if apn:
                     # Got matched parcel, record the foreign key link in the listing.
-                    stats["success"] += 1
+                    matched_parcel = parcels_by_apn[apn]
                     prop_listing.parcel = matched_parcel
                     prop_listing.save(update_fields={"parcel"})
                     zipcode = matched_parcel.situs_zip
@@ -210,6 +217,7 @@ class Command(Home3Command):
                     options["dry_run"],
                     save_dir=tmpdirname,
                     single_process=bool(options["parcel"]) or bool(options["single_process"]),
+                    rent_budget=options["rent_budget"],
                 )
 
                 # Save the errors to a csv
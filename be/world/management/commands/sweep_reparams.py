@@ -0,0 +1,71 @@
+import logging
+from pathlib import Path
+
+import polars as pl
+from django.core.management import CommandError
+from lib.mgmt_lib import Home3Command
+from lib.parcel_analysis_2022.reparams_sweep import (
+    load_sweep_inputs,
+    parse_param_grid,
+    run_sweep,
+    swept_param_names,
+)
+
+from world.models import AnalyzedListing, PropertyListing
+
+log = logging.getLogger(__name__)
+
+
+class Command(Home3Command):
+    help = (
+        "Re-evaluate the finance model of existing analyses over a grid of ReParams / ConstructionCosts, without "
+        "re-running geometry analysis. Writes a table of cap rates per listing per parameter set."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--param",
+            "-p",
+            action="append",
+            default=[],
+            help="Parameter to sweep, as name=v1,v2,... Can be repeated. Construction costs are addressed as "
+            "constr_costs.<field>. Example: -p vacancy_rate=0.03,0.05 -p constr_costs.build_cost_two_story=340,400",
+        )
+        parser.add_argument(
+            "--out", action="store", default="reparams_sweep.parquet", help="Output file (.parquet or .csv)"
+        )
+        parser.add_argument("--apn", action="store", help="Only sweep the analysis for a single parcel")
+        parser.add_argument("--limit", action="store", type=int, help="Max number of analyzed listings to sweep")
+        parser.add_argument("--n-jobs", action="store", type=int, default=8, help="Number of worker processes")
+
+    def handle(self, *args, **options):
+        try:
+            param_sets = parse_param_grid(options["param"])
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+        param_names = swept_param_names(options["param"])
+
+        analyzed_listings = AnalyzedListing.objects.select_related("listing", "listing__parcel").order_by("id")
+        if options["apn"]:
+            analyzed_listings = analyzed_listings.filter(parcel_id=options["apn"])
+        else:
+            analyzed_listings = analyzed_listings.filter(listing__in=PropertyListing.active_listings_queryset())
+        if options["limit"]:
+            analyzed_listings = analyzed_listings[: options["limit"]]
+
+        log.info(f"Looking up rents for {len(analyzed_listings)} analyzed listings")
+        inputs, rent_stats = load_sweep_inputs(list(analyzed_listings), param_sets)
+        log.info(f"Rent lookup stats: {dict(rent_stats)}")
+        if not inputs:
+            log.info("Nothing to sweep")
+            return
+
+        results = run_sweep(inputs, param_sets, param_names, n_jobs=options["n_jobs"])
+        df = pl.concat([pl.DataFrame(columns) for columns in results if columns])
+
+        out = Path(options["out"])
+        if out.suffix == ".csv":
+            df.write_csv(out)
+        else:
+            df.write_parquet(out)
+        log.info(f"Wrote {len(df)} rows ({len(inputs)} listings x {len(param_sets)} parameter sets) to {out}")
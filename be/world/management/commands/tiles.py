@@ -0,0 +1,143 @@
+import logging
+import statistics
+import time
+
+from django.contrib.gis.db.models import Extent
+from django.contrib.gis.db.models.functions import Centroid
+from django.core.cache import caches
+from django.core.management import CommandError
+from lib.mgmt_lib import Home3Command
+from lib.tile_lib import lonlat_to_xyz, xyz_tiles
+
+from world.infra.django_cache import TILE_CACHE_ALIAS, invalidate_cached_pages
+from world.infra.mbtiles import write_mbtiles
+from world.infra.tile_geometry import simplify_parcel_geometries
+from world.infra.tile_refresh import render_tiles, tile_routes
+from world.views import STATIC_TILE_VIEWS
+
+log = logging.getLogger(__name__)
+
+
+class Command(Home3Command):
+    help = "Manage pre-rendered MBTiles files for static map layers (see world/infra/mbtiles.py) and the tile cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "cmd_name",
+            choices=["seed", "cache_stats", "clear_cache", "simplify", "bench"],
+            help="seed: render every tile of the layers into MBTiles. cache_stats: show tile cache size. "
+            "clear_cache: drop cached tile responses (all, or under --prefix). "
+            "simplify: fill the simplified parcel geometry columns. "
+            "bench: time rendering --view's tiles from the DB at each zoom",
+        )
+        parser.add_argument(
+            "--layer",
+            action="append",
+            choices=STATIC_TILE_VIEWS.keys(),
+            help="Layer to work on (repeatable). Defaults to all static layers",
+        )
+        parser.add_argument("--min-zoom", type=int, help="Override the layer's min zoom")
+        parser.add_argument("--max-zoom", type=int, help="Override the layer's max zoom")
+        parser.add_argument(
+            "--bbox", action="store", help="Only seed tiles in this bbox (minx,miny,maxx,maxy, lon / lat)"
+        )
+        parser.add_argument("--n-jobs", action="store", type=int, default=8, help="Number of worker processes")
+        parser.add_argument("--prefix", action="store", help="clear_cache: URL path prefix to drop")
+        parser.add_argument("--view", action="store", help="bench: tile view class name, eg. ParcelTileData")
+        parser.add_argument("--samples", action="store", type=int, default=50, help="bench: tiles per zoom")
+        parser.add_argument(
+            "--full-geom", action="store_true", help="bench: render parcel views from full geometry at every zoom"
+        )
+
+    def handle(self, *args, **options):
+        if options["cmd_name"] == "cache_stats":
+            log.info(f"Tile cache: {caches[TILE_CACHE_ALIAS].stats()}")
+            return
+        if options["cmd_name"] == "clear_cache":
+            if options["prefix"]:
+                log.info(f"Dropped {invalidate_cached_pages(options['prefix'])} cached tiles")
+            else:
+                caches[TILE_CACHE_ALIAS].clear()
+            return
+        if options["cmd_name"] == "simplify":
+            log.info(f"Simplified geometry of {simplify_parcel_geometries()} parcels")
+            return
+        if options["cmd_name"] == "bench":
+            self.bench(
+                options["view"], options["samples"], options["min_zoom"], options["max_zoom"], options["full_geom"]
+            )
+            return
+        bbox = None
+        if options["bbox"]:
+            try:
+                bbox = tuple(float(x) for x in options["bbox"].split(","))
+            except ValueError as e:
+                raise CommandError(f"Invalid --bbox: {options['bbox']}") from e
+            if len(bbox) != 4:
+                raise CommandError(f"Invalid --bbox: {options['bbox']}")
+        for layer in options["layer"] or STATIC_TILE_VIEWS.keys():
+            self.seed(layer, bbox, options["min_zoom"], options["max_zoom"], options["n_jobs"])
+
+    def seed(self, layer: str, bbox, min_zoom: int | None, max_zoom: int | None, n_jobs: int):
+        view_class = STATIC_TILE_VIEWS[layer]
+        min_zoom = view_class.mbtiles_zooms[0] if min_zoom is None else min_zoom
+        max_zoom = view_class.mbtiles_zooms[1] if max_zoom is None else max_zoom
+        if bbox is None:
+            bbox = (
+                view_class()
+                .get_vector_tile_queryset()
+                .aggregate(extent=Extent(view_class.vector_tile_geom_name))["extent"]
+            )
+            if bbox is None:
+                log.warning(f"No data for layer {layer}, skipping")
+                return
+        tiles = xyz_tiles(bbox, min_zoom, max_zoom)
+        log.info(f"Seeding {layer}: {len(tiles)} tiles at zooms {min_zoom}-{max_zoom}")
+
+        start = time.monotonic()
+        count = write_mbtiles(
+            layer,
+            render_tiles(layer, tiles, n_jobs),
+            minzoom=min_zoom,
+            maxzoom=max_zoom,
+            bounds=",".join(str(v) for v in bbox),
+        )
+        log.info(f"Seeded {layer}: {count} non-empty tiles of {len(tiles)} in {time.monotonic() - start:.0f}s")
+
+    def bench(self, view_name: str | None, samples: int, min_zoom: int | None, max_zoom: int | None, full_geom: bool):
+        views = {r.view_class.__name__: r.view_class for r in tile_routes() if r.is_xyz}
+        if view_name not in views:
+            raise CommandError(f"--view must be one of {sorted(views)}")
+        view = views[view_name]()
+        if full_geom:
+            view.use_simplified_geom = False
+        # Tiles around random features, so we measure tiles that have data
+        geom_name = view.vector_tile_geom_name
+        points = (
+            view.get_vector_tile_queryset()
+            .exclude(**{geom_name: None})
+            .annotate(bench_centroid=Centroid(geom_name))
+            .order_by("?")
+            .values_list("bench_centroid", flat=True)[:samples]
+        )
+        points = [(p.x, p.y) for p in points]
+        if not points:
+            raise CommandError(f"No features for {view_name}")
+        # Time the DB render, not a pre-rendered MBTiles file
+        render = getattr(view, "render_tile", view.get_tile)
+        min_zoom = 12 if min_zoom is None else min_zoom
+        max_zoom = 17 if max_zoom is None else max_zoom
+        log.info(f"{view_name}: {len(points)} tiles per zoom{', full geometry' if full_geom else ''}")
+        for z in range(min_zoom, max_zoom + 1):
+            times, sizes = [], []
+            for lon, lat in points:
+                x, y = lonlat_to_xyz(lon, lat, z)
+                start = time.perf_counter()
+                tile = render(x, y, z)
+                times.append((time.perf_counter() - start) * 1000)
+                sizes.append(len(tile) / 1024)
+            p95 = statistics.quantiles(times, n=20)[-1] if len(times) > 1 else times[0]
+            log.info(
+                f"z{z}: {statistics.mean(times):.1f}ms mean, {p95:.1f}ms p95, "
+                f"{statistics.mean(sizes):.1f}KB mean, {max(sizes):.1f}KB max"
+            )
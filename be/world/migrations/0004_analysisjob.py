@@ -0,0 +1,68 @@
+# Generated by Django 4.2.2 on 2026-10-19 17:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("world", "0003_delete_user"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AnalysisJob",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "Pending"),
+                            ("RUNNING", "Running"),
+                            ("DONE", "Done"),
+                            ("FAILED", "Failed"),
+                        ],
+                        default="PENDING",
+                        max_length=10,
+                    ),
+                ),
+                ("error", models.TextField(blank=True, null=True)),
+                ("num_requests", models.IntegerField(default=1)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("started", models.DateTimeField(blank=True, null=True)),
+                ("finished", models.DateTimeField(blank=True, null=True)),
+                (
+                    "analyzed_listing",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="world.analyzedlisting",
+                    ),
+                ),
+                (
+                    "listing",
+                    models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="world.propertylisting"),
+                ),
+                (
+                    "parcel",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="world.parcel", to_field="apn"
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [models.Index(fields=["status", "created"], name="world_analy_status_6d3bb8_idx")],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="analysisjob",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status__in", ["PENDING", "RUNNING"])),
+                fields=("parcel",),
+                name="unique_active_analysis_job_per_parcel",
+            ),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.2 on 2026-10-19 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("world", "0004_analysisjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RentSurface",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("br", models.IntegerField()),
+                ("ba", models.IntegerField()),
+                ("percentile", models.IntegerField()),
+                ("crs", models.CharField(max_length=200)),
+                ("origin_x", models.FloatField()),
+                ("origin_y", models.FloatField()),
+                ("cell_size", models.FloatField()),
+                ("nx", models.IntegerField()),
+                ("ny", models.IntegerField()),
+                ("max_distance", models.FloatField()),
+                ("rents", models.BinaryField()),
+                ("confidence", models.BinaryField()),
+                ("num_cells_with_data", models.IntegerField()),
+                ("built", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(fields=("br", "ba", "percentile"), name="unique_rent_surface")
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.2 on 2026-10-19 19:05
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("world", "0005_rentsurface"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="parcel",
+            name="geom_z12",
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, null=True, srid=4326),
+        ),
+        migrations.AddField(
+            model_name="parcel",
+            name="geom_z14",
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, null=True, srid=4326),
+        ),
+    ]
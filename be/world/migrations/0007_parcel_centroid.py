@@ -0,0 +1,23 @@
+# Generated by Django 4.2.2 on 2026-10-19 19:40
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("world", "0006_parcel_geom_z12_parcel_geom_z14"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="parcel",
+            name="centroid",
+            field=django.contrib.gis.db.models.fields.PointField(blank=True, null=True, srid=4326),
+        ),
+        migrations.RunSQL(
+            "UPDATE world_parcel SET centroid = ST_Centroid(geom) WHERE geom IS NOT NULL",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 4.2.2 on 2026-10-19 20:10
+
+from django.db import migrations, models
+
+# Backfill the promoted columns from details. Only numeric JSON values are cast; anything else stays null.
+BACKFILL_SQL = """
+UPDATE world_analyzedlisting SET
+    max_cap_rate = CASE WHEN jsonb_typeof(details->'max_cap_rate') = 'number' THEN (details->>'max_cap_rate')::double precision END,
+    parcel_size = CASE WHEN jsonb_typeof(details->'parcel_size') = 'number' THEN (details->>'parcel_size')::double precision END,
+    avail_area_by_far = CASE WHEN jsonb_typeof(details->'avail_area_by_FAR') = 'number' THEN (details->>'avail_area_by_FAR')::double precision END,
+    total_added_area = CASE WHEN jsonb_typeof(details->'total_added_area') = 'number' THEN (details->>'total_added_area')::double precision END,
+    new_far = CASE WHEN jsonb_typeof(details->'new_FAR') = 'number' THEN (details->>'new_FAR')::double precision END,
+    num_new_buildings = CASE WHEN jsonb_typeof(details->'num_new_buildings') = 'number' THEN (details->>'num_new_buildings')::numeric::integer END,
+    total_new_units = CASE WHEN jsonb_typeof(details->'total_new_units') = 'number' THEN (details->>'total_new_units')::numeric::integer END,
+    garage_con_units = CASE WHEN jsonb_typeof(details->'garage_con_units') = 'number' THEN (details->>'garage_con_units')::numeric::integer END
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("world", "0007_parcel_centroid"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="analyzedlisting",
+            name="max_cap_rate",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="analyzedlisting",
+            name="parcel_size",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="analyzedlisting",
+            name="avail_area_by_far",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="analyzedlisting",
+            name="total_added_area",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="analyzedlisting",
+            name="new_far",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="analyzedlisting",
+            name="num_new_buildings",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="analyzedlisting",
+            name="total_new_units",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="analyzedlisting",
+            name="garage_con_units",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="analyzedlisting",
+            index=models.Index(fields=["max_cap_rate"], name="world_analy_max_cap_d60914_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="analyzedlisting",
+            index=models.Index(fields=["parcel_size"], name="world_analy_parcel__dfabc1_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="analyzedlisting",
+            index=models.Index(fields=["avail_area_by_far"], name="world_analy_avail_a_ba6ea4_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="analyzedlisting",
+            index=models.Index(fields=["total_added_area"], name="world_analy_total_a_0bec07_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="analyzedlisting",
+            index=models.Index(fields=["new_far"], name="world_analy_new_far_18c238_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="analyzedlisting",
+            index=models.Index(fields=["num_new_buildings"], name="world_analy_num_new_fd2058_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="analyzedlisting",
+            index=models.Index(fields=["total_new_units"], name="world_analy_total_n_b65786_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="analyzedlisting",
+            index=models.Index(fields=["garage_con_units"], name="world_analy_garage__5cbe42_idx"),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
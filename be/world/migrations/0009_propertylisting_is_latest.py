@@ -0,0 +1,32 @@
+# Generated by Django 4.2.2 on 2026-10-19 20:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("world", "0008_analyzedlisting_promoted_metrics"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="propertylisting",
+            name="is_latest",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name="propertylisting",
+            index=models.Index(
+                condition=models.Q(("is_latest", True)), fields=["status"], name="world_listing_latest_status_idx"
+            ),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE world_propertylisting SET is_latest = true WHERE id IN (
+                SELECT DISTINCT ON (mlsid) id FROM world_propertylisting ORDER BY mlsid, founddate DESC, id DESC
+            )
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.2 on 2026-10-19 21:15
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("world", "0009_propertylisting_is_latest"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="parcel",
+            name="search_address",
+            field=models.CharField(blank=True, default="", max_length=100),
+        ),
+        # Same as lower(Parcel.address)
+        migrations.RunSQL(
+            """
+            UPDATE world_parcel SET search_address = lower(concat_ws(
+                ' ', situs_addr::text, NULLIF(situs_pre_field, ''), NULLIF(situs_stre, ''), NULLIF(situs_suff, ''),
+                NULLIF(situs_post, '')
+            ))
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name="parcel",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_address"], name="world_parcel_search_addr_trgm", opclasses=["gin_trgm_ops"]
+            ),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.2 on 2026-10-19 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("world", "0010_parcel_search_address"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DataVersion",
+            fields=[
+                ("name", models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ("updated", models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="analyzedparcel",
+            name="ab2011_computed",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="analyzedparcel",
+            name="ab2011_result",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.2 on 2026-10-19 23:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("world", "0011_dataversion_analyzedparcel_ab2011_result"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="analysisjob",
+            name="heartbeat",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -9,5 +9,9 @@ from .base_models import (
     ZoningBase,
     ZoningMapLabel,
 )
-from .models import AnalyzedListing, AnalyzedParcel, ParcelSlope, PropertyListing
-from .rental_data import RentalData
+from .models import AnalyzedListing, AnalyzedParcel, DataVersion, ParcelSlope, PropertyListing
+from .rental_data import RentalData, RentSurface
+
+# isort: split
+# must come after the models it references
+from .analysis_job import AnalysisJob
@@ -0,0 +1,127 @@
+import datetime
+
+from django.contrib.gis.db import models
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from world.models import AnalyzedListing, Parcel, PropertyListing
+
+
+class AnalysisJob(models.Model):
+    """A request to (re-)run parcel analysis, processed out of band by the `analysis_worker` command.
+
+    At most one job per parcel can be pending or running at a time (enforced by a partial unique constraint), so
+    concurrent requests for the same APN are coalesced into one job.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING"
+        RUNNING = "RUNNING"
+        DONE = "DONE"
+        FAILED = "FAILED"
+
+    ACTIVE_STATUSES = [Status.PENDING, Status.RUNNING]
+
+    parcel = models.ForeignKey(Parcel, on_delete=models.CASCADE, to_field="apn")
+    listing = models.ForeignKey(PropertyListing, on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    # Result of the job, once it's done
+    analyzed_listing = models.ForeignKey(AnalyzedListing, on_delete=models.SET_NULL, null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    # number of requests that were coalesced into this job, including the first one
+    num_requests = models.IntegerField(default=1)
+
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    # last time the worker running the job reported it's still working on it, see beat()
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["parcel"],
+                condition=Q(status__in=["PENDING", "RUNNING"]),
+                name="unique_active_analysis_job_per_parcel",
+            ),
+        ]
+
+    def __str__(self):
+        return f"AnalysisJob {self.pk} ({self.parcel_id}): {self.status}"
+
+    @classmethod
+    def enqueue(cls, property_listing: PropertyListing) -> "AnalysisJob":
+        """Queue an analysis of the listing's parcel, or return the already-active job for that parcel."""
+        for _ in range(2):
+            existing = cls.objects.filter(parcel_id=property_listing.parcel_id, status__in=cls.ACTIVE_STATUSES)
+            if existing.update(num_requests=models.F("num_requests") + 1):
+                job = existing.first()
+                if job:
+                    return job
+            try:
+                with transaction.atomic():
+                    return cls.objects.create(parcel_id=property_listing.parcel_id, listing=property_listing)
+            except IntegrityError:
+                # Lost the race with a concurrent request for the same parcel; join its job instead.
+                continue
+        raise RuntimeError(f"Couldn't enqueue analysis job for parcel {property_listing.parcel_id}")
+
+    @classmethod
+    def claim_next(cls) -> "AnalysisJob | None":
+        """Atomically take the oldest pending job and mark it as running. Safe to call from multiple workers."""
+        with transaction.atomic():
+            job = (
+                cls.objects.select_for_update(skip_locked=True)
+                .filter(status=cls.Status.PENDING)
+                .order_by("created")
+                .first()
+            )
+            if not job:
+                return None
+            job.status = cls.Status.RUNNING
+            job.started = job.heartbeat = datetime.datetime.now(datetime.UTC)
+            job.save(update_fields=["status", "started", "heartbeat"])
+        return job
+
+    @classmethod
+    def beat(cls, job_ids: list[int]) -> set[int]:
+        """Record that the jobs are still being worked on. Returns the ids of the ones that are still running."""
+        running = set(cls.objects.filter(pk__in=job_ids, status=cls.Status.RUNNING).values_list("pk", flat=True))
+        cls.objects.filter(pk__in=running, status=cls.Status.RUNNING).update(
+            heartbeat=datetime.datetime.now(datetime.UTC)
+        )
+        return running
+
+    @classmethod
+    def fail_stale(cls, timeout: datetime.timedelta) -> int:
+        """Mark running jobs without a heartbeat for longer than timeout as failed (eg. their worker died). Jobs
+        that are slow but still being worked on keep beating, so they aren't failed. Returns the number of jobs
+        marked."""
+        now = datetime.datetime.now(datetime.UTC)
+        cutoff = now - timeout
+        return (
+            cls.objects.filter(status=cls.Status.RUNNING)
+            .filter(Q(heartbeat__lt=cutoff) | Q(heartbeat__isnull=True, started__lt=cutoff))
+            .update(status=cls.Status.FAILED, finished=now, error="No heartbeat (worker died?)")
+        )
+
+    def mark_done(self, analyzed_listing: AnalyzedListing):
+        self.status = self.Status.DONE
+        self.analyzed_listing = analyzed_listing
+        self.finished = datetime.datetime.now(datetime.UTC)
+        self.save(update_fields=["status", "analyzed_listing", "finished"])
+
+    def mark_failed(self, error: str):
+        self.status = self.Status.FAILED
+        self.error = error
+        self.finished = datetime.datetime.now(datetime.UTC)
+        self.save(update_fields=["status", "error", "finished"])
+
+    def queue_position(self) -> int | None:
+        """Number of pending jobs ahead of this one, or None if this job isn't pending"""
+        if self.status != self.Status.PENDING:
+            return None
+        return AnalysisJob.objects.filter(status=self.Status.PENDING, created__lt=self.created).count()
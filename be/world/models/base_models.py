@@ -1,4 +1,5 @@
 from django.contrib.gis.db import models
+from django.contrib.postgres.indexes import GinIndex
 from pydantic import BaseModel
 
 
@@ -102,6 +103,28 @@ class Parcel(models.Model):
     shape_star = models.FloatField()
     shape_stle = models.FloatField()
     geom = models.MultiPolygonField(srid=4326, blank=True, null=True)
+    # Simplified copies of geom for low zoom map tiles, see world/infra/tile_geometry.py
+    geom_z12 = models.MultiPolygonField(srid=4326, blank=True, null=True)
+    geom_z14 = models.MultiPolygonField(srid=4326, blank=True, null=True)
+    # Stored so listing queries don't load and process the full geometry. Kept up to date by save().
+    centroid = models.PointField(srid=4326, blank=True, null=True)
+    # Lowercased address, trigram indexed for address typeahead. Kept up to date by save().
+    search_address = models.CharField(max_length=100, blank=True, default="")
+
+    # Fields the address index (lib/parcel_analysis_2022/address_index.py) is built from
+    ADDRESS_FIELDS = frozenset(["situs_addr", "situs_stre", "situs_pre_field", "situs_suff", "situs_juri"])
+
+    def save(self, *args, **kwargs):
+        self.centroid = self.geom.centroid if self.geom else None
+        self.search_address = self.address.lower()
+        edited = not self._state.adding
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if edited and (update_fields is None or self.ADDRESS_FIELDS.intersection(update_fields)):
+            # models.py imports this module
+            from .models import PARCEL_ADDRESS_VERSION, DataVersion
+
+            DataVersion.bump(PARCEL_ADDRESS_VERSION, using=self._state.db)
 
     @property
     def garages(self) -> int:
@@ -178,7 +201,11 @@ class Parcel(models.Model):
         return base_str + lot_str
 
     class Meta:
-        indexes = [models.Index(fields=["apn"]), models.Index(fields=["situs_addr"])]
+        indexes = [
+            models.Index(fields=["apn"]),
+            models.Index(fields=["situs_addr"]),
+            GinIndex(fields=["search_address"], opclasses=["gin_trgm_ops"], name="world_parcel_search_addr_trgm"),
+        ]
 
 
 class TopographyLoads(models.Model):
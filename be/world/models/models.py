@@ -4,7 +4,7 @@ from collections import defaultdict
 
 from django.contrib.gis.db import models
 from django.contrib.postgres.fields import ArrayField
-from django.db.models import Subquery
+from django.db.models import Count, Max, Q, Subquery
 from lib.parcel_analysis_2022.types import CheckResultEnum
 
 from world.models import Parcel, Roads
@@ -37,9 +37,46 @@ class AnalyzedRoad(models.Model):
         ]
 
 
+class DataVersion(models.Model):
+    """When a dataset (a model's table, or a named part of one) last changed, so results computed from it can tell
+    they're stale. Loaders call DataVersion.bump(Model) after writing the table."""
+
+    name = models.CharField(max_length=100, primary_key=True)  # model label, eg. "world.ZoningBase"
+    updated = models.DateTimeField()
+
+    @staticmethod
+    def _name(dataset: type[models.Model] | str) -> str:
+        return dataset if isinstance(dataset, str) else dataset._meta.label
+
+    @classmethod
+    def bump(cls, *datasets: type[models.Model] | str, using: str = "default") -> None:
+        now = datetime.datetime.now(datetime.UTC)
+        for dataset in datasets:
+            cls.objects.using(using).update_or_create(name=cls._name(dataset), defaults={"updated": now})
+
+    @classmethod
+    def latest(cls, *datasets: type[models.Model] | str, using: str = "default") -> datetime.datetime | None:
+        """When the most recently changed of the datasets changed, or None if none were ever bumped"""
+        names = [cls._name(d) for d in datasets]
+        return cls.objects.using(using).filter(name__in=names).aggregate(latest=Max("updated"))["latest"]
+
+    @classmethod
+    def versions(cls) -> dict[str, datetime.datetime]:
+        """Dataset name -> when it last changed, for every dataset that was ever bumped"""
+        return dict(cls.objects.values_list("name", "updated"))
+
+
+# Parcels' address fields, which the address index is built from. Bumped separately from Parcel so an address fix
+# doesn't make results computed from the rest of Parcel (eg. AB2011 eligibility) stale.
+PARCEL_ADDRESS_VERSION = "world.Parcel.address"
+
+
 class AnalyzedParcel(models.Model):
     apn = models.OneToOneField(max_length=10, unique=True, primary_key=True, to=Parcel, on_delete=models.CASCADE)
     ab2011_eligible = models.CharField(max_length=20, choices=[(x.value, x.name) for x in CheckResultEnum])
+    # The AB2011Eligible check tree with notes, and when it was computed. See lib/co/co_eligibility_lib.py.
+    ab2011_result = models.JSONField(null=True, blank=True)
+    ab2011_computed = models.DateTimeField(null=True, blank=True)
     # lot_size = models.IntegerField(blank=True, null=True)
     # building_size = models.IntegerField(blank=True, null=True)
     # skip = models.BooleanField(blank=True, null=True)
@@ -99,14 +136,41 @@ class PropertyListing(models.Model):
         #  hence the name is semantically opposite of previous.
         related_name="next_listing",
     )
+    # Whether this is the latest (by founddate) listing for its mlsid. Maintained by refresh_latest(), which save()
+    # calls; callers that bulk_create() or update() listings call it themselves.
+    is_latest = models.BooleanField(default=False)
+
+    # Statuses of listings we're tracking
+    TRACKED_STATUSES = (ListingStatus.ACTIVE, ListingStatus.OFFMARKET)
 
     class Meta:
         indexes = [
             models.Index(fields=["zipcode"]),
             models.Index(fields=["mlsid"]),
             models.Index(fields=["parcel"]),
+            models.Index(fields=["status"], condition=Q(is_latest=True), name="world_listing_latest_status_idx"),
         ]
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or {"mlsid", "founddate"} & set(update_fields):
+            self.refresh_latest([self.mlsid])
+
+    def delete(self, *args, **kwargs):
+        mlsid = self.mlsid
+        result = super().delete(*args, **kwargs)
+        self.refresh_latest([mlsid])
+        return result
+
+    @classmethod
+    def refresh_latest(cls, mlsids: list[str] | None = None):
+        """Recompute is_latest for the listings with these mlsids, or for every listing"""
+        listings = cls.objects.all() if mlsids is None else cls.objects.filter(mlsid__in=mlsids)
+        latest = Subquery(listings.order_by("mlsid", "-founddate", "-id").distinct("mlsid").values("pk"))
+        listings.filter(is_latest=True).exclude(pk__in=latest).update(is_latest=False)
+        listings.filter(is_latest=False, pk__in=latest).update(is_latest=True)
+
     @classmethod
     def get_latest_or_create(cls, parcel):
         try:
@@ -126,42 +190,37 @@ class PropertyListing(models.Model):
     @classmethod
     def active_listings_queryset(cls):
         """Find listings where the latest listing is active or OFFMARKET (meaning we are tracking it)."""
-        latest_entries = Subquery(cls.objects.order_by("mlsid", "-founddate").distinct("mlsid").values("pk"))
-        listings = (
-            cls.objects.filter(pk__in=latest_entries)
-            .filter(status__in=["ACTIVE", "OFFMARKET"])
-            .prefetch_related("parcel")
-        )
-        return listings
+        return cls.objects.filter(is_latest=True, status__in=cls.TRACKED_STATUSES).prefetch_related("parcel")
 
     @classmethod
     def mark_all_stale(cls, days_for_stale: int) -> dict:
         """Find all stale listings, meaning ones that haven't been seen in N days, and mark them as "MISSING".
         Returns a stats dictionary."""
-        listings = cls.active_listings_queryset().prefetch_related("parcel")
+        listings = cls.active_listings_queryset()
         now = datetime.datetime.now(datetime.UTC)
-        stale_listings = []
-        stats = defaultdict(int)
+        cutoff = now - datetime.timedelta(days=days_for_stale)
         logging.info("Looking for stale listings:")
-        for listing in listings:
-            days_since_seen = (now - listing.seendate).days
-            if days_since_seen < days_for_stale:
-                if listing.parcel:
-                    stats["seen_recently"] += 1
-                else:
-                    stats["seen_recently_no_parcel"] += 1
-            elif not listing.parcel:
-                stats["stale_no_parcel"] += 1
-            else:
-                stats["stale"] += 1
-                prev_listing_id = listing.pk
-                # Duplicate this entry and record it as 'missing'
-                listing.pk = None
-                listing.prev_listing_id = prev_listing_id
-                listing.status = cls.ListingStatus.MISSING
-                listing._state.adding = True
-                listing.save()
-                stale_listings.append(listing)
+        # Only the stale listings with a parcel need to come back from the DB; count the rest there
+        stats = defaultdict(
+            int,
+            listings.aggregate(
+                seen_recently=Count("id", filter=Q(seendate__gt=cutoff, parcel__isnull=False)),
+                seen_recently_no_parcel=Count("id", filter=Q(seendate__gt=cutoff, parcel__isnull=True)),
+                stale_no_parcel=Count("id", filter=Q(seendate__lte=cutoff, parcel__isnull=True)),
+            ),
+        )
+        stale_listings = []
+        for listing in listings.filter(seendate__lte=cutoff, parcel__isnull=False):
+            stats["stale"] += 1
+            prev_listing_id = listing.pk
+            # Duplicate this entry and record it as 'missing'
+            listing.pk = None
+            listing.prev_listing_id = prev_listing_id
+            listing.status = cls.ListingStatus.MISSING
+            listing._state.adding = True
+            stale_listings.append(listing)
+        cls.objects.bulk_create(stale_listings)
+        cls.refresh_latest([listing.mlsid for listing in stale_listings])
         return stats
 
 
@@ -180,3 +239,47 @@ class AnalyzedListing(models.Model):
     dev_scenarios = models.JSONField(null=True, blank=True)
     input_parameters = models.JSONField()
     geometry_details = models.JSONField()
+
+    # Metrics copied out of `details` into typed, indexed columns, so the listings page can sort by them. Filled
+    # from details on save(); bulk_create() callers call promote_details() themselves.
+    max_cap_rate = models.FloatField(null=True, blank=True)
+    parcel_size = models.FloatField(null=True, blank=True)
+    avail_area_by_far = models.FloatField(null=True, blank=True)
+    total_added_area = models.FloatField(null=True, blank=True)
+    new_far = models.FloatField(null=True, blank=True)
+    num_new_buildings = models.IntegerField(null=True, blank=True)
+    total_new_units = models.IntegerField(null=True, blank=True)
+    garage_con_units = models.IntegerField(null=True, blank=True)
+
+    # details key -> column
+    DETAILS_COLUMNS = {
+        "max_cap_rate": "max_cap_rate",
+        "parcel_size": "parcel_size",
+        "avail_area_by_FAR": "avail_area_by_far",
+        "total_added_area": "total_added_area",
+        "new_FAR": "new_far",
+        "num_new_buildings": "num_new_buildings",
+        "total_new_units": "total_new_units",
+        "garage_con_units": "garage_con_units",
+    }
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["max_cap_rate"]),
+            models.Index(fields=["parcel_size"]),
+            models.Index(fields=["avail_area_by_far"]),
+            models.Index(fields=["total_added_area"]),
+            models.Index(fields=["new_far"]),
+            models.Index(fields=["num_new_buildings"]),
+            models.Index(fields=["total_new_units"]),
+            models.Index(fields=["garage_con_units"]),
+        ]
+
+    def promote_details(self):
+        """Copy the promoted metrics from details into their columns"""
+        for key, column in self.DETAILS_COLUMNS.items():
+            setattr(self, column, (self.details or {}).get(key))
+
+    def save(self, *args, **kwargs):
+        self.promote_details()
+        super().save(*args, **kwargs)
@@ -1,7 +1,11 @@
 from django.contrib.gis.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 from world.models import Parcel
 
+from .models import DataVersion
+
 
 class RentalData(models.Model):
     class RentalDataType(models.TextChoices):
@@ -36,3 +40,44 @@ class RentalData(models.Model):
                 f" {self.br}BR,{self.ba}BA: Mean={self.details['mean']}, "
                 f"75th percentile={self.details['percentile_75']}"
             )
+
+
+class RentSurface(models.Model):
+    """Rent for one unit type and percentile, interpolated from RentalData onto a square grid (in a projected CRS,
+    so cells are cell_size meters square). Built by `./manage.py rent_data build_surface`; see
+    lib/parcel_analysis_2022/rent_surface.py."""
+
+    br = models.IntegerField()
+    ba = models.IntegerField()
+    percentile = models.IntegerField()
+
+    crs = models.CharField(max_length=200)
+    origin_x = models.FloatField()  # lower-left corner of the grid
+    origin_y = models.FloatField()
+    cell_size = models.FloatField()
+    nx = models.IntegerField()
+    ny = models.IntegerField()
+    # RentalData further than this (in meters) from a cell's center didn't contribute to it
+    max_distance = models.FloatField()
+
+    # ny x nx row-major arrays: rents as float32 (NaN where there's no data), confidence as uint8 (0-255)
+    rents = models.BinaryField()
+    confidence = models.BinaryField()
+    num_cells_with_data = models.IntegerField()
+    built = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["br", "ba", "percentile"], name="unique_rent_surface")]
+
+    def __str__(self):
+        return f"RentSurface {self.br}BR,{self.ba}BA p{self.percentile}: {self.nx}x{self.ny} x {self.cell_size}m"
+
+
+@receiver(post_save, sender=RentalData, dispatch_uid="rental_data_version_post_save")
+def _rental_data_saved(sender, instance: RentalData, using: str, **kwargs):
+    DataVersion.bump(RentalData, using=using)
+
+
+@receiver(post_delete, sender=RentalData, dispatch_uid="rental_data_version_post_delete")
+def _rental_data_deleted(sender, instance: RentalData, using: str, **kwargs):
+    DataVersion.bump(RentalData, using=using)
@@ -1 +1,600 @@
-# Create your tests here.
+import datetime
+import gzip
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.gis.geos import MultiPolygon, Point, Polygon
+from django.core.cache import caches
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import reverse
+from lib.co import co_eligibility_lib
+from lib.co.co_eligibility_lib import ab2011_result
+from lib.parcel_analysis_2022.address_index import ParcelAddress, ParcelAddressIndex
+from lib.parcel_analysis_2022.listings_lib import address_to_parcel, address_to_parcels_loose, normalize_address_query
+
+from world.api import _get_rental_rates
+from world.infra.django_cache import h3_cache_page
+from world.infra.keyset_pagination import KeysetPagination, keyset_order
+from world.infra.mbtiles import get_mbtiles, write_mbtiles
+from world.infra.sqlite_cache import ShardedSQLiteCache
+from world.infra.tile_geometry import band_tolerances, geom_column_for_zoom, simplify_parcel_geometries
+from world.infra.tile_refresh import TileRoute, changed_bboxes, invalidate_tiles, tile_routes
+from world.models import (
+    AnalysisJob,
+    AnalyzedListing,
+    AnalyzedParcel,
+    DataVersion,
+    Parcel,
+    PropertyListing,
+    RentalData,
+    ZoningBase,
+)
+from world.models.models import PARCEL_ADDRESS_VERSION
+
+
+@pytest.fixture()
+def parcel(db):
+    return Parcel.objects.create(
+        apn="4151234500",
+        parcelid=1,
+        fractint=0,
+        situs_addr=1234,
+        situs_stre="MAIN",
+        situs_suff="ST",
+        asr_land=0,
+        asr_impr=0,
+        asr_total=0,
+        acreage=0.1,
+        asr_zone=0,
+        asr_landus=0,
+        unitqty=1,
+        total_lvg_field=1000,
+        addition_a=0,
+        nucleus_si=0,
+        nucleus_1=0,
+        x_coord=0,
+        y_coord=0,
+        overlay_ju="SD",
+        sub_type=0,
+        shape_star=0,
+        shape_stle=0,
+    )
+
+
+class TestAnalysisJob:
+    @pytest.mark.django_db
+    def test_enqueue_coalesces_active_jobs(self, parcel):
+        listing = PropertyListing.get_latest_or_create(parcel)
+        job = AnalysisJob.enqueue(listing)
+        assert AnalysisJob.enqueue(listing).pk == job.pk
+
+        # still coalesced while running
+        assert AnalysisJob.claim_next().pk == job.pk
+        job.refresh_from_db()
+        assert job.status == AnalysisJob.Status.RUNNING
+        assert job.num_requests == 2
+        assert AnalysisJob.enqueue(listing).pk == job.pk
+        assert AnalysisJob.claim_next() is None
+
+        # once finished, a new request makes a new job
+        job.mark_failed("boom")
+        new_job = AnalysisJob.enqueue(listing)
+        assert new_job.pk != job.pk
+        assert new_job.status == AnalysisJob.Status.PENDING
+        assert new_job.queue_position() == 0
+
+    @pytest.mark.django_db
+    def test_fail_stale_spares_jobs_with_a_heartbeat(self, parcel):
+        AnalysisJob.enqueue(PropertyListing.get_latest_or_create(parcel))
+        job = AnalysisJob.claim_next()
+        long_ago = datetime.datetime.now(datetime.UTC) - datetime.timedelta(hours=2)
+        # Slow, but its worker is still beating
+        AnalysisJob.objects.filter(pk=job.pk).update(started=long_ago)
+        assert AnalysisJob.beat([job.pk]) == {job.pk}
+        assert AnalysisJob.fail_stale(datetime.timedelta(minutes=5)) == 0
+        # Its worker died
+        AnalysisJob.objects.filter(pk=job.pk).update(heartbeat=long_ago)
+        assert AnalysisJob.fail_stale(datetime.timedelta(minutes=5)) == 1
+        job.refresh_from_db()
+        assert job.status == AnalysisJob.Status.FAILED
+        assert AnalysisJob.beat([job.pk]) == set()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_done_after_figures_are_published(self, parcel, monkeypatch):
+        from lib.parcel_analysis_2022 import figures_lib
+        from lib.parcel_analysis_2022.figures_lib import FigurePublisher
+
+        from world.management.commands import analysis_worker
+
+        listing = PropertyListing.get_latest_or_create(parcel)
+        AnalysisJob.enqueue(listing)
+        job = AnalysisJob.claim_next()
+        analyzed = AnalyzedListing.objects.create(
+            listing=listing,
+            parcel=parcel,
+            details={"messages": {"warning": []}},
+            input_parameters={},
+            geometry_details={},
+        )
+        uploading = threading.Event()
+
+        def publish_parcel_figures(figures, image_store, save_dir):
+            uploading.wait(10)
+            raise OSError("R2 is down")
+
+        monkeypatch.setattr(
+            analysis_worker, "analyze_one_parcel", lambda *args, **kwargs: (analyzed, SimpleNamespace(apn=parcel.apn))
+        )
+        monkeypatch.setattr(figures_lib, "publish_parcel_figures", publish_parcel_figures)
+        with FigurePublisher(None) as publisher:
+            analysis_worker.run_analysis_job(job, publisher)
+            job.refresh_from_db()
+            assert job.status == AnalysisJob.Status.RUNNING
+            uploading.set()
+        job.refresh_from_db()
+        assert job.status == AnalysisJob.Status.DONE
+        analyzed.refresh_from_db()
+        assert analyzed.details["messages"]["warning"] == ["Couldn't publish images: R2 is down"]
+
+
+class TestPropertyListing:
+    @pytest.mark.django_db
+    def test_latest_listing_per_mlsid(self, parcel):
+        first = PropertyListing.objects.create(addr="1 Main St", mlsid="A1", price=100, status="ACTIVE")
+        other = PropertyListing.objects.create(addr="2 Main St", mlsid="B2", price=100, status="ACTIVE")
+        assert set(PropertyListing.active_listings_queryset()) == {first, other}
+
+        # A price change is a new listing, which replaces the old one
+        second = PropertyListing.objects.create(addr="1 Main St", mlsid="A1", price=90, status="ACTIVE")
+        assert set(PropertyListing.active_listings_queryset()) == {second, other}
+        first.refresh_from_db()
+        assert not first.is_latest
+
+        # A sold listing isn't active, and neither are the listings before it
+        PropertyListing.objects.create(addr="2 Main St", mlsid="B2", price=100, status="SOLD")
+        assert set(PropertyListing.active_listings_queryset()) == {second}
+
+        second.delete()
+        assert set(PropertyListing.active_listings_queryset()) == {first}
+
+    @pytest.mark.django_db
+    def test_mark_all_stale(self, parcel):
+        listing = PropertyListing.objects.create(
+            addr="1 Main St", mlsid="A1", price=100, status="ACTIVE", parcel=parcel
+        )
+        PropertyListing.objects.create(addr="2 Main St", mlsid="B2", price=100, status="ACTIVE")
+        PropertyListing.objects.filter(pk=listing.pk).update(
+            seendate=datetime.datetime(2020, 1, 1, tzinfo=datetime.UTC)
+        )
+
+        stats = PropertyListing.mark_all_stale(days_for_stale=5)
+        assert stats["stale"] == 1
+        assert stats["seen_recently_no_parcel"] == 1
+        missing = PropertyListing.objects.get(mlsid="A1", is_latest=True)
+        assert missing.status == PropertyListing.ListingStatus.MISSING
+        assert missing.prev_listing_id == listing.pk
+        assert not PropertyListing.active_listings_queryset().filter(mlsid="A1").exists()
+
+
+class TestAnalyzedListing:
+    @pytest.mark.django_db
+    def test_save_promotes_details(self, parcel):
+        listing = PropertyListing.get_latest_or_create(parcel)
+        analyzed = AnalyzedListing.objects.create(
+            listing=listing,
+            parcel=parcel,
+            details={"max_cap_rate": 0.065, "new_FAR": 0.8, "total_new_units": 3, "address": "1234 MAIN ST"},
+            input_parameters={},
+            geometry_details={},
+        )
+        analyzed.refresh_from_db()
+        assert analyzed.max_cap_rate == 0.065
+        assert analyzed.new_far == 0.8
+        assert analyzed.total_new_units == 3
+        assert analyzed.total_added_area is None
+
+        analyzed.details["max_cap_rate"] = 0.07
+        analyzed.save()
+        assert AnalyzedListing.objects.filter(max_cap_rate=0.07).count() == 1
+
+
+class TestKeysetPagination:
+    @pytest.mark.django_db
+    @pytest.mark.parametrize("descending", [False, True])
+    def test_pages_cover_every_row_once(self, descending):
+        # Ties and nulls in the sort key
+        for price in [300, None, 100, 200, 100, None, 300, 100]:
+            PropertyListing.objects.create(addr="1 Main St", price=price, status="ACTIVE")
+        listings = keyset_order(PropertyListing.objects.all(), F("price"), descending=descending)
+        expected = list(listings.values_list("id", flat=True))
+        paginator = KeysetPagination()
+
+        seen, cursor = [], None
+        while True:
+            page = paginator.paginate_queryset(listings, KeysetPagination.Input(limit=3, cursor=cursor))
+            assert page["count"] == 8
+            seen.extend(listing.id for listing in page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert seen == expected
+        # Nulls last either way
+        assert PropertyListing.objects.get(id=seen[-1]).price is None
+
+        # Offsets give the same pages
+        page = paginator.paginate_queryset(listings, KeysetPagination.Input(limit=3, offset=3))
+        assert [listing.id for listing in page["items"]] == expected[3:6]
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize("descending", [False, True])
+    def test_datetime_sort_within_a_millisecond(self, descending):
+        base = datetime.datetime(2026, 10, 19, 12, 0, 0, 500, tzinfo=datetime.UTC)
+        for _ in range(6):
+            PropertyListing.objects.create(addr="1 Main St", status="ACTIVE")
+        # founddate is auto_now_add, so set it after creating. All six are within the same millisecond.
+        for i, listing in enumerate(PropertyListing.objects.order_by("id")):
+            PropertyListing.objects.filter(id=listing.id).update(founddate=base + datetime.timedelta(microseconds=i))
+        listings = keyset_order(PropertyListing.objects.all(), F("founddate"), descending=descending)
+        expected = list(listings.values_list("id", flat=True))
+        paginator = KeysetPagination()
+
+        seen, cursor = [], None
+        while True:
+            page = paginator.paginate_queryset(listings, KeysetPagination.Input(limit=2, cursor=cursor))
+            seen.extend(listing.id for listing in page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert seen == expected
+
+
+class TestRentalRates:
+    @pytest.fixture(autouse=True)
+    def locmem_cache(self, settings):
+        settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+    def add_rental_data(self, parcel, br, mean):
+        details = {"mean": mean, "percentile_75": mean + 500, "samples": 12, "max": mean + 1000}
+        return RentalData.objects.create(
+            parcel=parcel, br=br, ba=1, details=details, location=Point(-117.15, 32.75), data_type="URE"
+        )
+
+    @pytest.mark.django_db
+    def test_payload_etag_and_gzip(self, parcel):
+        self.add_rental_data(parcel, 1, 2000)
+        self.add_rental_data(parcel, 2, 2800)
+        RentalData.objects.create(
+            parcel=parcel, br=3, ba=1, details={"status_code": 402}, location=Point(-117.15, 32.75), data_type="URE"
+        )
+        rf = RequestFactory()
+
+        response = _get_rental_rates(rf.get("/api/world/rentalrates", HTTP_ACCEPT_ENCODING="gzip, br"))
+        assert response.status_code == 200
+        assert response["Content-Encoding"] == "gzip"
+        assert json.loads(gzip.decompress(response.content)) == [
+            {
+                "pid": parcel.apn,
+                "lat": 32.75,
+                "long": -117.15,
+                "rents": {
+                    "2BR,1.0BA": {"rent_mean": 2800, "rent_75_percentile": 3300, "num_samples": 12},
+                    "1BR,1.0BA": {"rent_mean": 2000, "rent_75_percentile": 2500, "num_samples": 12},
+                },
+            }
+        ]
+        etag = response["ETag"]
+
+        response = _get_rental_rates(rf.get("/api/world/rentalrates", HTTP_IF_NONE_MATCH=etag))
+        assert response.status_code == 304
+
+        # new rent data means a new payload
+        self.add_rental_data(parcel, 4, 3500)
+        response = _get_rental_rates(rf.get("/api/world/rentalrates", HTTP_IF_NONE_MATCH=etag))
+        assert response.status_code == 200
+        assert response["ETag"] != etag
+        assert "4BR,1.0BA" in json.loads(response.content)[0]["rents"]
+
+    @pytest.mark.django_db
+    def test_edit_in_place_invalidates_payload(self, parcel):
+        rental_data = self.add_rental_data(parcel, 1, 2000)
+        rf = RequestFactory()
+        etag = _get_rental_rates(rf.get("/api/world/rentalrates"))["ETag"]
+
+        rental_data.details["mean"] = 2100
+        rental_data.save()
+        response = _get_rental_rates(rf.get("/api/world/rentalrates", HTTP_IF_NONE_MATCH=etag))
+        assert response.status_code == 200
+        assert json.loads(response.content)[0]["rents"]["1BR,1.0BA"]["rent_mean"] == 2100
+
+    @pytest.mark.django_db
+    def test_built_payload_is_served_without_scanning_rental_data(self, parcel, django_assert_num_queries):
+        self.add_rental_data(parcel, 1, 2000)
+        rf = RequestFactory()
+        _get_rental_rates(rf.get("/api/world/rentalrates"))
+        # Just the DataVersion lookup
+        with django_assert_num_queries(1):
+            assert _get_rental_rates(rf.get("/api/world/rentalrates")).status_code == 200
+
+
+class TestMBTiles:
+    def test_write_and_serve(self, settings, tmp_path):
+        settings.MBTILES_DIR = tmp_path
+        assert get_mbtiles("zoning") is None
+        tiles = [(12, 714, 1653, b"tile-a"), (12, 715, 1653, b"")]
+        assert write_mbtiles("zoning", [tiles], minzoom=12, maxzoom=12, bounds="-117.2,32.7,-117.1,32.8") == 1
+
+        mbtiles = get_mbtiles("zoning")
+        assert mbtiles.get_tile(12, 714, 1653) == b"tile-a"
+        assert mbtiles.get_tile(12, 715, 1653) == b""  # empty tiles aren't stored
+        assert mbtiles.covers(12, 715, 1653)
+        assert not mbtiles.covers(13, 1428, 3306)  # not a seeded zoom
+        assert not mbtiles.covers(12, 700, 1653)  # out of bounds
+
+        # reseeding swaps in the new file
+        write_mbtiles("zoning", [[(12, 714, 1653, b"tile-b")]], minzoom=12, maxzoom=12)
+        assert get_mbtiles("zoning").get_tile(12, 714, 1653) == b"tile-b"
+
+
+class TestShardedSQLiteCache:
+    def make_cache(self, tmp_path, **options):
+        return ShardedSQLiteCache(str(tmp_path), {"OPTIONS": {"SHARDS": 4, "MAX_ENTRIES": 1000, **options}})
+
+    def test_get_set_add_delete(self, tmp_path):
+        cache = self.make_cache(tmp_path)
+        assert cache.get("a") is None
+        cache.set("a", {"x": 1})
+        assert cache.get("a") == {"x": 1}
+        assert not cache.add("a", 2)
+        assert cache.add("b", 2)
+        assert cache.delete("a")
+        assert not cache.has_key("a")
+        cache.set("c", 3, timeout=-1)  # already expired
+        assert cache.get("c", "default") == "default"
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 2)
+
+    def test_delete_prefix(self, tmp_path):
+        cache = self.make_cache(tmp_path)
+        for z in (12, 13):
+            for x in range(20):
+                cache.set(f"h3:/tile/{z}/{x}/0", b"tile")
+        cache.set("h3:/tiles-other/12/0/0", b"tile")
+        assert cache.delete_prefix("h3:/tile/12/") == 20
+        assert cache.get("h3:/tile/12/3/0") is None
+        assert cache.get("h3:/tile/13/3/0") == b"tile"
+        assert cache.stats()["entries"] == 21
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = self.make_cache(tmp_path, SHARDS=1, MAX_ENTRIES=10)
+        for i in range(11):
+            cache.set(f"k{i}", i)
+        assert cache.stats()["entries"] == 9
+        assert cache.get("k0") is None
+        assert cache.get("k10") == 10
+
+
+class TestH3CacheMiddleware:
+    def test_caches_empty_tiles_for_logged_in_users(self, settings, tmp_path):
+        settings.CACHES = {
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "tiles": {"BACKEND": "world.infra.sqlite_cache.ShardedSQLiteCache", "LOCATION": str(tmp_path)},
+        }
+        calls = []
+
+        @h3_cache_page(60)
+        def tile_view(request):
+            calls.append(request)
+            return HttpResponse(status=204)
+
+        rf = RequestFactory()
+        for _ in range(2):
+            request = rf.get("/dj/api/worldview/zoningtile/12/714/1653", HTTP_COOKIE="sessionid=abc")
+            request.user = get_user_model()(email="someone@example.com")
+            assert tile_view(request).status_code == 204
+        assert len(calls) == 1
+
+        request = rf.get("/dj/api/worldview/zoningtile/12/714/1653")
+        request.user = AnonymousUser()
+        tile_view(request)
+        assert len(calls) == 2  # cached tiles aren't served to anonymous users
+
+
+class TestTileRefresh:
+    def test_changed_bboxes(self):
+        a, b, c = (0, 0, 1, 1), (2, 2, 3, 3), (4, 4, 5, 5)
+        before = {("h1", "['R1']"): [a], ("h2", "['R2']"): [b], ("h3", "['R3']"): [c]}
+        # b's zone changed, c was deleted, a is untouched
+        after = {("h1", "['R1']"): [a], ("h2", "['C1']"): [b]}
+        assert sorted(changed_bboxes(before, after)) == [b, b, c]
+
+    def test_tile_routes(self):
+        routes = {r.route: r for r in tile_routes()}
+        zoning = routes["/dj/api/worldview/zoningtile/<int:z>/<int:x>/<int:y>"]
+        assert zoning.is_xyz
+        assert zoning.path(12, 714, 1653) == "/dj/api/worldview/zoningtile/12/714/1653"
+        raw = routes["/dj/elt/api/tile/raw_geom_data/<str:geo>/<str:datatype>/<str:layer>/<int:z>/<int:x>/<int:y>"]
+        assert not raw.is_xyz
+        assert raw.prefix == "/dj/elt/api/tile/raw_geom_data/"
+
+    def test_invalidate_tiles_only_drops_covered_tiles(self, settings, tmp_path):
+        settings.CACHES = {
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "tiles": {"BACKEND": "world.infra.sqlite_cache.ShardedSQLiteCache", "LOCATION": str(tmp_path)},
+        }
+        route = TileRoute("/tile/<int:z>/<int:x>/<int:y>", object)
+        cache = caches["tiles"]
+        cache.set("h3:/tile/12/714/1653", b"changed")
+        cache.set("h3:/tile/12/100/100", b"unchanged")
+        cache.set("h3:/tile/18/45758/105834", b"changed")
+        assert invalidate_tiles(route, [(-117.1601, 32.7199, -117.1599, 32.7201)]) == 2
+        assert cache.get("h3:/tile/12/100/100") == b"unchanged"
+
+
+class TestParcelTileGeometry:
+    def test_geom_column_for_zoom(self):
+        assert [geom_column_for_zoom(z) for z in (10, 12, 13, 14, 15, 16, 20)] == [
+            "geom_z12",
+            "geom_z12",
+            "geom_z12",
+            "geom_z14",
+            "geom_z14",
+            "geom",
+            "geom",
+        ]
+
+    def test_band_tolerances(self):
+        tolerances = band_tolerances()
+        # Half a pixel at the band's highest zoom
+        assert tolerances["geom_z12"] == pytest.approx(360 / 256 / 2**13 / 2)
+        assert tolerances["geom_z14"] == pytest.approx(tolerances["geom_z12"] / 4)
+
+    def test_simplify_parcel_geometries(self, parcel):
+        # A square with a vertex far too close to a corner to see below zoom 16
+        parcel.geom = MultiPolygon(
+            Polygon(
+                (
+                    (-117.16, 32.72),
+                    (-117.1599, 32.72),
+                    (-117.1599, 32.7201),
+                    (-117.159901, 32.7201),
+                    (-117.16, 32.7201),
+                    (-117.16, 32.72),
+                )
+            ),
+            srid=4326,
+        )
+        parcel.save()
+        assert simplify_parcel_geometries() == 1
+        parcel.refresh_from_db()
+        assert parcel.geom_z12.num_coords < parcel.geom.num_coords
+        assert parcel.geom_z14.num_coords < parcel.geom.num_coords
+        assert parcel.geom_z12.valid
+
+
+class TestAddressTypeahead:
+    def test_normalize_address_query(self):
+        assert normalize_address_query("1234 North Park Boulevard") == "1234 n park blvd"
+        assert normalize_address_query("1234-1236 Main St.") == "1234 main st"
+        assert normalize_address_query("Mount Everest") == "mt everest"
+
+    @pytest.mark.django_db
+    def test_loose_match(self, parcel):
+        assert parcel.search_address == "1234 main st"
+        matches = address_to_parcels_loose("1234 Main Street")
+        assert [p.apn for p in matches] == [parcel.apn]
+        assert matches[0].similarity == pytest.approx(1.0)
+        assert address_to_parcels_loose("1234 Main") == matches
+        assert address_to_parcels_loose("98765 Elm Ave") == []
+
+    @pytest.mark.django_db
+    def test_typeahead_endpoint(self, parcel, client_and_user):
+        client, _ = client_and_user
+        resp = client.json_get(reverse("world_api:address_typeahead"), data={"q": "1234 main", "limit": 5})
+        assert [c["apn"] for c in resp] == [parcel.apn]
+
+
+class TestParcelAddressIndex:
+    def test_disambiguates_like_address_to_parcel(self):
+        index = ParcelAddressIndex(
+            {
+                1234: [
+                    ParcelAddress("1", "main", None, "ST", "SD"),
+                    ParcelAddress("2", "main", None, "AVE", "SD"),
+                    ParcelAddress("3", "mainsail", None, "CT", "SD"),
+                ],
+                55: [ParcelAddress("4", "elm", None, "ST", "CN")],
+            }
+        )
+        assert index.resolve("1234 Main St.", "SD")[0].apn == "1"
+        assert index.resolve("1234 Main Avenue", "SD")[0].apn == "2"
+        assert index.resolve("1234 Mainsail", "SD")[0].apn == "3"
+        assert index.resolve("55 Elm St", "SD") == (None, "match_out_of_jurisdiction")
+        assert index.resolve("55A Elm St", "SD") == (None, "dberror-valueerror")
+        apns, stats = index.resolve_many(["1234 Main St", "9 Nowhere Rd", "Main"], "SD")
+        assert apns == ["1", None, None]
+        assert stats == {"success": 1, "unmatched": 1, "error_single_word_address": 1}
+
+    @pytest.mark.django_db
+    def test_build(self, parcel):
+        parcel.situs_juri = "SD"
+        parcel.save()
+        index = ParcelAddressIndex.build()
+        assert index.resolve("1234 Main St", "SD")[0].apn == parcel.apn
+        assert address_to_parcel("1234 Main St", "SD")[0] == parcel
+
+    @pytest.mark.django_db
+    def test_cached_index_sees_edited_addresses(self, parcel, settings):
+        settings.CACHES = {**settings.CACHES, "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        parcel.situs_juri = "SD"
+        parcel.save()
+        assert ParcelAddressIndex.load().resolve("1234 Main St", "SD")[0].apn == parcel.apn
+        # Same number of parcels and max id, but the address changed
+        parcel.situs_addr = 1236
+        parcel.save()
+        index = ParcelAddressIndex.load()
+        assert index.resolve("1234 Main St", "SD") == (None, "unmatched")
+        assert index.resolve("1236 Main St", "SD")[0].apn == parcel.apn
+        # Results computed from the rest of Parcel aren't made stale by an address fix
+        assert DataVersion.latest(Parcel) is None
+        before = DataVersion.latest(PARCEL_ADDRESS_VERSION)
+        parcel.save(update_fields=["geom"])
+        assert DataVersion.latest(PARCEL_ADDRESS_VERSION) == before
+
+
+class TestRegionAnalysis:
+    @pytest.mark.django_db
+    def test_parcel_without_rents_is_analyzed(self, parcel, monkeypatch):
+        from lib.parcel_analysis_2022 import analyze_parcel_lib, parcel_lib
+        from lib.parcel_analysis_2022.region_lib import RegionOptions, analyze_tile
+
+        parcel.geom = MultiPolygon(Polygon.from_bbox((-117.16, 32.72, -117.1599, 32.7201)), srid=4326)
+        parcel.save()
+
+        def analyze_one_parcel(parcel, utm_crs, listing, *args, **kwargs):
+            # What analyze_one_parcel produces when there are no cached or nearby rents for the parcel
+            details = {"existing_units_with_rent": [({"br": 3, "ba": 2}, None)], "rent_missing": True}
+            return (
+                AnalyzedListing(
+                    listing=listing, parcel=parcel, details=details, input_parameters={}, geometry_details={}
+                ),
+                None,
+            )
+
+        monkeypatch.setattr(parcel_lib.TileLayers, "load", classmethod(lambda cls, area: cls([], [], [], [])))
+        monkeypatch.setattr(analyze_parcel_lib, "prefetch_rent_estimates", lambda *args: {})
+        monkeypatch.setattr(analyze_parcel_lib, "analyze_one_parcel", analyze_one_parcel)
+        stats = analyze_tile([parcel.apn], None, RegionOptions(zone_prefix=None))
+        assert stats["analyzed"] == stats["rent_missing"] == 1
+        assert AnalyzedListing.objects.get(parcel=parcel).details["rent_missing"]
+
+
+@pytest.mark.django_db
+class TestStoredAb2011Result:
+    check = {"name": "And", "description": "All checks must pass", "result": "passed", "notes": [], "children": []}
+
+    def test_serves_stored_result_until_base_data_changes(self, parcel, monkeypatch):
+        monkeypatch.setattr(co_eligibility_lib, "run_ab2011", lambda p, save: {"recomputed": p.apn})
+        assert ab2011_result(parcel) == {"recomputed": parcel.apn}
+        AnalyzedParcel.objects.create(
+            apn=parcel,
+            ab2011_eligible="passed",
+            ab2011_result=self.check,
+            ab2011_computed=datetime.datetime.now(datetime.UTC),
+        )
+        assert ab2011_result(parcel) == self.check
+        DataVersion.bump(ZoningBase)
+        assert DataVersion.latest(Parcel, ZoningBase) is not None
+        assert ab2011_result(parcel) == {"recomputed": parcel.apn}
+
+    def test_recomputed_result_is_not_stored(self, parcel, monkeypatch):
+        # GET /world/parcel must not change what the parcel's tiles show without invalidating them
+        suite = SimpleNamespace(run=lambda p: "passed", check=SimpleNamespace(json=lambda: json.dumps(self.check)))
+        monkeypatch.setattr(co_eligibility_lib, "AB2011Eligible", lambda: suite)
+        assert ab2011_result(parcel) == self.check
+        assert not AnalyzedParcel.objects.exists()
@@ -14,6 +14,8 @@ from vectortiles.mixins import BaseVectorTileView
 from vectortiles.postgis.views import MVTView
 
 from world.infra.django_cache import h3_cache_page
+from world.infra.mbtiles import get_mbtiles
+from world.infra.tile_geometry import geom_column_for_zoom
 from world.models import (
     HousingSolutionArea,
     Parcel,
@@ -33,10 +35,45 @@ if settings.ENABLE_SILK:
 pp = pprint.PrettyPrinter(indent=2)
 
 
+class MBTilesMixin:
+    """For tile views of static layers: serve tiles from the layer's pre-rendered MBTiles file if it covers them,
+    and only render from PostGIS if it doesn't. Seed the file with `./manage.py tiles seed`."""
+
+    mbtiles_layer: str  # name of the MBTiles file
+    mbtiles_zooms: tuple[int, int]  # zoom range to seed, matching the zooms the frontend requests the layer at
+
+    def get_tile(self, x, y, z):
+        mbtiles = get_mbtiles(self.mbtiles_layer)
+        if mbtiles is not None and mbtiles.covers(z, x, y):
+            return mbtiles.get_tile(z, x, y)
+        return self.render_tile(x, y, z)
+
+    def render_tile(self, x, y, z):
+        """Render the tile from the DB"""
+        return super().get_tile(x, y, z)
+
+
+class ParcelGeomBandMixin:
+    """For tile views of parcel polygons: render from the Parcel geometry column simplified for the tile's zoom (see
+    world/infra/tile_geometry.py), and return empty tiles below min_tile_zoom without querying."""
+
+    min_tile_zoom: int
+    parcel_geom_path = ""  # lookup path from the view's model to Parcel, eg. "apn__"
+    use_simplified_geom = True
+
+    def get_tile(self, x, y, z):
+        if z < self.min_tile_zoom:
+            return b""
+        column = geom_column_for_zoom(z) if self.use_simplified_geom else "geom"
+        self.vector_tile_geom_name = self.parcel_geom_path + column
+        return super().get_tile(x, y, z)
+
+
 # ajax call for parcel tiles for big map
 @method_decorator(h3_cache_page(60 * 60 * 24 * 365), name="dispatch")  # cache for 365 days
-class ParcelTileData(LoginRequiredMixin, MVTView, ListView):
+class ParcelTileData(LoginRequiredMixin, ParcelGeomBandMixin, MVTView, ListView):
     model = Parcel
+    min_tile_zoom = 14
     vector_tile_layer_name = "parcel"
     vector_tile_fields = ("apn", "pk")
 
@@ -45,8 +82,10 @@ class ParcelTileData(LoginRequiredMixin, MVTView, ListView):
 
 
 @method_decorator(h3_cache_page(60 * 60 * 24 * 365), name="dispatch")  # cache for 365 days
-class ZoningLabelTile(LoginRequiredMixin, MVTView, ListView):
+class ZoningLabelTile(LoginRequiredMixin, MBTilesMixin, MVTView, ListView):
     model = ZoningMapLabel
+    mbtiles_layer = "zoning-label"
+    mbtiles_zooms = (15, 15)
     vector_tile_fields = ("text",)
 
     def get_vector_tile_queryset(self):
@@ -55,8 +94,10 @@ class ZoningLabelTile(LoginRequiredMixin, MVTView, ListView):
 
 # ajax call for zoning tiles for big map
 @method_decorator(h3_cache_page(60 * 60 * 24 * 365), name="dispatch")  # cache for 365 days
-class ZoningTileData(LoginRequiredMixin, MVTView, ListView):
+class ZoningTileData(LoginRequiredMixin, MBTilesMixin, MVTView, ListView):
     model = ZoningBase
+    mbtiles_layer = "zoning"
+    mbtiles_zooms = (12, 15)
     vector_tile_layer_name = "zone_name"
     vector_tile_fields = ("zone_name",)
 
@@ -77,15 +118,19 @@ class TopoTileData(LoginRequiredMixin, MVTView, ListView):
 
 
 @method_decorator(h3_cache_page(60 * 60 * 24 * 365), name="dispatch")  # cache for 365 days
-class CompCommTileData(LoginRequiredMixin, MVTView, ListView):
+class CompCommTileData(LoginRequiredMixin, MBTilesMixin, MVTView, ListView):
     model = HousingSolutionArea
+    mbtiles_layer = "compcomm"
+    mbtiles_zooms = (12, 15)
     vector_tile_layer_name = "compcomm"
     vector_tile_fields = ("tier", "allowance")
 
 
 @method_decorator(h3_cache_page(60 * 60 * 24 * 365), name="dispatch")  # cache for 365 days
-class TpaTileData(LoginRequiredMixin, MVTView, ListView):
+class TpaTileData(LoginRequiredMixin, MBTilesMixin, MVTView, ListView):
     model = TransitPriorityArea
+    mbtiles_layer = "tpa"
+    mbtiles_zooms = (12, 15)
     vector_tile_layer_name = "tpa"
     vector_tile_fields = ("name", "pk")
 
@@ -94,8 +139,10 @@ class TpaTileData(LoginRequiredMixin, MVTView, ListView):
 
 
 @method_decorator(h3_cache_page(60 * 60 * 24 * 365), name="dispatch")  # cache for 365 days
-class RoadTileData(LoginRequiredMixin, MVTView, ListView):
+class RoadTileData(LoginRequiredMixin, MBTilesMixin, MVTView, ListView):
     model = Roads
+    mbtiles_layer = "road"
+    mbtiles_zooms = (16, 16)
     vector_tile_layer_name = "road"
     vector_tile_fields = ("rd30full", "roadsegid", "rightway", "abloaddr", "abhiaddr")
 
@@ -104,9 +151,11 @@ class RoadTileData(LoginRequiredMixin, MVTView, ListView):
 
 
 @method_decorator(h3_cache_page(60 * 60 * 24 * 365), name="dispatch")  # cache for 365 days
-class Ab2011TileData(LoginRequiredMixin, MVTView, ListView):
+class Ab2011TileData(LoginRequiredMixin, ParcelGeomBandMixin, MVTView, ListView):
     model = AnalyzedParcel
-    vector_tile_fields = ("apn__geom",)
+    min_tile_zoom = 12
+    parcel_geom_path = "apn__"
+    vector_tile_fields = ("apn__apn",)
     vector_tile_geom_name = "apn__geom"
 
     def get_vector_tile_queryset(self):
@@ -117,6 +166,13 @@ class Ab2011TileData(LoginRequiredMixin, MVTView, ListView):
         return super().get_tile(x, y, z)
 
 
+# Static layers that can be pre-rendered, by MBTiles name
+STATIC_TILE_VIEWS = {
+    view.mbtiles_layer: view
+    for view in (ZoningTileData, ZoningLabelTile, RoadTileData, TpaTileData, CompCommTileData)
+}
+
+
 # ------------------------------------------------------
 # Parcel detail viewer at /dj/parcel/<apn>
 # ------------------------------------------------------
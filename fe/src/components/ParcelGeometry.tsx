@@ -0,0 +1,76 @@
+import * as React from "react"
+import { AnalysisGeometry, QuantizedGeometry } from "../types"
+
+// Draws the vector version of the server-side analysis plots (see plot_lib.py). Colors match those plots.
+type Layer = keyof AnalysisGeometry["layers"]
+type LayerStyle = { fill?: string; stroke?: string; opacity?: number }
+
+const LAYER_STYLES: Record<Layer, LayerStyle> = {
+  parcel: { stroke: "#1f77b4" },
+  buildings: { fill: "#1f77b4" },
+  buffered_buildings: { fill: "cyan", opacity: 0.7 },
+  setbacks: { fill: "orange", opacity: 0.7 },
+  too_steep: { fill: "red", opacity: 0.7 },
+  flag: { fill: "green", opacity: 0.3 },
+  street_edges: { stroke: "brown" },
+  new_buildings: { fill: "orchid", opacity: 0.6 },
+  second_lot: { fill: "cyan", opacity: 0.7 },
+}
+
+const VIEWS: Record<"buildings" | "cant_build" | "lot_split", Layer[]> = {
+  buildings: ["parcel", "buildings", "street_edges", "new_buildings", "flag"],
+  cant_build: ["parcel", "buildings", "street_edges", "buffered_buildings", "too_steep", "setbacks", "flag"],
+  lot_split: ["parcel", "buildings", "second_lot"],
+}
+
+function toPath(geom: QuantizedGeometry): string {
+  const rings = geom.type === "Polygon" ? geom.coordinates : [geom.coordinates]
+  const close = geom.type === "Polygon" ? "Z" : ""
+  return rings.map((ring) => "M" + ring.map(([x, y]) => `${x},${y}`).join("L") + close).join(" ")
+}
+
+export function ParcelGeometry({
+  geometry,
+  view,
+  className,
+}: {
+  geometry: AnalysisGeometry
+  view: keyof typeof VIEWS
+  className?: string
+}) {
+  const parcelPoints = geometry.layers.parcel.flatMap((g) =>
+    g.type === "Polygon" ? g.coordinates[0] : g.coordinates
+  )
+  if (!parcelPoints.length) return null
+  const xs = parcelPoints.map(([x]) => x)
+  const ys = parcelPoints.map(([, y]) => y)
+  const margin = Math.round(2 / geometry.scale) // 2 meters
+  const [minX, maxX, minY, maxY] = [Math.min(...xs), Math.max(...xs), Math.min(...ys), Math.max(...ys)]
+  const viewBox = `${minX - margin} ${-maxY - margin} ${maxX - minX + 2 * margin} ${maxY - minY + 2 * margin}`
+  // one pixel-ish line width regardless of parcel size
+  const strokeWidth = Math.max(maxX - minX, maxY - minY) / 300
+
+  return (
+    <svg viewBox={viewBox} className={className}>
+      {/* geometry has y pointing north; svg has y pointing down */}
+      <g transform="scale(1,-1)">
+        {VIEWS[view].map((layer) =>
+          geometry.layers[layer].map((geom, idx) => {
+            const style = LAYER_STYLES[layer]
+            return (
+              <path
+                key={`${layer}-${idx}`}
+                d={toPath(geom)}
+                fill={geom.type === "Polygon" && style.fill ? style.fill : "none"}
+                fillOpacity={style.opacity}
+                stroke={style.stroke ?? "none"}
+                strokeWidth={strokeWidth * (layer === "street_edges" ? 4 : 1)}
+                fillRule="evenodd"
+              />
+            )
+          })
+        )}
+      </g>
+    </svg>
+  )
+}
@@ -1,9 +1,10 @@
 import { useEffect, useState } from "react"
 import { useParams } from "react-router-dom"
 import useSWR, { useSWRConfig } from "swr"
-import { apiRequest, fetcher } from "../utils/fetcher"
+import { apiRequest, fetcher, waitForAnalysisJob } from "../utils/fetcher"
 import { ListingHistory } from "../components/ListingHistory"
 import { DevScenarios } from "../components/DevScenarios"
+import { ParcelGeometry } from "../components/ParcelGeometry"
 import { AnalysisGetResp, AnalysisPostResp, AnalysisPostRespSchema } from "../types"
 import { AxiosError } from "axios"
 import { IconX } from "@tabler/icons"
@@ -64,7 +65,7 @@ export default function ListingDetailPage() {
   // const navigate = useNavigate();
   const [loading, setLoading] = useState<boolean>(false)
   const { data, error } = useSWR<AnalysisGetResp, AxiosError>(
-    `/api/world/analysis/${params.analysisId}`,
+    `/api/world/analysis/${params.analysisId}?geometry=true`,
     fetcher
   )
   const { mutate } = useSWRConfig()
@@ -86,11 +87,18 @@ export default function ListingDetailPage() {
       loading: true,
     })
     const { data, error, message } = await doAnalysis(Number(params.analysisId))
-    hideNotification("analysis-loading")
     if (!error) {
       console.log("GOT DATA on redo analysis", data)
-      return mutate(`/api/world/analysis/${data.analysisId}`)
+      // analysis runs in a background worker; wait for it to finish
+      const job = await waitForAnalysisJob(data.job_id)
+      hideNotification("analysis-loading")
+      if (job.status === "FAILED") {
+        showNotification({ title: "Failed to re-run analysis", message: job.error, color: "red" })
+        return
+      }
+      return mutate(`/api/world/analysis/${job.analysis_id}?geometry=true`)
     } else {
+      hideNotification("analysis-loading")
       console.log("Failed to redo analysis")
       showNotification({ title: "Failed to re-run analysis", message: message, color: "red" })
     }
@@ -174,11 +182,19 @@ export default function ListingDetailPage() {
       <div className="flex flex-row mt-6">
         <div className="flex-auto">
           <h2 className="font-semibold text-center">Plot analysis</h2>
-          <img src={`https://r2-image-worker.upzone.workers.dev/buildings-${data.apn}-${data.salt}`} />
+          {data.geometry ? (
+            <ParcelGeometry geometry={data.geometry} view="buildings" className="w-full" />
+          ) : (
+            <img src={`https://r2-image-worker.upzone.workers.dev/buildings-${data.apn}-${data.salt}`} />
+          )}
         </div>
         <div className="flex-auto">
           <h2 className="font-semibold text-center">Usable land analysis</h2>
-          <img src={`https://r2-image-worker.upzone.workers.dev/cant_build-${data.apn}-${data.salt}`} />
+          {data.geometry ? (
+            <ParcelGeometry geometry={data.geometry} view="cant_build" className="w-full" />
+          ) : (
+            <img src={`https://r2-image-worker.upzone.workers.dev/cant_build-${data.apn}-${data.salt}`} />
+          )}
           <div
             tabIndex={0}
             className="collapse collapse-arrow w-60 border border-base-300 bg-base-100 min-h-0 object-right float-right"
@@ -275,6 +275,16 @@ export default function ListingsPage() {
     }
   }, [])
 
+  // Cursors the server gave us for following pages. Paging by cursor costs the same on every page, where an offset
+  // makes the server skip over all the earlier rows. Cursors are only valid for the sorting, filters and page size
+  // they were returned for.
+  const cursorQuery = JSON.stringify({ pageSize, sorting, columnFilters })
+  const [cursors, setCursors] = useState<{ query: string; byPage: Record<number, string> }>({
+    query: "",
+    byPage: {},
+  })
+  const cursor = cursors.query === cursorQuery ? cursors.byPage[pageIndex] : undefined
+
   const { data, error, isValidating } = useSWR(
     [
       pageSize > -1 && `/api/world/listings`, // if pageSize is undefined, we haven't initialized yet, so wait to fetch
@@ -282,7 +292,8 @@ export default function ListingsPage() {
         params: {
           limit: pageSize,
           // eslint-disable-next-line @typescript-eslint/no-non-null-assertion
-          offset: pageIndex * pageSize,
+          offset: cursor ? undefined : pageIndex * pageSize,
+          cursor,
           order_by: sorting.length > 0 ? sorting[0].id : undefined,
           asc: sorting.length > 0 ? !sorting[0].desc : undefined,
           ...columnFiltersToQuery(columnFilters),
@@ -293,6 +304,15 @@ export default function ListingsPage() {
     { use: [swrLaggy] }
   )
 
+  useEffect(() => {
+    // Runs when a response arrives, not while swrLaggy is still showing the previous page
+    if (!data?.next_cursor) return
+    setCursors((prev) => ({
+      query: cursorQuery,
+      byPage: { ...(prev.query === cursorQuery ? prev.byPage : {}), [pageIndex + 1]: data.next_cursor },
+    }))
+  }, [data])
+
   useEffect(() => {
     // update local storage when something changes
     const foo = { pageSize, pageIndex, sorting, columnFilters }
@@ -2,9 +2,9 @@ import * as React from "react"
 import { useState } from "react"
 import { Link } from "react-router-dom"
 import useSWR, { useSWRConfig } from "swr"
-import { apiRequest, fetcher } from "../utils/fetcher"
+import { apiRequest, fetcher, waitForAnalysisJob } from "../utils/fetcher"
 import { ErrorBoundary } from "react-error-boundary"
-import { AddressSearchGetResp, AnalysisPostRespSchema } from "../types"
+import { AddressSearchGetResp, AddressTypeaheadGetResp, AnalysisPostRespSchema } from "../types"
 
 export default function NewListingPage() {
   const [address, setAddress] = useState("")
@@ -18,6 +18,10 @@ export default function NewListingPage() {
     address.length >= 3 ? `/api/world/address-search/${address}` : null,
     fetcher
   )
+  const { data: candidates } = useSWR<AddressTypeaheadGetResp, string>(
+    address.length >= 3 ? [`/api/world/address-typeahead`, { params: { q: address } }] : null,
+    fetcher
+  )
   const handleAddressSearch = (e: React.ChangeEvent<HTMLInputElement>) => {
     setAddress(e.target.value)
   }
@@ -33,6 +37,11 @@ export default function NewListingPage() {
         params: { apn: addrSearchData.apn },
       })
       if (!errors) {
+        // analysis runs in a background worker; wait for it to finish before refreshing the search result
+        const job = await waitForAnalysisJob(data.job_id)
+        if (job.status === "FAILED") {
+          setErr(`Analysis failed: ${job.error}`)
+        }
         await mutate(`/api/world/address-search/${address}`)
       }
       setLoading(false)
@@ -44,7 +53,18 @@ export default function NewListingPage() {
       <h1>Analyze an Address</h1>
       <ErrorBoundary fallback={<div>Error handling address search</div>}>
         <form onSubmit={handleAnalyzeSubmit}>
-          <input className="border border-gray-700" type="text" value={address} onChange={handleAddressSearch} />
+          <input
+            className="border border-gray-700"
+            type="text"
+            value={address}
+            onChange={handleAddressSearch}
+            list="address-candidates"
+          />
+          <datalist id="address-candidates">
+            {candidates?.map((c) => (
+              <option key={c.apn} value={c.address} />
+            ))}
+          </datalist>
           {"  "}
           {addrSearchData && "apn" in addrSearchData && !addrSearchData.analyzed_listing && (
             <button className={"btn btn-sm btn-primary" + (loading ? " loading" : "")} type="submit">
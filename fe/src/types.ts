@@ -183,6 +183,32 @@ export const ParcelGetRespSchema = z.object({
   // geom: z.object() // not sure how to rep this yet.
 })
 
+// Quantized geometry for drawing an analysis (/api/world/analysis/<id>?geometry=true). Coordinates are integers in
+// units of `scale` meters, relative to `origin` (in the `crs` projection), with y pointing north.
+const QuantizedGeometrySchema = z.union([
+  z.object({ type: z.literal("Polygon"), coordinates: z.array(z.array(z.tuple([z.number(), z.number()]))) }),
+  z.object({ type: z.literal("LineString"), coordinates: z.array(z.tuple([z.number(), z.number()])) }),
+])
+export type QuantizedGeometry = z.infer<typeof QuantizedGeometrySchema>
+export const AnalysisGeometrySchema = z.object({
+  version: z.number(),
+  crs: z.string(),
+  origin: z.tuple([z.number(), z.number()]),
+  scale: z.number(),
+  layers: z.object({
+    parcel: z.array(QuantizedGeometrySchema),
+    buildings: z.array(z.intersection(QuantizedGeometrySchema, z.object({ building_type: z.string() }))),
+    buffered_buildings: z.array(QuantizedGeometrySchema),
+    setbacks: z.array(QuantizedGeometrySchema),
+    too_steep: z.array(QuantizedGeometrySchema),
+    flag: z.array(QuantizedGeometrySchema),
+    street_edges: z.array(QuantizedGeometrySchema),
+    new_buildings: z.array(QuantizedGeometrySchema),
+    second_lot: z.array(QuantizedGeometrySchema),
+  }),
+})
+export type AnalysisGeometry = z.infer<typeof AnalysisGeometrySchema>
+
 export const AnalysisGetRespSchema = z.object({
   datetime_ran: z.date(),
   is_tpa: z.boolean(),
@@ -193,6 +219,7 @@ export const AnalysisGetRespSchema = z.object({
   listing: PropertyListingSchema,
   apn: z.string(),
   dev_scenarios: z.array(DevScenarioSchema),
+  geometry: AnalysisGeometrySchema.nullable().optional(),
   details: z
     .object({
       address: z.string(),
@@ -240,11 +267,23 @@ export const AnalysisGetRespSchema = z.object({
 export type _analysis_get_resp = z.infer<typeof AnalysisGetRespSchema>
 export type AnalysisGetResp = _analysis_get_resp & Record<string, any>
 
-// /api/analysis
-export const AnalysisPostRespSchema = z.object({
-  analysisId: z.number(),
+// /api/analysis (POST) and /api/analysis-job/<job_id>
+export const AnalysisJobSchema = z.object({
+  job_id: z.number(),
+  apn: z.string(),
+  status: z.enum(["PENDING", "RUNNING", "DONE", "FAILED"]),
+  // number of queued jobs ahead of this one, when PENDING
+  queue_position: z.number().nullable(),
+  // set once the job is DONE
+  analysis_id: z.number().nullable(),
+  error: z.string().nullable(),
+  created: z.string(),
+  started: z.string().nullable(),
+  finished: z.string().nullable(),
 })
-export type AnalysisPostResp = z.infer<typeof AnalysisPostRespSchema>
+export type AnalysisJob = z.infer<typeof AnalysisJobSchema>
+export const AnalysisPostRespSchema = AnalysisJobSchema
+export type AnalysisPostResp = AnalysisJob
 
 export const AnalysisPostReqSchema = z.object({
   // APN id
@@ -264,6 +303,16 @@ export const AddressSearchGetRespSchema = z.union([
 ])
 export type AddressSearchGetResp = z.infer<typeof AddressSearchGetRespSchema>
 
+// /api/world/address-typeahead
+export const AddressTypeaheadGetRespSchema = z.array(
+  z.object({
+    apn: z.string(),
+    address: z.string(),
+    similarity: z.number(),
+  })
+)
+export type AddressTypeaheadGetResp = z.infer<typeof AddressTypeaheadGetRespSchema>
+
 export const UserSchema = z.object({
   first_name: z.string(),
   last_name: z.string(),
@@ -3,6 +3,7 @@ import { useCallback, useEffect, useRef } from "react"
 import { z } from "zod"
 import { Middleware, SWRHook } from "swr"
 import { showNotification } from "@mantine/notifications"
+import { AnalysisJob, AnalysisJobSchema } from "../types"
 
 interface ApiRequestParams<RespDataType extends z.ZodTypeAny> {
   RespDataCls: z.ZodTypeAny // TODO: should be RespDataType
@@ -113,6 +114,23 @@ export async function apiRequest<RespDataType extends z.ZodTypeAny>(
   return promiseReturn
 }
 
+/**
+ * Polls an analysis job (queued by POST /api/world/analysis/) until the worker has finished or failed it.
+ *
+ * @param jobId - job id returned by the POST
+ * @param intervalMs - how often to poll
+ * @returns the finished job; check its status for DONE vs FAILED
+ */
+export async function waitForAnalysisJob(jobId: number, intervalMs = 2000): Promise<AnalysisJob> {
+  for (;;) {
+    const job = AnalysisJobSchema.parse(await fetcher(`/api/world/analysis-job/${jobId}`, {}))
+    if (job.status === "DONE" || job.status === "FAILED") {
+      return job
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs))
+  }
+}
+
 type Fetcher = (url: string, config: Record<string, unknown>) => Promise<any>
 export const fetcher: Fetcher = (url, config) => {
   // console.log ("FETCH " + url)